@@ -0,0 +1,138 @@
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Tuple
+
+
+@dataclass
+class RouteClass:
+    """Limits for a group of expensive routes, applied per caller (user id or client address)."""
+    rate: float  # tokens per second
+    burst: int
+    concurrency: int  # in-flight requests per caller
+    max_inflight: int = 0  # in-flight requests across all callers in this worker; 0 = no cap
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class LimiterBackend(ABC):
+    """Bucket and slot storage for AdmissionController. A shared store (e.g. Redis with a small
+    Lua script per call) implements the same calls so limits hold across workers."""
+
+    @abstractmethod
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        """Take one token; returns 0 if granted, else seconds until one is available."""
+
+    @abstractmethod
+    async def acquire_slot(self, key: str, limit: int) -> bool:
+        ...
+
+    @abstractmethod
+    async def release_slot(self, key: str):
+        ...
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class InMemoryLimiterBackend(LimiterBackend):
+    """Per-process buckets in an LRU bounded by max_keys, so a flood of distinct callers cannot grow memory."""
+
+    def __init__(self, max_keys: int = 100000, clock: Callable[[], float] = time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._slots: Dict[str, int] = {}
+        self.evictions = 0
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        now = self.clock()
+        tokens, updated = self._buckets.pop(key, (float(burst), now))
+        tokens = min(float(burst), tokens + (now - updated) * rate)
+        if tokens >= 1.0:
+            tokens -= 1.0
+            wait = 0.0
+        else:
+            wait = (1.0 - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+            self.evictions += 1
+        return wait
+
+    async def acquire_slot(self, key: str, limit: int) -> bool:
+        held = self._slots.get(key, 0)
+        if held >= limit:
+            return False
+        self._slots[key] = held + 1
+        return True
+
+    async def release_slot(self, key: str):
+        held = self._slots.get(key, 0) - 1
+        if held > 0:
+            self._slots[key] = held
+        else:
+            self._slots.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'buckets': len(self._buckets),
+            'callers_in_flight': len(self._slots),
+            'max_keys': self.max_keys,
+            'evictions': self.evictions
+        }
+
+
+class AdmissionController:
+    """Token bucket plus concurrency caps per (route class, caller). Rejections are decided
+    before any expensive work, so they cost a dict lookup rather than a bcrypt or LLM call."""
+
+    def __init__(self, backend: LimiterBackend, classes: Dict[str, RouteClass]):
+        self.backend = backend
+        self.classes = classes
+        self._inflight: Dict[str, int] = {name: 0 for name in classes}
+        self._counters: Dict[str, Dict[str, int]] = {
+            name: {'admitted': 0, 'rate': 0, 'concurrency': 0, 'class_concurrency': 0} for name in classes
+        }
+
+    def _reject(self, route_class: str, reason: str, retry_after: float):
+        self._counters[route_class][reason] += 1
+        raise AdmissionRejected(reason, retry_after)
+
+    @asynccontextmanager
+    async def admit(self, route_class: str, caller: str):
+        limits = self.classes[route_class]
+        key = f"{route_class}:{caller}"
+        if limits.max_inflight and self._inflight[route_class] >= limits.max_inflight:
+            self._reject(route_class, 'class_concurrency', 1.0)
+        if not await self.backend.acquire_slot(key, limits.concurrency):
+            self._reject(route_class, 'concurrency', 1.0)
+        try:
+            # Tokens are only spent once a slot is held, so a caller waiting on concurrency keeps its budget
+            wait = await self.backend.take(key, limits.rate, limits.burst)
+            if wait > 0:
+                self._reject(route_class, 'rate', wait)
+            self._counters[route_class]['admitted'] += 1
+            self._inflight[route_class] += 1
+            try:
+                yield
+            finally:
+                self._inflight[route_class] -= 1
+        finally:
+            await self.backend.release_slot(key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'classes': {
+                name: {**vars(limits), 'in_flight': self._inflight[name], **self._counters[name]}
+                for name, limits in self.classes.items()
+            },
+            'backend': self.backend.stats()
+        }
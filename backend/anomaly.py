@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+
+class RunningStats:
+    """Welford mean/variance of log-amounts; two instances merge exactly (Chan et al.)."""
+
+    __slots__ = ('count', 'mean', 'm2')
+
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def merged(self, other: 'RunningStats') -> 'RunningStats':
+        count = self.count + other.count
+        if not count:
+            return RunningStats()
+        delta = other.mean - self.mean
+        return RunningStats(
+            count,
+            self.mean + delta * other.count / count,
+            self.m2 + other.m2 + delta * delta * self.count * other.count / count
+        )
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+
+def _log_amount(amount: float) -> float:
+    # Expense amounts are heavily right-skewed; z-scores behave far better on a log scale
+    return math.log1p(max(amount, 0.0))
+
+
+class AnomalyScorer:
+    """Per-key running statistics with one-sided z-score flagging.
+
+    Each worker scores against the persisted statistics plus its own unflushed observations.
+    flush() merges those observations into the shared collection, so several workers can
+    feed the same statistics without overwriting each other.
+    """
+
+    def __init__(self, threshold: float = 3.5, min_samples: int = 10, min_std: float = 0.05,
+                 flush_interval: float = 60.0):
+        self.threshold = threshold
+        self.min_samples = min_samples
+        self.min_std = min_std
+        self.flush_interval = flush_interval
+        self._base: Dict[str, RunningStats] = {}
+        self._pending: Dict[str, RunningStats] = {}
+        self.scored = 0
+        self.flagged = 0
+
+    def stats_for(self, key: str) -> RunningStats:
+        base = self._base.get(key)
+        pending = self._pending.get(key)
+        if base and pending:
+            return base.merged(pending)
+        return base or pending or RunningStats()
+
+    def score(self, keys: List[str], amount: float) -> Tuple[float, Optional[str]]:
+        """Highest z-score across keys with enough history, and the key that produced it."""
+        self.scored += 1
+        value = _log_amount(amount)
+        best, best_key = 0.0, None
+        for key in keys:
+            stats = self.stats_for(key)
+            if stats.count < self.min_samples:
+                continue
+            z = (value - stats.mean) / max(stats.std, self.min_std)
+            if z > best:
+                best, best_key = z, key
+        return round(best, 2), best_key
+
+    def check(self, keys: List[str], amount: float) -> Optional[Dict[str, Any]]:
+        """None for a normal amount, else the anomaly details. The statistics are untouched until
+        settle(), since the caller may still fail to record the amount."""
+        score, key = self.score(keys, amount)
+        return {'score': score, 'key': key} if score >= self.threshold else None
+
+    def settle(self, keys: List[str], amount: float, anomaly: Optional[Dict[str, Any]]):
+        # A normal amount joins the statistics; held-back amounts stay out until a reviewer approves them
+        if anomaly:
+            self.flagged += 1
+        else:
+            self.observe(keys, amount)
+
+    def observe(self, keys: List[str], amount: float):
+        value = _log_amount(amount)
+        for key in keys:
+            self._pending.setdefault(key, RunningStats()).add(value)
+
+    def load(self, documents: List[Dict[str, Any]]):
+        self._base = {d['_id']: RunningStats(d['count'], d['mean'], d['m2']) for d in documents}
+
+    async def flush(self, collection):
+        pending, self._pending = self._pending, {}
+        if pending:
+            try:
+                await collection.bulk_write(
+                    [UpdateOne({'_id': key}, _merge_update(stats), upsert=True) for key, stats in pending.items()],
+                    ordered=False
+                )
+            except Exception as e:
+                logger.error(f"Anomaly stats flush failed: {str(e)}")
+                # Keep the observations for the next attempt, merged with anything newer
+                for key, stats in pending.items():
+                    self._pending[key] = stats.merged(self._pending[key]) if key in self._pending else stats
+                return
+        # Pick up what other workers have contributed since the last flush
+        self.load(await collection.find({}).to_list(None))
+
+    async def run(self, collection):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush(collection)
+            except Exception as e:
+                logger.error(f"Anomaly stats reload failed: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'keys': len(set(self._base) | set(self._pending)),
+            'unflushed_keys': len(self._pending),
+            'scored': self.scored,
+            'flagged': self.flagged,
+            'threshold': self.threshold
+        }
+
+
+def _merge_update(stats: RunningStats) -> List[Dict[str, Any]]:
+    """Pipeline update applying RunningStats.merged server-side, so concurrent flushes compose."""
+    count = {'$ifNull': ['$count', 0]}
+    mean = {'$ifNull': ['$mean', 0.0]}
+    m2 = {'$ifNull': ['$m2', 0.0]}
+    total = {'$add': [count, stats.count]}
+    delta = {'$subtract': [stats.mean, mean]}
+    return [{'$set': {
+        'count': total,
+        'mean': {'$add': [mean, {'$divide': [{'$multiply': [delta, stats.count]}, total]}]},
+        'm2': {'$add': [
+            m2,
+            stats.m2,
+            {'$divide': [{'$multiply': [delta, delta, count, stats.count]}, total]}
+        ]}
+    }}]
@@ -0,0 +1,133 @@
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class CacheBackend(ABC):
+    """Storage interface for ReadCache. An external store (e.g. Redis) implements the same four calls."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Any):
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str):
+        ...
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """Per-process LRU bounded by entry count and approximate serialized size."""
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 64 * 1024 * 1024, ttl_seconds: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._entries: "OrderedDict[str, Tuple[Any, int, float]]" = OrderedDict()
+        self._bytes = 0
+        self.evictions = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, size, expires_at = entry
+        if expires_at <= self.clock():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any):
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, size, self.clock() + self.ttl_seconds)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    async def delete(self, key: str):
+        if key in self._entries:
+            self._remove(key)
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'ttl_seconds': self.ttl_seconds,
+            'evictions': self.evictions
+        }
+
+
+class ReadCache:
+    """Namespaced read-through cache with per-namespace hit/miss counters."""
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self._counters: Dict[str, Dict[str, int]] = {}
+        # Only keys with a load in flight are tracked, so both maps stay as small as the concurrency
+        self._loading: Dict[str, int] = {}
+        self._generations: Dict[str, int] = {}
+
+    def _count(self, namespace: str, field: str):
+        counters = self._counters.setdefault(namespace, {'hits': 0, 'misses': 0, 'invalidations': 0})
+        counters[field] += 1
+
+    async def get_or_load(self, namespace: str, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        cache_key = f"{namespace}:{key}"
+        value = await self.backend.get(cache_key)
+        if value is not None:
+            self._count(namespace, 'hits')
+            return value
+        self._count(namespace, 'misses')
+        self._loading[cache_key] = self._loading.get(cache_key, 0) + 1
+        generation = self._generations.setdefault(cache_key, 0)
+        try:
+            value = await loader()
+        finally:
+            # An invalidation that raced the load means the value may already be stale
+            stale = self._generations[cache_key] != generation
+            self._loading[cache_key] -= 1
+            if not self._loading[cache_key]:
+                del self._loading[cache_key]
+                del self._generations[cache_key]
+        if not stale:
+            await self.backend.set(cache_key, value)
+        return value
+
+    async def invalidate(self, namespace: str, key: str):
+        cache_key = f"{namespace}:{key}"
+        self._count(namespace, 'invalidations')
+        if cache_key in self._generations:
+            self._generations[cache_key] += 1
+        await self.backend.delete(cache_key)
+
+    def stats(self) -> Dict[str, Any]:
+        namespaces = {}
+        for namespace, counters in self._counters.items():
+            lookups = counters['hits'] + counters['misses']
+            namespaces[namespace] = {
+                **counters,
+                'hit_rate': round(counters['hits'] / lookups, 4) if lookups else 0.0
+            }
+        return {'namespaces': namespaces, 'backend': self.backend.stats()}
@@ -0,0 +1,120 @@
+import json
+import math
+import os
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+HASH_BUCKETS = 512
+NUMERIC_FEATURES = 5  # bias, distance, log1p(distance), cargo weight, distance known
+
+
+def _normalize(value: Optional[str]) -> str:
+    return (value or '').strip().lower()
+
+
+def _distance(trip: Dict[str, Any]) -> float:
+    # Predictions are made at trip creation, before any actual_distance exists, so training uses the same feature
+    return float(trip.get('estimated_distance') or 0.0)
+
+
+def _hashed_features(trip: Dict[str, Any]) -> List[Tuple[str, float]]:
+    origin = _normalize(trip.get('origin'))
+    destination = _normalize(trip.get('destination'))
+    vehicle_type = _normalize(trip.get('vehicle_type'))
+    per_100km = _distance(trip) / 100.0
+    # The per-100km terms let each vehicle type and lane learn its own running cost rate
+    return [
+        (f"lane={origin}>{destination}", 1.0),
+        (f"origin={origin}", 1.0),
+        (f"destination={destination}", 1.0),
+        (f"vehicle_type={vehicle_type}", 1.0),
+        (f"rate|vehicle_type={vehicle_type}", per_100km),
+        (f"rate|lane={origin}>{destination}", per_100km),
+    ]
+
+
+HASHED_PER_TRIP = 6
+
+
+def _bucket(token: str) -> int:
+    return NUMERIC_FEATURES + zlib.crc32(token.encode('utf-8')) % HASH_BUCKETS
+
+
+def featurize(trips: List[Dict[str, Any]]) -> np.ndarray:
+    """Dense design matrix: numeric columns followed by hashed lane/vehicle columns."""
+    X = np.zeros((len(trips), NUMERIC_FEATURES + HASH_BUCKETS))
+    distance = np.array([_distance(t) for t in trips])
+    X[:, 0] = 1.0
+    X[:, 1] = distance / 100.0
+    X[:, 2] = np.log1p(distance)
+    X[:, 3] = np.array([float(t.get('cargo_weight') or 0.0) for t in trips])
+    X[:, 4] = distance > 0
+    hashed = [feature for t in trips for feature in _hashed_features(t)]
+    rows = np.repeat(np.arange(len(trips)), HASHED_PER_TRIP)
+    cols = np.array([_bucket(token) for token, _ in hashed], dtype=int)
+    np.add.at(X, (rows, cols), np.array([value for _, value in hashed]))
+    return X
+
+
+class CostModel:
+    """Ridge regression of total trip expenses on distance, cargo and hashed lane/vehicle features."""
+
+    def __init__(self, weights: np.ndarray, metadata: Optional[Dict[str, Any]] = None):
+        self.weights = weights
+        self.metadata = metadata or {}
+        # Plain floats keep single predictions in pure Python, avoiding NumPy call overhead
+        self._weights_list = weights.tolist()
+
+    @classmethod
+    def fit(cls, trips: List[Dict[str, Any]], costs: List[float], l2: float = 1.0) -> 'CostModel':
+        X = featurize(trips)
+        y = np.asarray(costs, dtype=float)
+        penalty = l2 * np.eye(X.shape[1])
+        penalty[0, 0] = 0.0  # leave the intercept unregularized
+        weights = np.linalg.solve(X.T @ X + penalty, X.T @ y)
+        residuals = X @ weights - y
+        return cls(weights, {
+            'trained_at': datetime.now(timezone.utc).isoformat(),
+            'samples': int(len(y)),
+            'train_mae': round(float(np.abs(residuals).mean()), 2),
+            'l2': l2
+        })
+
+    def predict(self, trip: Dict[str, Any]) -> float:
+        w = self._weights_list
+        distance = _distance(trip)
+        value = (
+            w[0]
+            + w[1] * distance / 100.0
+            + w[2] * math.log1p(distance)
+            + w[3] * float(trip.get('cargo_weight') or 0.0)
+            + w[4] * (distance > 0)
+        )
+        for token, feature_value in _hashed_features(trip):
+            value += w[_bucket(token)] * feature_value
+        return round(max(value, 0.0), 2)
+
+    def predict_many(self, trips: List[Dict[str, Any]]) -> np.ndarray:
+        return np.maximum(featurize(trips) @ self.weights, 0.0)
+
+    def save(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp.npz')
+        np.savez(tmp_path, weights=self.weights, metadata=np.array([json.dumps(self.metadata)]))
+        # Atomic swap so workers reloading the artifact never see a partial file
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional['CostModel']:
+        if not path.exists():
+            return None
+        with np.load(path, allow_pickle=False) as artifact:
+            weights = artifact['weights']
+            metadata = json.loads(str(artifact['metadata'][0]))
+        if weights.shape != (NUMERIC_FEATURES + HASH_BUCKETS,):
+            return None
+        return cls(weights, metadata)
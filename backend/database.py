@@ -0,0 +1,85 @@
+import asyncio
+import os
+from typing import Any, Dict, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+
+
+def client_options(env: Dict[str, str] = os.environ) -> Dict[str, Any]:
+    """Motor client settings from the environment. Each worker process gets its own pool,
+    so the server sees up to workers x MONGO_MAX_POOL_SIZE connections."""
+    options: Dict[str, Any] = {
+        'maxPoolSize': int(env.get('MONGO_MAX_POOL_SIZE', '100')),
+        'minPoolSize': int(env.get('MONGO_MIN_POOL_SIZE', '0')),
+        'maxIdleTimeMS': int(env.get('MONGO_MAX_IDLE_TIME_MS', '300000')),
+        'serverSelectionTimeoutMS': int(env.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000')),
+        'connectTimeoutMS': int(env.get('MONGO_CONNECT_TIMEOUT_MS', '5000')),
+        'waitQueueTimeoutMS': int(env.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '10000')),
+        'appname': env.get('MONGO_APP_NAME', 'transops-backend')
+    }
+    if env.get('MONGO_SOCKET_TIMEOUT_MS'):
+        options['socketTimeoutMS'] = int(env['MONGO_SOCKET_TIMEOUT_MS'])
+    if env.get('MONGO_COMPRESSORS'):
+        # e.g. "zstd,snappy,zlib"; zstd and snappy need their optional pymongo extras
+        options['compressors'] = env['MONGO_COMPRESSORS']
+    return options
+
+
+class MongoResources:
+    """Owns the Motor client. connect() runs in the app lifespan, i.e. inside each worker
+    after the fork, so no pool or monitor thread is ever shared between processes."""
+
+    def __init__(self, url: str, db_name: str, options: Optional[Dict[str, Any]] = None):
+        self.url = url
+        self.db_name = db_name
+        self.options = options or {}
+        self.client: Optional[AsyncIOMotorClient] = None
+        self.db: Optional[AsyncIOMotorDatabase] = None
+        self.pid: Optional[int] = None
+
+    def connect(self):
+        self.client = AsyncIOMotorClient(self.url, **self.options)
+        self.db = self.client[self.db_name]
+        self.pid = os.getpid()
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+        self.client = None
+        self.db = None
+
+    async def ping(self, timeout: float = 2.0) -> bool:
+        if self.client is None or self.pid != os.getpid():
+            return False
+        try:
+            await asyncio.wait_for(self.client.admin.command('ping'), timeout=timeout)
+            return True
+        except Exception:
+            return False
+
+    async def supports_transactions(self, timeout: float = 2.0) -> bool:
+        """Multi-document transactions need a replica set member or mongos, not a standalone server."""
+        try:
+            hello = await asyncio.wait_for(self.client.admin.command('hello'), timeout=timeout)
+        except Exception:
+            return False
+        return bool(hello.get('setName')) or hello.get('msg') == 'isdbgrid'
+
+
+class _Bound:
+    """Module-level stand-in for the client or database, resolved on every attribute access."""
+
+    def __init__(self, resources: MongoResources, attribute: str):
+        self._resources = resources
+        self._attribute = attribute
+
+    def __getattr__(self, name: str) -> Any:
+        target = getattr(self._resources, self._attribute)
+        if target is None:
+            raise RuntimeError("MongoDB is not connected; the app lifespan has not started")
+        return getattr(target, name)
+
+
+def bind(resources: MongoResources):
+    """(client, db) proxies so route code keeps using db.trips and client.start_session()."""
+    return _Bound(resources, 'client'), _Bound(resources, 'db')
@@ -0,0 +1,135 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Cost for pairs that must never be matched; kept finite so potentials stay well defined
+INFEASIBLE = 1e9
+
+
+def linear_sum_assignment(cost: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Minimum-cost assignment (Hungarian algorithm, shortest augmenting path with potentials).
+
+    Works on rectangular matrices; returns (rows, cols) like scipy.optimize.linear_sum_assignment.
+    The inner scan over columns is vectorized, so each augmentation step is a handful of NumPy ops.
+    """
+    cost = np.asarray(cost, dtype=float)
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+    if n == 0:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=int)  # p[j]: 1-based row matched to column j, 0 if free
+    way = np.zeros(m + 1, dtype=int)
+
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            improve = free & (reduced < minv[1:])
+            minv[1:][improve] = reduced[improve]
+            way[1:][improve] = j0
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[1:][free] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    cols = np.nonzero(p[1:])[0]
+    rows = p[1:][cols] - 1
+    if transposed:
+        rows, cols = cols, rows
+    order = np.argsort(rows)
+    return rows[order], cols[order]
+
+
+def vehicle_cost_matrix(trips: List[Dict[str, Any]], vehicles: List[Dict[str, Any]]) -> np.ndarray:
+    """Unused capacity fraction per (trip, vehicle); overweight or wrong-type pairs are infeasible."""
+    weight = np.array([t.get('cargo_weight') or np.nan for t in trips], dtype=float)[:, None]
+    capacity = np.array([v.get('capacity') or np.nan for v in vehicles], dtype=float)[None, :]
+    wanted = np.array([t.get('vehicle_type') or '' for t in trips], dtype=object)[:, None]
+    offered = np.array([v.get('vehicle_type') or '' for v in vehicles], dtype=object)[None, :]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slack = (capacity - weight) / capacity
+    # Unknown weight or capacity: neutral fit rather than a guess
+    cost = np.where(np.isnan(slack), 0.5, slack)
+    cost = np.where(slack < 0, INFEASIBLE, cost)
+    type_mismatch = (wanted != '') & (wanted != offered)
+    return np.where(type_mismatch, INFEASIBLE, cost)
+
+
+def driver_scores(performances: List[Optional[Dict[str, Any]]]) -> np.ndarray:
+    """0..1 score from safety, fuel efficiency and experience."""
+    safety = np.array([(p or {}).get('safety_score', 100.0) for p in performances], dtype=float) / 100.0
+    efficiency = np.array([(p or {}).get('average_fuel_efficiency', 0.0) for p in performances], dtype=float)
+    trips = np.array([(p or {}).get('total_trips', 0) for p in performances], dtype=float)
+    efficiency = efficiency / efficiency.max() if efficiency.size and efficiency.max() > 0 else np.zeros_like(efficiency)
+    experience = 1.0 - np.exp(-trips / 20.0)
+    return 0.6 * safety + 0.25 * efficiency + 0.15 * experience
+
+
+def driver_cost_matrix(trips: List[Dict[str, Any]], scores: np.ndarray) -> np.ndarray:
+    """Longer trips weigh more, so the best drivers land on the trips where they matter most."""
+    distance = np.array([t.get('estimated_distance') or 0.0 for t in trips], dtype=float)
+    importance = 1.0 + distance / (distance.max() if distance.size and distance.max() > 0 else 1.0)
+    return -importance[:, None] * scores[None, :]
+
+
+def suggest_assignments(
+    trips: List[Dict[str, Any]],
+    vehicles: List[Dict[str, Any]],
+    drivers: List[Dict[str, Any]],
+    performances: List[Optional[Dict[str, Any]]]
+) -> Dict[str, Any]:
+    """Match trips to vehicles by capacity/type fit, then the trips that got a vehicle to drivers."""
+    vehicle_for = {}
+    if trips and vehicles:
+        cost = vehicle_cost_matrix(trips, vehicles)
+        for row, col in zip(*linear_sum_assignment(cost)):
+            if cost[row, col] < INFEASIBLE:
+                vehicle_for[row] = (col, float(cost[row, col]))
+
+    matched = sorted(vehicle_for)
+    driver_for = {}
+    scores = driver_scores(performances)
+    if matched and drivers:
+        cost = driver_cost_matrix([trips[i] for i in matched], scores)
+        for row, col in zip(*linear_sum_assignment(cost)):
+            driver_for[matched[row]] = col
+
+    assignments, unassigned = [], []
+    for index, trip in enumerate(trips):
+        if index in vehicle_for and index in driver_for:
+            vehicle_index, fit_cost = vehicle_for[index]
+            driver_index = driver_for[index]
+            assignments.append({
+                'trip_id': trip['id'],
+                'vehicle_id': vehicles[vehicle_index]['id'],
+                'driver_id': drivers[driver_index]['id'],
+                'capacity_slack': round(fit_cost, 4),
+                'driver_score': round(float(scores[driver_index]), 4)
+            })
+        else:
+            unassigned.append({
+                'trip_id': trip['id'],
+                'reason': 'no_driver' if index in vehicle_for else 'no_suitable_vehicle'
+            })
+    return {'assignments': assignments, 'unassigned': unassigned}
@@ -0,0 +1,62 @@
+import asyncio
+from typing import Any, Dict, Set
+
+
+class Subscription:
+    """One connection's view of the hub: a bounded queue plus an overflow flag."""
+
+    def __init__(self, topics: Set[str], max_queue: int):
+        self.topics = topics
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.overflowed = False
+
+    def offer(self, event: Dict[str, Any]):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A client this far behind should reconnect and refetch rather than hold server memory
+            self.overflowed = True
+
+
+class EventHub:
+    """In-process pub/sub. publish() never awaits, so a slow subscriber cannot stall a write route."""
+
+    def __init__(self, max_queue: int = 100):
+        self.max_queue = max_queue
+        self._topics: Dict[str, Set[Subscription]] = {}
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, *topics: str) -> Subscription:
+        subscription = Subscription(set(topics), self.max_queue)
+        for topic in topics:
+            self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for topic in subscription.topics:
+            subscribers = self._topics.get(topic)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._topics[topic]
+
+    def publish(self, topic: str, event: Dict[str, Any]):
+        self.published += 1
+        for subscription in self._topics.get(topic, ()):
+            was_overflowed = subscription.overflowed
+            subscription.offer(event)
+            if subscription.overflowed and not was_overflowed:
+                self.dropped += 1
+
+    def stats(self) -> Dict[str, Any]:
+        subscriptions = {s for subscribers in self._topics.values() for s in subscribers}
+        return {
+            'topics': len(self._topics),
+            'subscriptions': len(subscriptions),
+            'published': self.published,
+            'dropped_subscriptions': self.dropped
+        }
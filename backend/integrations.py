@@ -0,0 +1,119 @@
+"""Provider interfaces for the LLM and Stripe integrations.
+
+emergentintegrations pulls in LLM SDKs, HTTP clients and Stripe on import, so it is only
+imported the first time a provider is actually used. Workers that never serve an AI or
+payment request never load it.
+"""
+import os
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+
+class IntegrationNotConfigured(RuntimeError):
+    pass
+
+
+@dataclass
+class CheckoutSession:
+    session_id: str
+    url: str
+
+
+@dataclass
+class CheckoutStatus:
+    status: str
+    payment_status: str
+
+
+@dataclass
+class WebhookEvent:
+    event_type: str
+    session_id: Optional[str]
+    payment_status: Optional[str]
+
+
+class LLMProvider(ABC):
+    @abstractmethod
+    async def complete(self, session_id: str, system_message: str, prompt: str) -> str:
+        ...
+
+
+class PaymentProvider(ABC):
+    @abstractmethod
+    async def create_checkout_session(self, amount: float, currency: str, success_url: str, cancel_url: str,
+                                      metadata: Dict[str, str], webhook_url: str) -> CheckoutSession:
+        ...
+
+    @abstractmethod
+    async def get_checkout_status(self, session_id: str) -> CheckoutStatus:
+        ...
+
+    @abstractmethod
+    async def handle_webhook(self, body: bytes, signature: Optional[str]) -> WebhookEvent:
+        ...
+
+
+class EmergentLLMProvider(LLMProvider):
+    def __init__(self, api_key: str, model: Tuple[str, str] = ("openai", "gpt-4o-mini")):
+        self.api_key = api_key
+        self.model = model
+
+    async def complete(self, session_id: str, system_message: str, prompt: str) -> str:
+        from emergentintegrations.llm.chat import LlmChat, UserMessage
+
+        chat = LlmChat(
+            api_key=self.api_key,
+            session_id=session_id,
+            system_message=system_message
+        ).with_model(*self.model)
+        return await chat.send_message(UserMessage(text=prompt))
+
+
+class EmergentStripeProvider(PaymentProvider):
+    def __init__(self, api_key: Optional[str]):
+        self.api_key = api_key
+
+    def _checkout(self, webhook_url: str = "") -> Any:
+        from emergentintegrations.payments.stripe.checkout import StripeCheckout
+
+        return StripeCheckout(api_key=self.api_key, webhook_url=webhook_url)
+
+    async def create_checkout_session(self, amount: float, currency: str, success_url: str, cancel_url: str,
+                                      metadata: Dict[str, str], webhook_url: str) -> CheckoutSession:
+        from emergentintegrations.payments.stripe.checkout import CheckoutSessionRequest
+
+        session = await self._checkout(webhook_url).create_checkout_session(CheckoutSessionRequest(
+            amount=amount,
+            currency=currency,
+            success_url=success_url,
+            cancel_url=cancel_url,
+            metadata=metadata
+        ))
+        return CheckoutSession(session_id=session.session_id, url=session.url)
+
+    async def get_checkout_status(self, session_id: str) -> CheckoutStatus:
+        response = await self._checkout().get_checkout_status(session_id)
+        return CheckoutStatus(status=response.status, payment_status=response.payment_status)
+
+    async def handle_webhook(self, body: bytes, signature: Optional[str]) -> WebhookEvent:
+        response = await self._checkout().handle_webhook(body, signature)
+        return WebhookEvent(
+            event_type=response.event_type,
+            session_id=response.session_id,
+            payment_status=response.payment_status
+        )
+
+
+@lru_cache(maxsize=None)
+def get_llm_provider() -> LLMProvider:
+    api_key = os.environ.get('EMERGENT_LLM_KEY')
+    if not api_key:
+        raise IntegrationNotConfigured("EMERGENT_LLM_KEY is not set")
+    return EmergentLLMProvider(api_key)
+
+
+@lru_cache(maxsize=None)
+def get_payment_provider() -> PaymentProvider:
+    return EmergentStripeProvider(os.environ.get('STRIPE_API_KEY'))
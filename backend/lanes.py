@@ -0,0 +1,66 @@
+from typing import Any, Dict, Optional
+
+# Cost-per-km histogram: fixed INR/km-wide buckets, everything above the last one lumped together
+COST_PER_KM_BUCKET = 2.0
+COST_PER_KM_MAX_BUCKET = 500
+PERCENTILES = (50, 90, 95)
+
+
+def lane_id(fleet_owner_id: str, origin: str, destination: str) -> str:
+    return f"{fleet_owner_id}|{origin.lower()}|{destination.lower()}"
+
+
+def cost_per_km_bucket(cost_per_km: float) -> int:
+    return min(int(cost_per_km // COST_PER_KM_BUCKET), COST_PER_KM_MAX_BUCKET)
+
+
+def lane_increments(trip: Dict[str, Any], revenue: Optional[float]) -> Dict[str, float]:
+    """$inc document folding one completed trip into its lane summary."""
+    expenses = float(trip.get('total_expenses') or 0.0)
+    distance = float(trip.get('actual_distance') or trip.get('estimated_distance') or 0.0)
+    increments = {'trips': 1, 'expenses': expenses}
+    if revenue is not None:
+        # Margin only counts trips whose revenue is known
+        increments.update({'revenue_trips': 1, 'revenue': revenue, 'revenue_expenses': expenses})
+    if distance > 0:
+        increments.update({
+            'costed_trips': 1,
+            'costed_expenses': expenses,
+            'distance_km': distance,
+            f"cost_per_km_hist.{cost_per_km_bucket(expenses / distance)}": 1
+        })
+    return increments
+
+
+def histogram_percentile(histogram: Dict[str, int], percentile: float) -> Optional[float]:
+    """Percentile interpolated linearly inside the bucket that contains it."""
+    buckets = sorted((int(bucket), count) for bucket, count in histogram.items() if count > 0)
+    total = sum(count for _, count in buckets)
+    if not total:
+        return None
+    target = total * percentile / 100.0
+    seen = 0
+    for bucket, count in buckets:
+        if seen + count >= target:
+            return round((bucket + (target - seen) / count) * COST_PER_KM_BUCKET, 2)
+        seen += count
+    return round((buckets[-1][0] + 1) * COST_PER_KM_BUCKET, 2)
+
+
+def lane_summary(lane: Dict[str, Any]) -> Dict[str, Any]:
+    revenue = lane.get('revenue', 0.0)
+    profit = revenue - lane.get('revenue_expenses', 0.0)
+    distance = lane.get('distance_km', 0.0)
+    histogram = lane.get('cost_per_km_hist', {})
+    return {
+        'origin': lane['origin'],
+        'destination': lane['destination'],
+        'trips': lane.get('trips', 0),
+        'revenue_trips': lane.get('revenue_trips', 0),
+        'revenue': round(revenue, 2),
+        'expenses': round(lane.get('expenses', 0.0), 2),
+        'profit': round(profit, 2),
+        'margin': round(profit / revenue, 4) if revenue else None,
+        'avg_cost_per_km': round(lane.get('costed_expenses', 0.0) / distance, 2) if distance else None,
+        'cost_per_km': {f"p{p}": histogram_percentile(histogram, p) for p in PERCENTILES}
+    }
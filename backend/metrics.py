@@ -0,0 +1,225 @@
+import bisect
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Tuple[str, ...], amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value:g}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram; observe() is a bisect plus two increments under a lock."""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...],
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        # labels -> [per-bucket counts (+Inf last), sum]
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._series.items())
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else f"{bound:g}"
+                bucket_labels = _labels(self.label_names, labels, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {total:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[Any] = []
+        self._collectors: List[Callable[[], Iterable[str]]] = []
+
+    def counter(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help_text, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, label_names: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, label_names, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[str]]):
+        """Collector returns ready-made exposition lines, evaluated at scrape time (e.g. gauges)."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+
+class RequestMetricsMiddleware:
+    """Pure ASGI middleware (no BaseHTTPMiddleware task/queue overhead).
+
+    Labels by route template rather than raw path, so /trips/{trip_id} is one series.
+    """
+
+    def __init__(self, app, duration: Histogram, requests: Counter):
+        self.app = app
+        self.duration = duration
+        self.requests = requests
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get('route')
+            template = getattr(route, 'path', None) or 'unmatched'
+            labels = (scope['method'], template, str(status))
+            self.duration.observe(labels[:2], time.perf_counter() - start)
+            self.requests.inc(labels)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Per-collection, per-command durations and document counts from PyMongo's command monitoring."""
+
+    IGNORED = frozenset({
+        'hello', 'ismaster', 'isMaster', 'ping', 'buildinfo', 'buildInfo', 'saslStart',
+        'saslContinue', 'endSessions', 'killCursors', 'abortTransaction', 'commitTransaction'
+    })
+
+    def __init__(self, duration: Histogram, documents: Counter, failures: Counter):
+        self.duration = duration
+        self.documents = documents
+        self.failures = failures
+        self._inflight: Dict[Tuple[int, Any], Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _collection(command_name: str, command: Dict[str, Any]) -> str:
+        if command_name == 'getMore':
+            return str(command.get('collection', '-'))
+        target = command.get(command_name)
+        return target if isinstance(target, str) else '-'
+
+    @staticmethod
+    def _document_count(command_name: str, reply: Dict[str, Any]) -> Optional[int]:
+        cursor = reply.get('cursor')
+        if isinstance(cursor, dict):
+            return len(cursor.get('firstBatch', cursor.get('nextBatch', ())))
+        if command_name in ('insert', 'update', 'delete'):
+            return reply.get('n')
+        if command_name == 'findAndModify':
+            return 1 if reply.get('value') is not None else 0
+        return None
+
+    def started(self, event):
+        if event.command_name in self.IGNORED:
+            return
+        with self._lock:
+            self._inflight[(event.request_id, event.connection_id)] = (
+                self._collection(event.command_name, event.command),
+                event.command_name
+            )
+
+    def succeeded(self, event):
+        with self._lock:
+            labels = self._inflight.pop((event.request_id, event.connection_id), None)
+        if labels is None:
+            return
+        self.duration.observe(labels, event.duration_micros / 1e6)
+        count = self._document_count(event.command_name, event.reply)
+        if count:
+            self.documents.inc(labels, count)
+
+    def failed(self, event):
+        with self._lock:
+            labels = self._inflight.pop((event.request_id, event.connection_id), None)
+        if labels is None:
+            return
+        self.duration.observe(labels, event.duration_micros / 1e6)
+        self.failures.inc(labels)
+
+
+registry = MetricsRegistry()
+http_request_duration = registry.histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route template.', ('method', 'route')
+)
+http_requests = registry.counter(
+    'http_requests_total', 'HTTP requests by route template and status code.', ('method', 'route', 'status')
+)
+mongodb_command_duration = registry.histogram(
+    'mongodb_command_duration_seconds', 'MongoDB command latency by collection and command.',
+    ('collection', 'command')
+)
+mongodb_command_documents = registry.counter(
+    'mongodb_command_documents_total', 'Documents returned or affected by MongoDB commands.',
+    ('collection', 'command')
+)
+mongodb_command_failures = registry.counter(
+    'mongodb_command_failures_total', 'Failed MongoDB commands.', ('collection', 'command')
+)
+mongo_command_listener = MongoCommandMetrics(mongodb_command_duration, mongodb_command_documents, mongodb_command_failures)
@@ -0,0 +1,141 @@
+import asyncio
+import codecs
+import csv
+import io
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+
+import bcrypt
+
+
+# Kept verbatim: leading or trailing spaces in a password are part of it
+UNSTRIPPED_FIELDS = ('password',)
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+async def read_limited(chunks: AsyncIterator[bytes], max_bytes: int) -> bytes:
+    """Buffer a request body, giving up as soon as it passes max_bytes."""
+    body = bytearray()
+    async for chunk in chunks:
+        body += chunk
+        if len(body) > max_bytes:
+            raise UploadTooLarge(f"Upload larger than {max_bytes} bytes")
+    return bytes(body)
+
+
+def parse_rows(body: bytes, content_type: str) -> List[Dict[str, Any]]:
+    """CSV with a header row, or a JSON list of objects (optionally wrapped as {"drivers": [...]})."""
+    if 'csv' in content_type:
+        reader = csv.DictReader(io.StringIO(body.decode('utf-8-sig')))
+        rows = []
+        for row in reader:
+            fields = {key.strip(): value or '' for key, value in row.items() if key}
+            rows.append({key: value if key in UNSTRIPPED_FIELDS else value.strip() for key, value in fields.items()})
+        return rows
+    data = json.loads(body)
+    if isinstance(data, dict):
+        data = data.get('drivers')
+    if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+        raise ValueError("Expected a list of driver objects")
+    return data
+
+
+def _hash_password(password: str) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+
+class PasswordHasher:
+    """bcrypt across a process pool, created on first use inside the worker that needs it.
+
+    Children are spawned rather than forked so they never inherit Motor's threads or sockets.
+    """
+
+    def __init__(self, processes: Optional[int] = None):
+        self.processes = processes or os.cpu_count() or 1
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+    async def hash_many(self, passwords: List[str]) -> List[str]:
+        loop = asyncio.get_running_loop()
+        executor = self._executor()
+        return list(await asyncio.gather(*(loop.run_in_executor(executor, _hash_password, p) for p in passwords)))
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+def failed_rows(write_errors: List[Dict[str, Any]], duplicate_message: str) -> Dict[int, str]:
+    """Map insert_many(ordered=False) write errors to {document index: message}."""
+    return {
+        error['index']: duplicate_message if error.get('code') == 11000 else error.get('errmsg', "Insert failed")
+        for error in write_errors
+    }
+
+
+def stream_format(content_type: str) -> Optional[str]:
+    if 'csv' in content_type:
+        return 'csv'
+    if 'ndjson' in content_type or 'jsonl' in content_type or 'json-seq' in content_type:
+        return 'ndjson'
+    return None
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], max_line: int = 64 * 1024) -> AsyncIterator[str]:
+    """Decode and split an upload as it arrives; only the current partial line is buffered."""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    pending = ''
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split('\n')
+        for line in lines:
+            yield line.rstrip('\r')
+        if len(pending) > max_line:
+            raise ValueError(f"Line longer than {max_line} characters")
+    pending += decoder.decode(b'', final=True)
+    if pending.strip():
+        yield pending.rstrip('\r')
+
+
+async def iter_records(chunks: AsyncIterator[bytes], fmt: str) -> AsyncIterator[Tuple[int, Union[Dict[str, Any], str]]]:
+    """(row number, record) pairs, or (row number, error message) for rows that do not parse.
+
+    CSV rows are parsed line by line, so quoted fields cannot contain newlines.
+    """
+    header: Optional[List[str]] = None
+    row_number = 0
+    async for line in iter_lines(chunks):
+        if not line.strip():
+            continue
+        if fmt == 'csv':
+            values = next(csv.reader([line]))
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            row_number += 1
+            if len(values) > len(header):
+                yield row_number, f"Expected {len(header)} columns, got {len(values)}"
+                continue
+            yield row_number, {name: value.strip() for name, value in zip(header, values) if name}
+        else:
+            row_number += 1
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield row_number, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield row_number, "Expected a JSON object"
+                continue
+            yield row_number, record
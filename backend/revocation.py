@@ -0,0 +1,136 @@
+import asyncio
+import hashlib
+import logging
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Fixed-size bit array with k hash positions per key (double hashing over one blake2b digest)."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str) -> Iterable[int]:
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class RevocationList:
+    """In-memory view of the revoked_tokens denylist.
+
+    A bloom miss means the token was never revoked, so the usual check costs no round trip;
+    only a hit (a revoked token or a rare false positive) is confirmed against Mongo. Every
+    refresh_interval seconds each worker adds the entries revoked since its last refresh; every
+    rebuild_interval it rebuilds the filter from the whole denylist, which drops entries whose
+    tokens have expired. Revocations made on this worker apply at once.
+    """
+
+    # Other workers stamp revoked_at before their write is visible, and their clocks drift; re-reading
+    # this much of the previous window catches those late arrivals
+    REFRESH_OVERLAP = timedelta(seconds=60)
+
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.001, refresh_interval: float = 30.0,
+                 rebuild_interval: float = 3600.0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self._filter = BloomFilter(capacity, error_rate)
+        self._since: Optional[str] = None
+        self._rebuilt_at: Optional[datetime] = None
+        self.checks = 0
+        self.confirmations = 0
+        self.false_positives = 0
+
+    def load(self, token_ids: Iterable[str]):
+        token_ids = list(token_ids)
+        # Grow past the configured capacity rather than let the false-positive rate climb
+        bloom = BloomFilter(max(self.capacity, 2 * len(token_ids)), self.error_rate)
+        for token_id in token_ids:
+            bloom.add(token_id)
+        self._filter = bloom
+
+    async def refresh(self, collection):
+        now = datetime.now(timezone.utc)
+        since = (now - self.REFRESH_OVERLAP).isoformat()
+        if (self._since is None or self._filter.count >= self._filter.capacity
+                or (now - self._rebuilt_at).total_seconds() >= self.rebuild_interval):
+            docs = await collection.find({'expires_at': {'$gt': now}}, {'_id': 1}).to_list(None)
+            self.load(doc['_id'] for doc in docs)
+            self._rebuilt_at = now
+        else:
+            # revoked_at is an ISO string in UTC, so string order is time order
+            docs = await collection.find(
+                {'revoked_at': {'$gt': self._since}, 'expires_at': {'$gt': now}},
+                {'_id': 1}
+            ).to_list(None)
+            for doc in docs:
+                # The overlap re-reads recent entries; skipping known ones keeps count honest
+                if doc['_id'] not in self._filter:
+                    self._filter.add(doc['_id'])
+        self._since = since
+
+    async def run(self, collection):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh(collection)
+            except Exception as e:
+                logger.error(f"Revocation list refresh failed: {str(e)}")
+
+    async def revoke(self, collection, token_id: str, user_id: str, expires_at: datetime) -> bool:
+        """True if this call revoked the token, False if it was already revoked.
+
+        The upsert is atomic, so of two concurrent calls for one token exactly one gets True.
+        """
+        # expires_at is a BSON date so the TTL index can remove the entry once the token is dead anyway
+        result = await collection.update_one(
+            {'_id': token_id},
+            {'$setOnInsert': {'user_id': user_id, 'expires_at': expires_at,
+                              'revoked_at': datetime.now(timezone.utc).isoformat()}},
+            upsert=True
+        )
+        self._filter.add(token_id)
+        return result.upserted_id is not None
+
+    async def is_revoked(self, collection, token_id: str) -> bool:
+        self.checks += 1
+        if token_id not in self._filter:
+            return False
+        self.confirmations += 1
+        if await collection.find_one({'_id': token_id}, {'_id': 1}):
+            return True
+        self.false_positives += 1
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'entries': self._filter.count,
+            'filter_bits': self._filter.size,
+            'hashes': self._filter.hashes,
+            'checks': self.checks,
+            'confirmations': self.confirmations,
+            'false_positives': self.false_positives,
+            'refresh_interval': self.refresh_interval,
+            'rebuild_interval': self.rebuild_interval,
+            'rebuilt_at': self._rebuilt_at.isoformat() if self._rebuilt_at else None
+        }
@@ -0,0 +1,102 @@
+import difflib
+import heapq
+import json
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from geo import haversine_km
+
+
+def _normalize(name: str) -> str:
+    return re.sub(r"[^a-z0-9]+", ' ', (name or '').lower()).strip()
+
+
+class RoadGraph:
+    """Undirected road network between cities, with A* routing and fuzzy city lookup."""
+
+    def __init__(self, cities: Dict[str, Dict[str, Any]], roads: List[List[Any]], cache_size: int = 4096):
+        self.coords = {name: (city['lat'], city['lon']) for name, city in cities.items()}
+        self.adjacency: Dict[str, List[Tuple[str, float]]] = {name: [] for name in cities}
+        for a, b, km in roads:
+            self.adjacency[a].append((b, float(km)))
+            self.adjacency[b].append((a, float(km)))
+        self._names = {_normalize(name): name for name in cities}
+        for name, city in cities.items():
+            for alias in city.get('aliases', []):
+                self._names[_normalize(alias)] = name
+        # Per-instance caches so tests and reloads never share state
+        self.resolve = lru_cache(maxsize=cache_size)(self._resolve)
+        self._route = lru_cache(maxsize=cache_size)(self._shortest_path)
+
+    @classmethod
+    def load(cls, path: Path, cache_size: int = 4096) -> 'RoadGraph':
+        data = json.loads(Path(path).read_text(encoding='utf-8'))
+        return cls(data['cities'], data['roads'], cache_size)
+
+    def _resolve(self, name: str) -> Optional[str]:
+        normalized = _normalize(name)
+        # "Pune, Maharashtra" and "Pune 411001" should both land on Pune
+        candidates = [normalized, _normalize(name.split(',')[0]), re.sub(r"\s*\d+$", '', normalized)]
+        for candidate in candidates:
+            if candidate in self._names:
+                return self._names[candidate]
+        close = difflib.get_close_matches(candidates[1], self._names.keys(), n=1, cutoff=0.8)
+        return self._names[close[0]] if close else None
+
+    def _heuristic(self, city: str, target: str) -> float:
+        # Great-circle distance never exceeds road distance, so A* stays exact
+        return haversine_km(*self.coords[city], *self.coords[target])
+
+    def _shortest_path(self, source: str, target: str) -> Optional[Tuple[float, Tuple[str, ...]]]:
+        best = {source: 0.0}
+        previous: Dict[str, str] = {}
+        frontier = [(self._heuristic(source, target), 0.0, source)]
+        while frontier:
+            _, distance, city = heapq.heappop(frontier)
+            if city == target:
+                path = [city]
+                while path[-1] != source:
+                    path.append(previous[path[-1]])
+                return distance, tuple(reversed(path))
+            if distance > best[city]:
+                continue
+            for neighbour, km in self.adjacency[city]:
+                candidate = distance + km
+                if candidate < best.get(neighbour, float('inf')):
+                    best[neighbour] = candidate
+                    previous[neighbour] = city
+                    heapq.heappush(frontier, (candidate + self._heuristic(neighbour, target), candidate, neighbour))
+        return None
+
+    def route(self, origin: str, destination: str) -> Optional[Dict[str, Any]]:
+        source, target = self.resolve(origin), self.resolve(destination)
+        if source is None or target is None:
+            return None
+        # Roads are two-way: cache each unordered pair once
+        forward = source <= target
+        found = self._route(*((source, target) if forward else (target, source)))
+        if found is None:
+            return None
+        distance, path = found
+        return {
+            'origin': source,
+            'destination': target,
+            'distance_km': round(distance, 1),
+            'path': list(path if forward else reversed(path))
+        }
+
+    def distance(self, origin: str, destination: str) -> Optional[float]:
+        found = self.route(origin, destination)
+        return found['distance_km'] if found else None
+
+    def stats(self) -> Dict[str, Any]:
+        routes = self._route.cache_info()
+        names = self.resolve.cache_info()
+        return {
+            'cities': len(self.coords),
+            'roads': sum(len(edges) for edges in self.adjacency.values()) // 2,
+            'route_cache': {'hits': routes.hits, 'misses': routes.misses, 'size': routes.currsize},
+            'name_cache': {'hits': names.hits, 'misses': names.misses, 'size': names.currsize}
+        }
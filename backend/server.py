@@ -1,37 +1,191 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Request
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Query, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
 import os
+import asyncio
+from contextlib import AsyncExitStack, asynccontextmanager
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, ConfigDict, ValidationError
+from typing import List, Optional, Dict, Any, Tuple
 import uuid
-from datetime import datetime, timezone, timedelta
+import hashlib
+import math
+import time
+from datetime import date, datetime, timezone, timedelta
 import jwt
 import bcrypt
-from emergentintegrations.llm.chat import LlmChat, UserMessage
-from emergentintegrations.payments.stripe.checkout import StripeCheckout, CheckoutSessionResponse, CheckoutStatusResponse, CheckoutSessionRequest
+from cache import ReadCache, InMemoryCacheBackend
+from events import EventHub
+from telemetry import TelemetryBuffer
+from trips import TRIP_TRANSITIONS, VEHICLE_TRANSITIONS, vehicle_update
+from dispatch import suggest_assignments
+from cost_model import CostModel
+from roads import RoadGraph
+from lanes import lane_id, lane_increments, lane_summary
+from anomaly import AnomalyScorer
+from database import MongoResources, bind, client_options
+from metrics import (
+    PROMETHEUS_CONTENT_TYPE, RequestMetricsMiddleware, http_request_duration, http_requests,
+    mongo_command_listener, registry
+)
+from admission import AdmissionController, AdmissionRejected, InMemoryLimiterBackend, RouteClass
+from onboarding import PasswordHasher, UploadTooLarge, failed_rows, iter_records, parse_rows, read_limited, stream_format
+from revocation import RevocationList
+from slow_queries import RouteContextMiddleware, SlowQueryLog, worst_offenders_pipeline
+from pymongo.errors import BulkWriteError, CollectionInvalid, DuplicateKeyError, OperationFailure, PyMongoError
+from integrations import IntegrationNotConfigured, get_llm_provider, get_payment_provider
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Request and Mongo command metrics for /metrics; per worker process
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Commands slower than SLOW_QUERY_MS are explained and logged to a capped collection; 0 disables
+slow_query_log = SlowQueryLog(
+    threshold_ms=float(os.environ.get('SLOW_QUERY_MS', '100')),
+    explain_interval=float(os.environ.get('SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS', '300'))
+)
+SLOW_QUERY_LOG_BYTES = int(os.environ.get('SLOW_QUERY_LOG_BYTES', str(16 * 1024 * 1024)))
+
+# MongoDB connection, opened per worker in the lifespan below
+mongo_options = client_options()
+mongo_options['event_listeners'] = [
+    listener for listener, enabled in ((mongo_command_listener, METRICS_ENABLED), (slow_query_log, slow_query_log.enabled))
+    if enabled
+]
+mongo = MongoResources(os.environ['MONGO_URL'], os.environ['DB_NAME'], mongo_options)
+client, db = bind(mongo)
 
 # JWT Configuration
 JWT_SECRET = os.environ.get('JWT_SECRET', 'transops_secret_key_2025')
 JWT_ALGORITHM = 'HS256'
-JWT_EXPIRATION_HOURS = 168  # 7 days
+# Access tokens carry the claims routes need and are short-lived; refresh tokens are rotated on use
+ACCESS_TOKEN_MINUTES = int(os.environ.get('ACCESS_TOKEN_MINUTES', '15'))
+REFRESH_TOKEN_DAYS = int(os.environ.get('REFRESH_TOKEN_DAYS', '30'))
+
+# Revoked token ids, mirrored into a per-worker bloom filter
+revocation_list = RevocationList(
+    capacity=int(os.environ.get('REVOCATION_FILTER_CAPACITY', '100000')),
+    refresh_interval=float(os.environ.get('REVOCATION_REFRESH_SECONDS', '30')),
+    rebuild_interval=float(os.environ.get('REVOCATION_REBUILD_SECONDS', '3600'))
+)
+
+# Admin access
+ADMIN_EMAILS = {email.strip() for email in os.environ.get('ADMIN_EMAILS', '').split(',') if email.strip()}
+
+# Read cache for per-owner lists; each worker has its own, so the TTL bounds cross-worker staleness
+read_cache = ReadCache(InMemoryCacheBackend(
+    max_entries=int(os.environ.get('READ_CACHE_MAX_ENTRIES', '1000')),
+    max_bytes=int(os.environ.get('READ_CACHE_MAX_BYTES', str(64 * 1024 * 1024))),
+    ttl_seconds=float(os.environ.get('READ_CACHE_TTL_SECONDS', '60'))
+))
+
+# Per-caller token buckets and concurrency caps for CPU- or LLM-heavy routes; per worker process
+ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+admission = AdmissionController(
+    InMemoryLimiterBackend(max_keys=int(os.environ.get('ADMISSION_MAX_KEYS', '100000'))),
+    {
+        'auth': RouteClass(
+            rate=float(os.environ.get('ADMISSION_AUTH_PER_MINUTE', '10')) / 60,
+            burst=int(os.environ.get('ADMISSION_AUTH_BURST', '5')),
+            concurrency=int(os.environ.get('ADMISSION_AUTH_CONCURRENCY', '2')),
+            max_inflight=int(os.environ.get('ADMISSION_AUTH_MAX_INFLIGHT', '32'))
+        ),
+        # Every anonymous login or register from one address, whatever email it names
+        'auth_address': RouteClass(
+            rate=float(os.environ.get('ADMISSION_AUTH_ADDRESS_PER_MINUTE', '60')) / 60,
+            burst=int(os.environ.get('ADMISSION_AUTH_ADDRESS_BURST', '30')),
+            concurrency=int(os.environ.get('ADMISSION_AUTH_ADDRESS_CONCURRENCY', '8'))
+        ),
+        'ai': RouteClass(
+            rate=float(os.environ.get('ADMISSION_AI_PER_MINUTE', '6')) / 60,
+            burst=int(os.environ.get('ADMISSION_AI_BURST', '3')),
+            concurrency=int(os.environ.get('ADMISSION_AI_CONCURRENCY', '1')),
+            max_inflight=int(os.environ.get('ADMISSION_AI_MAX_INFLIGHT', '16'))
+        )
+    }
+)
+
+# bcrypt for bulk onboarding runs in a per-worker process pool, started on first use
+password_hasher = PasswordHasher(int(os.environ.get('BCRYPT_PROCESSES', '0')) or None)
+BULK_DRIVER_MAX_ROWS = int(os.environ.get('BULK_DRIVER_MAX_ROWS', '1000'))
+BULK_DRIVER_MAX_BYTES = int(os.environ.get('BULK_DRIVER_MAX_BYTES', str(1024 * 1024)))
+
+# Streaming vehicle import: rows are written in insert_many chunks as the upload is parsed
+VEHICLE_IMPORT_CHUNK_SIZE = int(os.environ.get('VEHICLE_IMPORT_CHUNK_SIZE', '1000'))
+VEHICLE_IMPORT_MAX_ROWS = int(os.environ.get('VEHICLE_IMPORT_MAX_ROWS', '50000'))
+VEHICLE_IMPORT_MAX_ERRORS = 100
+
+# Live event fan-out to WebSocket subscribers connected to this worker
+event_hub = EventHub(max_queue=int(os.environ.get('WS_MAX_QUEUE', '100')))
+
+# GPS points are batched in memory and written with insert_many
+telemetry_buffer = TelemetryBuffer(
+    flush_size=int(os.environ.get('TELEMETRY_FLUSH_SIZE', '5000')),
+    flush_interval=float(os.environ.get('TELEMETRY_FLUSH_INTERVAL_SECONDS', '1.0')),
+    recheck_interval=float(os.environ.get('TELEMETRY_RECHECK_SECONDS', '30')),
+    on_distance=lambda tracks: telemetry_distance_updated(tracks)
+)
+
+# Trip cost predictor, trained offline from completed trips and reloaded from its artifact
+COST_MODEL_PATH = Path(os.environ.get('COST_MODEL_PATH', ROOT_DIR / 'models' / 'trip_cost_model.npz'))
+COST_MODEL_RETRAIN_HOURS = float(os.environ.get('COST_MODEL_RETRAIN_HOURS', '24'))
+COST_MODEL_MIN_SAMPLES = 50
+cost_model: Optional[CostModel] = None
+
+# Bundled road network for offline distances; answers are cached per city pair
+road_graph = RoadGraph.load(ROOT_DIR / 'data' / 'road_graph.json', int(os.environ.get('ROAD_CACHE_SIZE', '4096')))
+
+# Expenses far above a driver's or lane's usual amount wait for owner review
+anomaly_scorer = AnomalyScorer(
+    threshold=float(os.environ.get('ANOMALY_Z_THRESHOLD', '3.5')),
+    min_samples=int(os.environ.get('ANOMALY_MIN_SAMPLES', '10')),
+    flush_interval=float(os.environ.get('ANOMALY_FLUSH_INTERVAL_SECONDS', '60'))
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.ready = False
+    mongo.connect()
+    # Money movements and trip status changes run in multi-document transactions where the server
+    # supports them; a standalone mongod gets the same writes in order, without all-or-nothing commits
+    app.state.transactions = await mongo.supports_transactions()
+    if not app.state.transactions:
+        logger.warning(
+            "MongoDB does not support transactions; wallet, pool and trip writes run unsessioned. "
+            "Run it as a replica set (a single-node rs0 is enough) for atomic commits"
+        )
+    await create_indexes()
+    background_tasks = [
+        start_telemetry_flusher(),
+        await start_anomaly_scorer(),
+        start_cost_model(),
+        start_slow_query_log(),
+        await start_revocation_list()
+    ]
+    app.state.ready = True
+    try:
+        yield
+    finally:
+        app.state.ready = False
+        for task in background_tasks:
+            task.cancel()
+        await telemetry_buffer.flush(db.trip_telemetry, db.trips)
+        await anomaly_scorer.flush(db.anomaly_stats)
+        await slow_query_log.flush(db)
+        password_hasher.close()
+        mongo.close()
 
 # Create the main app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 api_router = APIRouter(prefix="/api")
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 # Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -51,6 +205,12 @@ class UserLogin(BaseModel):
     email: str
     password: str
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
+
 class User(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -75,12 +235,55 @@ class Wallet(BaseModel):
     food_limit: float = 0.0
     lodging_limit: float = 0.0
     repair_limit: float = 0.0
+    limit_periods: Dict[str, str] = Field(default_factory=dict)  # category -> daily, trip, monthly
+    spend: Dict[str, Dict[str, Any]] = Field(default_factory=dict)  # category -> {period, amount}
+    ledger_seq: int = 0  # sequence number of the last wallet_ledger entry
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class WalletTopup(BaseModel):
     amount: float
+    driver_id: Optional[str] = None
     category: Optional[str] = None  # fuel, toll, food, lodging, repair
 
+class LedgerEntry(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    wallet_id: str
+    driver_id: str
+    seq: int
+    entry_type: str  # debit, credit
+    amount: float
+    balance_after: float
+    reason: str  # expense, checkout, disbursement, refund
+    reference_id: Optional[str] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class FundingPool(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    fleet_owner_id: str
+    balance: float = 0.0
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class Disbursement(BaseModel):
+    driver_id: str
+    amount: float
+
+class BulkDisbursement(BaseModel):
+    disbursements: List[Disbursement]
+
+class WalletLimits(BaseModel):
+    fuel_limit: Optional[float] = None
+    toll_limit: Optional[float] = None
+    food_limit: Optional[float] = None
+    lodging_limit: Optional[float] = None
+    repair_limit: Optional[float] = None
+    limit_periods: Optional[Dict[str, str]] = None  # category -> daily, trip, monthly
+
+class BulkWalletLimitsUpdate(BaseModel):
+    template: WalletLimits
+    driver_ids: Optional[List[str]] = None  # None applies the template to the whole fleet
+
 class ExpenseCreate(BaseModel):
     trip_id: str
     driver_id: str
@@ -99,29 +302,40 @@ class Expense(BaseModel):
     description: Optional[str] = None
     location: Optional[str] = None
     status: str = "approved"  # approved, pending, rejected
+    anomaly_score: Optional[float] = None
+    anomaly_key: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class ExpenseReview(BaseModel):
+    decision: str  # approve, reject
+    note: Optional[str] = None
+
 class TripCreate(BaseModel):
-    driver_id: str
-    vehicle_id: str
+    driver_id: Optional[str] = None  # leave both unset, then apply /dispatch/suggest via /dispatch/assign
+    vehicle_id: Optional[str] = None
     origin: str
     destination: str
     cargo_details: Optional[str] = None
+    cargo_weight: Optional[float] = None
+    vehicle_type: Optional[str] = None  # required vehicle type, if any
     estimated_distance: Optional[float] = None
 
 class Trip(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     fleet_owner_id: str
-    driver_id: str
-    vehicle_id: str
+    driver_id: Optional[str] = None
+    vehicle_id: Optional[str] = None
     origin: str
     destination: str
     cargo_details: Optional[str] = None
+    cargo_weight: Optional[float] = None
+    vehicle_type: Optional[str] = None
     estimated_distance: Optional[float] = None
     actual_distance: Optional[float] = None
     status: str = "planned"  # planned, in_progress, completed, cancelled
     total_expenses: float = 0.0
+    pending_expenses: int = 0  # expenses awaiting review; the trip cannot complete until they are settled
     revenue: Optional[float] = None
     profitability: Optional[float] = None
     ai_route_suggestion: Optional[str] = None
@@ -130,6 +344,37 @@ class Trip(BaseModel):
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
 
+class TelemetryPoint(BaseModel):
+    lat: float = Field(ge=-90, le=90)
+    lon: float = Field(ge=-180, le=180)
+    ts: datetime
+    speed: Optional[float] = None  # km/h
+
+class TelemetryBatch(BaseModel):
+    points: List[TelemetryPoint] = Field(max_length=10000)
+
+class TripStatusChange(BaseModel):
+    trip_id: str
+    status: str
+    revenue: Optional[float] = Field(default=None, ge=0)
+
+class DriverImportRow(BaseModel):
+    email: str = Field(min_length=3)
+    password: str = Field(min_length=6)
+    name: str = Field(min_length=1)
+    phone: Optional[str] = None
+
+class BulkTripStatusUpdate(BaseModel):
+    transitions: List[TripStatusChange] = Field(max_length=500)
+
+class DispatchAssignment(BaseModel):
+    trip_id: str
+    driver_id: str
+    vehicle_id: str
+
+class DispatchAssign(BaseModel):
+    assignments: List[DispatchAssignment] = Field(max_length=500)  # the assignments from /dispatch/suggest fit as-is
+
 class VehicleCreate(BaseModel):
     registration_number: str
     vehicle_type: str
@@ -165,6 +410,7 @@ class ReturnLoad(BaseModel):
     weight: Optional[float] = None
     offered_price: float
     pickup_date: Optional[str] = None
+    estimated_distance: Optional[float] = None
     status: str = "available"  # available, booked, completed
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
@@ -189,6 +435,7 @@ class PaymentTransaction(BaseModel):
     currency: str = "usd"
     payment_status: str = "pending"  # pending, paid, failed, expired
     status: str = "initiated"  # initiated, completed, failed
+    credited: bool = False  # set once the wallet or funding pool has received the amount
     metadata: Optional[Dict[str, Any]] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
@@ -204,35 +451,610 @@ class AIRouteRequest(BaseModel):
 
 # ==================== Helper Functions ====================
 
-def create_token(user_id: str, email: str, role: str) -> str:
+def create_token(user: Dict) -> str:
+    now = datetime.now(timezone.utc)
+    payload = {
+        'user_id': user['id'],
+        'email': user['email'],
+        'role': user['role'],
+        'fleet_owner_id': user.get('fleet_owner_id'),
+        'type': 'access',
+        'jti': str(uuid.uuid4()),
+        'iat': now,
+        'exp': now + timedelta(minutes=ACCESS_TOKEN_MINUTES)
+    }
+    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+def create_refresh_token(user_id: str) -> str:
+    now = datetime.now(timezone.utc)
     payload = {
         'user_id': user_id,
-        'email': email,
-        'role': role,
-        'exp': datetime.now(timezone.utc) + timedelta(hours=JWT_EXPIRATION_HOURS)
+        'type': 'refresh',
+        'jti': str(uuid.uuid4()),
+        'iat': now,
+        'exp': now + timedelta(days=REFRESH_TOKEN_DAYS)
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
-def verify_token(token: str) -> Dict:
+def token_pair(user: Dict) -> Dict:
+    return {
+        'token': create_token(user),
+        'refresh_token': create_refresh_token(user['id']),
+        'expires_in': ACCESS_TOKEN_MINUTES * 60
+    }
+
+def verify_token(token: str, token_type: str = 'access') -> Dict:
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    # Tokens issued before access/refresh types existed have no jti and cannot be revoked
+    if payload.get('type') != token_type or 'jti' not in payload:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return payload
+
+async def authenticate(token: str, token_type: str = 'access') -> Dict:
+    payload = verify_token(token, token_type)
+    if await revocation_list.is_revoked(db.revoked_tokens, payload['jti']):
+        raise HTTPException(status_code=401, detail="Token revoked")
+    return payload
+
+async def revoke_token(payload: Dict) -> bool:
+    return await revocation_list.revoke(
+        db.revoked_tokens, payload['jti'], payload['user_id'], datetime.fromtimestamp(payload['exp'], timezone.utc)
+    )
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    token = credentials.credentials
-    payload = verify_token(token)
-    user = await db.users.find_one({'id': payload['user_id']}, {'_id': 0})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user
+    # Built from the token's claims; only /auth/me and token refresh read the user document
+    payload = await authenticate(credentials.credentials)
+    return {
+        'id': payload['user_id'],
+        'email': payload['email'],
+        'role': payload['role'],
+        'fleet_owner_id': payload.get('fleet_owner_id')
+    }
+
+async def get_admin_user(current_user: dict = Depends(get_current_user)):
+    if current_user['email'] not in ADMIN_EMAILS:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
+
+def client_address(request: Request) -> str:
+    # Behind a reverse proxy this is the real client only when uvicorn runs with --proxy-headers and
+    # --forwarded-allow-ips (or FORWARDED_ALLOW_IPS) set to the proxy's address; otherwise it is the proxy
+    return request.client.host if request.client else 'unknown'
+
+async def admission_callers(request: Request, route_class: str) -> List[Tuple[str, str]]:
+    # Signature check only, no user lookup: a rejected request should cost next to nothing
+    authorization = request.headers.get('authorization', '')
+    if authorization.startswith('Bearer '):
+        try:
+            return [(route_class, f"user:{jwt.decode(authorization[7:], JWT_SECRET, algorithms=[JWT_ALGORITHM])['user_id']}")]
+        except (jwt.InvalidTokenError, KeyError):
+            pass
+    caller = f"ip:{client_address(request)}"
+    if route_class != 'auth':
+        return [(route_class, caller)]
+    # Login and register are anonymous. The per-email bucket keeps everyone behind one NAT or proxy
+    # address from sharing a single tight budget while repeated guesses at an account stay limited;
+    # the looser per-address bucket stops one client from getting a fresh burst with every new email
+    try:
+        body = await request.json()
+    except ValueError:
+        body = None
+    email = body.get('email') if isinstance(body, dict) else None
+    if isinstance(email, str) and email.strip():
+        return [('auth_address', caller), (route_class, f"{caller}:email:{email.strip().lower()}")]
+    return [('auth_address', caller), (route_class, caller)]
+
+def admit(route_class: str):
+    async def dependency(request: Request):
+        if not ADMISSION_ENABLED:
+            yield
+            return
+        try:
+            async with AsyncExitStack() as stack:
+                for name, caller in await admission_callers(request, route_class):
+                    await stack.enter_async_context(admission.admit(name, caller))
+                yield
+        except AdmissionRejected as e:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={'Retry-After': str(max(1, math.ceil(e.retry_after)))}
+            )
+    return dependency
+
+EXPENSE_CATEGORIES = ('fuel', 'toll', 'food', 'lodging', 'repair')
+# Pending expenses are debited but stay out of totals and analytics until approved
+COUNTED_EXPENSE_STATUS = {'$nin': ['pending', 'rejected']}
+LIMIT_PERIODS = ('daily', 'trip', 'monthly')
+DEFAULT_LIMIT_PERIOD = 'daily'
+
+def spend_period_key(period: str, trip_id: str, now: datetime) -> str:
+    if period == 'trip':
+        return f"trip:{trip_id}"
+    if period == 'monthly':
+        return f"month:{now.strftime('%Y-%m')}"
+    return f"day:{now.strftime('%Y-%m-%d')}"
+
+def period_spend(wallet: Dict, category: str, trip_id: str, now: datetime) -> float:
+    period = wallet.get('limit_periods', {}).get(category, DEFAULT_LIMIT_PERIOD)
+    counter = wallet.get('spend', {}).get(category) or {}
+    if counter.get('period') != spend_period_key(period, trip_id, now):
+        return 0.0
+    return counter.get('amount', 0.0)
+
+def _spend_period_expr(category: str, trip_id: str, now: datetime) -> Dict:
+    # Server-side mirror of spend_period_key, driven by the wallet's own period setting
+    period = {'$ifNull': [f'$limit_periods.{category}', DEFAULT_LIMIT_PERIOD]}
+    return {'$switch': {
+        'branches': [
+            {'case': {'$eq': [period, p]}, 'then': {'$literal': spend_period_key(p, trip_id, now)}}
+            for p in LIMIT_PERIODS
+        ],
+        'default': {'$literal': spend_period_key(DEFAULT_LIMIT_PERIOD, trip_id, now)}
+    }}
+
+def _period_spend_expr(category: str, trip_id: str, now: datetime) -> Dict:
+    return {'$cond': [
+        {'$eq': [f'$spend.{category}.period', _spend_period_expr(category, trip_id, now)]},
+        f'$spend.{category}.amount',
+        0
+    ]}
+
+def spend_limit_filter(driver_id: str, category: str, amount: float, trip_id: str, now: datetime) -> Dict:
+    return {
+        'driver_id': driver_id,
+        'balance': {'$gte': amount},
+        '$expr': {'$lte': [{'$add': [_period_spend_expr(category, trip_id, now), amount]}, f'${category}_limit']}
+    }
+
+def spend_limit_update(category: str, amount: float, trip_id: str, now: datetime) -> List[Dict]:
+    return [{'$set': {
+        'balance': {'$subtract': ['$balance', amount]},
+        'ledger_seq': {'$add': [{'$ifNull': ['$ledger_seq', 0]}, 1]},
+        f'spend.{category}': {
+            'period': _spend_period_expr(category, trip_id, now),
+            'amount': {'$add': [_period_spend_expr(category, trip_id, now), amount]}
+        }
+    }}]
+
+def spend_refund_update(category: str, amount: float, trip_id: str, spent_at: datetime) -> List[Dict]:
+    # Gives the limit headroom back only if the spend period it was charged to is still current
+    return [{'$set': {
+        'balance': {'$add': ['$balance', amount]},
+        'ledger_seq': {'$add': [{'$ifNull': ['$ledger_seq', 0]}, 1]},
+        f'spend.{category}.amount': {'$cond': [
+            {'$eq': [f'$spend.{category}.period', _spend_period_expr(category, trip_id, spent_at)]},
+            {'$max': [{'$subtract': [f'$spend.{category}.amount', amount]}, 0]},
+            f'$spend.{category}.amount'
+        ]}
+    }}]
+
+def wallet_limits_update(limits: WalletLimits) -> Dict:
+    update_data = {}
+    for category in EXPENSE_CATEGORIES:
+        limit = getattr(limits, f'{category}_limit')
+        if limit is not None:
+            update_data[f'{category}_limit'] = limit
+    
+    for category, period in (limits.limit_periods or {}).items():
+        if category not in EXPENSE_CATEGORIES:
+            raise HTTPException(status_code=400, detail=f"Invalid expense category: {category}")
+        if period not in LIMIT_PERIODS:
+            raise HTTPException(status_code=400, detail=f"Invalid {category} limit period")
+        update_data[f'limit_periods.{category}'] = period
+    
+    if not update_data:
+        raise HTTPException(status_code=400, detail="No limits provided")
+    
+    return update_data
+
+def canonical_lane(trip: Dict) -> Tuple[str, str]:
+    # Resolve through the road graph so "Bangalore" and "Bengaluru" share a lane
+    origin = road_graph.resolve(trip['origin']) or trip['origin'].strip()
+    destination = road_graph.resolve(trip['destination']) or trip['destination'].strip()
+    return origin, destination
+
+def anomaly_keys(expense: Dict, trip: Optional[Dict]) -> List[str]:
+    keys = [f"driver:{expense['driver_id']}:{expense['category']}"]
+    if trip:
+        origin, destination = canonical_lane(trip)
+        keys.append(f"lane:{origin.lower()}>{destination.lower()}:{expense['category']}")
+    return keys
+
+LEDGER_SNAPSHOT_INTERVAL = 100
+WALLET_LEDGER_PROJECTION = {'_id': 0, 'id': 1, 'driver_id': 1, 'balance': 1, 'ledger_seq': 1}
+
+def ledger_entry(wallet: Dict, entry_type: str, amount: float, reason: str, reference_id: Optional[str] = None) -> Dict:
+    # wallet is the post-update document, so its ledger_seq and balance belong to this entry
+    entry = LedgerEntry(
+        wallet_id=wallet['id'],
+        driver_id=wallet['driver_id'],
+        seq=wallet['ledger_seq'],
+        entry_type=entry_type,
+        amount=amount,
+        balance_after=round(wallet['balance'], 2),
+        reason=reason,
+        reference_id=reference_id
+    )
+    entry_dict = entry.model_dump()
+    entry_dict['created_at'] = entry_dict['created_at'].isoformat()
+    return entry_dict
+
+async def record_ledger_entries(entries: List[Dict], session=None):
+    await db.wallet_ledger.insert_many(entries, ordered=False, session=session)
+    
+    snapshots = [
+        {
+            'wallet_id': e['wallet_id'],
+            'driver_id': e['driver_id'],
+            'seq': e['seq'],
+            'balance': e['balance_after'],
+            'created_at': e['created_at']
+        }
+        for e in entries if e['seq'] % LEDGER_SNAPSHOT_INTERVAL == 0
+    ]
+    if snapshots:
+        await db.wallet_snapshots.insert_many(snapshots, ordered=False, session=session)
+
+async def run_transaction(callback):
+    # with_transaction retries the callback on transient write conflicts. A standalone mongod has no
+    # transactions: the callback then runs once with session=None, its writes land one by one in
+    # order, and a callback that fails a check after an earlier write must undo that write itself
+    if not getattr(app.state, 'transactions', False):
+        return await callback(None)
+    async with await client.start_session() as session:
+        return await session.with_transaction(callback)
+
+async def update_wallet_with_ledger(
+    query: Dict, update: Any, entry_type: str, amount: float, reason: str,
+    reference_id: Optional[str] = None, session=None
+) -> Optional[Dict]:
+    # Run inside run_transaction, so the balance change and its ledger entry commit together. Without
+    # transactions a failed ledger insert shows up as a missing seq in /reconcile
+    wallet = await db.wallets.find_one_and_update(
+        query,
+        update,
+        projection=WALLET_LEDGER_PROJECTION,
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+    if wallet:
+        await record_ledger_entries([ledger_entry(wallet, entry_type, amount, reason, reference_id)], session=session)
+    return wallet
+
+async def opening_snapshot(wallet: Dict) -> Dict:
+    # Wallets from before the ledger have no seq 0 snapshot. Their opening balance is the balance
+    # before the first entry, or the current balance if nothing has been recorded yet
+    first = await db.wallet_ledger.find_one({'wallet_id': wallet['id'], 'seq': 1}, {'_id': 0})
+    if first:
+        signed = first['amount'] if first['entry_type'] == 'credit' else -first['amount']
+        balance = round(first['balance_after'] - signed, 2)
+    elif not wallet.get('ledger_seq'):
+        balance = round(wallet['balance'], 2)
+    else:
+        return {'seq': 0, 'balance': 0.0}
+    snapshot = {
+        'wallet_id': wallet['id'],
+        'driver_id': wallet['driver_id'],
+        'seq': 0,
+        'balance': balance,
+        'created_at': datetime.now(timezone.utc).isoformat()
+    }
+    await db.wallet_snapshots.update_one(
+        {'wallet_id': wallet['id'], 'seq': 0},
+        {'$setOnInsert': snapshot},
+        upsert=True
+    )
+    return snapshot
+
+async def get_accessible_wallet(driver_id: str, current_user: dict) -> Dict:
+    if current_user['role'] == 'driver':
+        if driver_id != current_user['id']:
+            raise HTTPException(status_code=403, detail="Drivers can only view their own wallet")
+    else:
+        driver = await db.users.find_one(
+            {'id': driver_id, 'role': 'driver', 'fleet_owner_id': current_user['id']},
+            {'_id': 0, 'id': 1}
+        )
+        if not driver:
+            raise HTTPException(status_code=404, detail="Driver not found")
+    
+    wallet = await db.wallets.find_one({'driver_id': driver_id}, {'_id': 0})
+    if not wallet:
+        raise HTTPException(status_code=404, detail="Wallet not found")
+    
+    return wallet
+
+async def credit_funding_pool(fleet_owner_id: str, amount: float, session=None):
+    pool = FundingPool(fleet_owner_id=fleet_owner_id)
+    pool_dict = pool.model_dump()
+    pool_dict['created_at'] = pool_dict['created_at'].isoformat()
+    del pool_dict['balance'], pool_dict['fleet_owner_id']
+    await db.funding_pools.update_one(
+        {'fleet_owner_id': fleet_owner_id},
+        {'$inc': {'balance': amount}, '$setOnInsert': pool_dict},
+        upsert=True,
+        session=session
+    )
+
+async def disburse_from_pool(fleet_owner_id: str, disbursements: List[Disbursement]) -> Dict:
+    amounts = {}
+    for item in disbursements:
+        if item.amount <= 0:
+            raise HTTPException(status_code=400, detail="Disbursement amounts must be positive")
+        if item.driver_id in amounts:
+            raise HTTPException(status_code=400, detail=f"Duplicate driver: {item.driver_id}")
+        amounts[item.driver_id] = item.amount
+    
+    if not amounts:
+        raise HTTPException(status_code=400, detail="No disbursements provided")
+    
+    drivers = await db.users.find(
+        {'id': {'$in': list(amounts)}, 'role': 'driver', 'fleet_owner_id': fleet_owner_id},
+        {'_id': 0, 'id': 1}
+    ).to_list(None)
+    unknown = set(amounts) - {d['id'] for d in drivers}
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Drivers not in your fleet: {', '.join(sorted(unknown))}")
+    
+    total = round(sum(amounts.values()), 2)
+    transfer_id = str(uuid.uuid4())
+    
+    async def disburse(session):
+        # The conditional pool debit comes first, so a short pool writes nothing at all
+        pool = await db.funding_pools.find_one_and_update(
+            {'fleet_owner_id': fleet_owner_id, 'balance': {'$gte': total}},
+            {'$inc': {'balance': -total}},
+            projection={'_id': 0, 'balance': 1},
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+        if not pool:
+            raise HTTPException(status_code=400, detail="Insufficient funding pool balance")
+        
+        if session is None:
+            # No transaction to read the bulk update back consistently, so each wallet is credited
+            # with its own ledger entry; amounts that found no wallet go back into the pool
+            missing = {}
+            for driver_id, amount in amounts.items():
+                wallet = await update_wallet_with_ledger(
+                    {'driver_id': driver_id},
+                    {'$inc': {'balance': amount, 'ledger_seq': 1}},
+                    'credit', amount, 'disbursement', transfer_id
+                )
+                if not wallet:
+                    missing[driver_id] = amount
+            if missing:
+                pool = await db.funding_pools.find_one_and_update(
+                    {'fleet_owner_id': fleet_owner_id},
+                    {'$inc': {'balance': round(sum(missing.values()), 2)}},
+                    projection={'_id': 0, 'balance': 1},
+                    return_document=ReturnDocument.AFTER
+                )
+            return pool, missing
+        
+        result = await db.wallets.bulk_write(
+            [
+                UpdateOne({'driver_id': driver_id}, {'$inc': {'balance': amount, 'ledger_seq': 1}})
+                for driver_id, amount in amounts.items()
+            ],
+            ordered=False,
+            session=session
+        )
+        if result.matched_count != len(amounts):
+            raise HTTPException(status_code=400, detail="One or more driver wallets not found")
+        
+        # Reads inside the transaction see our own writes, so seq and balance line up
+        wallets = await db.wallets.find(
+            {'driver_id': {'$in': list(amounts)}},
+            WALLET_LEDGER_PROJECTION,
+            session=session
+        ).to_list(None)
+        await record_ledger_entries(
+            [ledger_entry(w, 'credit', amounts[w['driver_id']], 'disbursement', transfer_id) for w in wallets],
+            session=session
+        )
+        return pool, {}
+    
+    # Pool debit and every wallet credit commit or abort together
+    pool, missing = await run_transaction(disburse)
+    if missing:
+        logger.error(f"Disbursement {transfer_id}: no wallet for {', '.join(sorted(missing))}; amounts returned to the pool")
+    
+    return {
+        'total': round(total - sum(missing.values()), 2),
+        'pool_balance': round(pool['balance'], 2),
+        'results': [
+            {'driver_id': driver_id, 'amount': amount, 'status': 'wallet_not_found' if driver_id in missing else 'credited'}
+            for driver_id, amount in amounts.items()
+        ]
+    }
+
+ROLLUP_GRANULARITIES = ('day', 'week', 'month')
+ROLLUP_DIMENSIONS = ('total', 'category', 'vehicle', 'driver')
+
+def rollup_bucket(day: date, granularity: str) -> str:
+    if granularity == 'week':
+        day = day - timedelta(days=day.weekday())
+    elif granularity == 'month':
+        day = day.replace(day=1)
+    return day.isoformat()
+
+def rollup_id(fleet_owner_id: str, granularity: str, dimension: str, key: str, bucket: str) -> str:
+    return f"{fleet_owner_id}:{granularity}:{dimension}:{key}:{bucket}"
+
+async def update_expense_rollups(trip: Dict, expense: Dict):
+    # One upsert per (granularity, dimension) so chart reads never touch raw expenses
+    day = datetime.fromisoformat(expense['created_at']).astimezone(timezone.utc).date()
+    keys = {
+        'total': 'all',
+        'category': expense['category'],
+        'vehicle': trip.get('vehicle_id') or 'unknown',
+        'driver': expense['driver_id']
+    }
+    operations = []
+    for granularity in ROLLUP_GRANULARITIES:
+        bucket = rollup_bucket(day, granularity)
+        for dimension, key in keys.items():
+            operations.append(UpdateOne(
+                {'_id': rollup_id(trip['fleet_owner_id'], granularity, dimension, key, bucket)},
+                {
+                    '$inc': {'total': expense['amount'], 'count': 1},
+                    '$setOnInsert': {
+                        'fleet_owner_id': trip['fleet_owner_id'],
+                        'granularity': granularity,
+                        'dimension': dimension,
+                        'key': key,
+                        'bucket': bucket
+                    }
+                },
+                upsert=True
+            ))
+    await db.expense_rollups.bulk_write(operations, ordered=False)
+
+def expense_rollup_pipeline(fleet_owner_id: str, trip_ids: List[str]) -> List[Dict]:
+    # created_at is stored as an ISO string in UTC, so the first 10 bytes are the day
+    return [
+        {'$match': {'trip_id': {'$in': trip_ids}, 'status': COUNTED_EXPENSE_STATUS}},
+        {'$lookup': {'from': 'trips', 'localField': 'trip_id', 'foreignField': 'id', 'as': 'trip'}},
+        {'$set': {
+            'day': {'$dateFromString': {'dateString': {'$substrBytes': ['$created_at', 0, 10]}, 'format': '%Y-%m-%d'}},
+            'vehicle_id': {'$ifNull': [{'$first': '$trip.vehicle_id'}, 'unknown']}
+        }},
+        {'$set': {
+            'granularity': list(ROLLUP_GRANULARITIES),
+            'dims': [
+                {'dimension': 'total', 'key': 'all'},
+                {'dimension': 'category', 'key': '$category'},
+                {'dimension': 'vehicle', 'key': '$vehicle_id'},
+                {'dimension': 'driver', 'key': '$driver_id'}
+            ]
+        }},
+        {'$unwind': '$granularity'},
+        {'$unwind': '$dims'},
+        {'$group': {
+            '_id': {
+                'granularity': '$granularity',
+                'dimension': '$dims.dimension',
+                'key': '$dims.key',
+                'bucket': {'$dateTrunc': {'date': '$day', 'unit': '$granularity', 'startOfWeek': 'monday'}}
+            },
+            'total': {'$sum': '$amount'},
+            'count': {'$sum': 1}
+        }},
+        {'$set': {'bucket': {'$dateToString': {'date': '$_id.bucket', 'format': '%Y-%m-%d'}}}},
+        {'$project': {
+            '_id': {'$concat': [
+                {'$literal': fleet_owner_id}, ':', '$_id.granularity', ':', '$_id.dimension', ':', '$_id.key', ':', '$bucket'
+            ]},
+            'fleet_owner_id': {'$literal': fleet_owner_id},
+            'granularity': '$_id.granularity',
+            'dimension': '$_id.dimension',
+            'key': '$_id.key',
+            'bucket': 1,
+            'total': 1,
+            'count': 1
+        }},
+        {'$merge': {'into': 'expense_rollups', 'on': '_id', 'whenMatched': 'replace', 'whenNotMatched': 'insert'}}
+    ]
+
+def event_topics(user: Dict) -> List[str]:
+    if user['role'] == 'fleet_owner':
+        return [f"fleet:{user['id']}"]
+    return [f"driver:{user['id']}"]
+
+def publish_event(event: Dict, fleet_owner_id: Optional[str] = None, driver_id: Optional[str] = None):
+    if fleet_owner_id:
+        event_hub.publish(f"fleet:{fleet_owner_id}", event)
+    if driver_id:
+        event_hub.publish(f"driver:{driver_id}", event)
+
+def user_scope(user: Dict) -> str:
+    return f"owner:{user['id']}" if user['role'] == 'fleet_owner' else f"driver:{user['id']}"
+
+GLOBAL_SCOPE = 'global'
+
+async def bump_versions(scopes: List[str], resources: List[str]):
+    # Call after the write so a reader never pairs new data with a stale version
+    await db.scope_versions.bulk_write(
+        [UpdateOne({'_id': scope}, {'$inc': {resource: 1 for resource in resources}}, upsert=True) for scope in scopes],
+        ordered=False
+    )
+
+async def telemetry_distance_updated(tracks: List[Any]):
+    # actual_distance is part of the trips list, so cached ETags for it must change
+    scopes = {f"driver:{track.driver_id}" for track in tracks} | {f"owner:{track.fleet_owner_id}" for track in tracks if track.fleet_owner_id}
+    await bump_versions(list(scopes), ['trips'])
+
+async def list_etag(scope: str, resource: str, *variant: Any) -> str:
+    versions = await db.scope_versions.find_one({'_id': scope}, {'_id': 0, resource: 1})
+    version = versions.get(resource, 0) if versions else 0
+    digest = hashlib.sha1(f"{scope}|{resource}|{variant}".encode('utf-8')).hexdigest()[:12]
+    return f'W/"{resource}-{digest}-{version}"'
+
+def not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    if_none_match = [tag.strip() for tag in request.headers.get('if-none-match', '').split(',')]
+    if etag in if_none_match or '*' in if_none_match:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+COST_MODEL_TRAINING_PIPELINE = [
+    {'$match': {'status': 'completed', 'total_expenses': {'$gt': 0}}},
+    {'$sort': {'completed_at': -1}},
+    {'$limit': 50000},
+    {'$lookup': {'from': 'vehicles', 'localField': 'vehicle_id', 'foreignField': 'id', 'as': 'vehicle'}},
+    {'$project': {
+        '_id': 0,
+        'origin': 1,
+        'destination': 1,
+        'estimated_distance': 1,
+        'cargo_weight': 1,
+        'total_expenses': 1,
+        'vehicle_type': {'$ifNull': ['$vehicle_type', {'$first': '$vehicle.vehicle_type'}]}
+    }}
+]
+
+async def retrain_cost_model() -> Optional[Dict]:
+    global cost_model
+    trips = await db.trips.aggregate(COST_MODEL_TRAINING_PIPELINE).to_list(None)
+    if len(trips) < COST_MODEL_MIN_SAMPLES:
+        logger.info(f"Cost model not trained: {len(trips)} completed trips, need {COST_MODEL_MIN_SAMPLES}")
+        return None
+    
+    # Fitting and writing the artifact are CPU/disk bound; keep them off the event loop
+    model = await asyncio.to_thread(CostModel.fit, trips, [t['total_expenses'] for t in trips])
+    await asyncio.to_thread(model.save, COST_MODEL_PATH)
+    cost_model = model
+    logger.info(f"Cost model retrained: {model.metadata}")
+    return model.metadata
+
+async def maintain_cost_model():
+    global cost_model
+    loaded_mtime = COST_MODEL_PATH.stat().st_mtime if COST_MODEL_PATH.exists() else None
+    while True:
+        try:
+            mtime = COST_MODEL_PATH.stat().st_mtime if COST_MODEL_PATH.exists() else None
+            if mtime is None or time.time() - mtime > COST_MODEL_RETRAIN_HOURS * 3600:
+                await retrain_cost_model()
+                loaded_mtime = COST_MODEL_PATH.stat().st_mtime if COST_MODEL_PATH.exists() else None
+            elif mtime != loaded_mtime:
+                # Another worker retrained; pick up its artifact
+                cost_model = CostModel.load(COST_MODEL_PATH)
+                loaded_mtime = mtime
+        except Exception as e:
+            logger.error(f"Cost model maintenance error: {str(e)}")
+        await asyncio.sleep(3600)
 
 # ==================== Auth Routes ====================
 
-@api_router.post("/auth/register")
+@api_router.post("/auth/register", dependencies=[Depends(admit('auth'))])
 async def register(user_data: UserRegister):
     # Check if user exists
     existing_user = await db.users.find_one({'email': user_data.email})
@@ -246,7 +1068,7 @@ async def register(user_data: UserRegister):
             raise HTTPException(status_code=400, detail="Invalid Fleet Owner ID")
     
     # Hash password
-    hashed_password = bcrypt.hashpw(user_data.password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    hashed_password = (await asyncio.to_thread(bcrypt.hashpw, user_data.password.encode('utf-8'), bcrypt.gensalt())).decode('utf-8')
     
     # Create user
     user = User(
@@ -261,7 +1083,11 @@ async def register(user_data: UserRegister):
     user_dict['password'] = hashed_password
     user_dict['created_at'] = user_dict['created_at'].isoformat()
     
-    await db.users.insert_one(user_dict)
+    try:
+        await db.users.insert_one(user_dict)
+    except DuplicateKeyError:
+        # Two registrations for the same email raced past the check above
+        raise HTTPException(status_code=400, detail="Email already registered")
     
     # If driver, create wallet
     if user_data.role == 'driver':
@@ -276,37 +1102,72 @@ async def register(user_data: UserRegister):
         perf_dict['created_at'] = perf_dict['created_at'].isoformat()
         perf_dict['updated_at'] = perf_dict['updated_at'].isoformat()
         await db.driver_performance.insert_one(perf_dict)
-    
-    token = create_token(user.id, user.email, user.role)
+        
+        if user_data.fleet_owner_id:
+            await bump_versions([f"owner:{user_data.fleet_owner_id}"], ['drivers'])
+            await read_cache.invalidate('drivers', user_data.fleet_owner_id)
     
     return {
-        'token': token,
+        **token_pair(user_dict),
         'user': user.model_dump()
     }
 
-@api_router.post("/auth/login")
+@api_router.post("/auth/login", dependencies=[Depends(admit('auth'))])
 async def login(credentials: UserLogin):
     user = await db.users.find_one({'email': credentials.email})
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    # Verify password
-    if not bcrypt.checkpw(credentials.password.encode('utf-8'), user['password'].encode('utf-8')):
+    # Verify password off the event loop; bcrypt holds a core for tens of milliseconds
+    if not await asyncio.to_thread(bcrypt.checkpw, credentials.password.encode('utf-8'), user['password'].encode('utf-8')):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    token = create_token(user['id'], user['email'], user['role'])
-    
     del user['password']
     del user['_id']
     
     return {
-        'token': token,
+        **token_pair(user),
         'user': user
     }
 
+@api_router.post("/auth/refresh")
+async def refresh_tokens(refresh_data: RefreshRequest):
+    payload = await authenticate(refresh_data.refresh_token, 'refresh')
+    # Re-read the user so role or fleet changes reach the next access token
+    user = await db.users.find_one({'id': payload['user_id']}, {'_id': 0, 'password': 0})
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found")
+    
+    # Rotate: the presented refresh token cannot be used again. The revoke is the gate, so of
+    # two concurrent refreshes with the same token only the one that inserted it gets a new pair
+    if not await revoke_token(payload):
+        raise HTTPException(status_code=401, detail="Token revoked")
+    return token_pair(user)
+
+@api_router.post("/auth/logout")
+async def logout(
+    logout_data: LogoutRequest,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
+    # Each token is revoked on its own: an access token that is missing or already expired
+    # (the usual case after 15 idle minutes) must not stop the refresh token being revoked
+    tokens = [(logout_data.refresh_token, 'refresh'), (credentials.credentials if credentials else None, 'access')]
+    for token, token_type in tokens:
+        if not token:
+            continue
+        try:
+            payload = verify_token(token, token_type)
+        except HTTPException:
+            continue
+        await revoke_token(payload)
+    return {'message': "Logged out"}
+
 @api_router.get("/auth/me")
 async def get_me(current_user: dict = Depends(get_current_user)):
-    return current_user
+    user = await db.users.find_one({'id': current_user['id']}, {'_id': 0, 'password': 0})
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
 
 # ==================== Wallet Routes ====================
 
@@ -326,9 +1187,102 @@ async def topup_wallet(topup_data: WalletTopup, current_user: dict = Depends(get
     if current_user['role'] == 'driver':
         raise HTTPException(status_code=403, detail="Drivers cannot topup their own wallets")
     
-    # Find driver wallet (assuming fleet owner is topping up driver's wallet)
-    # In real scenario, you'd pass driver_id
-    return {"message": "Use payment checkout to add balance"}
+    if not topup_data.driver_id:
+        raise HTTPException(status_code=400, detail="driver_id is required")
+    
+    return await disburse_from_pool(
+        current_user['id'],
+        [Disbursement(driver_id=topup_data.driver_id, amount=topup_data.amount)]
+    )
+
+@api_router.get("/wallet/{driver_id}/statement")
+async def get_wallet_statement(
+    driver_id: str,
+    from_seq: Optional[int] = None,
+    to_seq: Optional[int] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    limit: int = 500,
+    current_user: dict = Depends(get_current_user)
+):
+    wallet = await get_accessible_wallet(driver_id, current_user)
+    
+    query = {'wallet_id': wallet['id']}
+    if from_seq is not None or to_seq is not None:
+        query['seq'] = {}
+        if from_seq is not None:
+            query['seq']['$gte'] = from_seq
+        if to_seq is not None:
+            query['seq']['$lte'] = to_seq
+    if start or end:
+        query['created_at'] = {}
+        if start:
+            query['created_at']['$gte'] = start
+        if end:
+            query['created_at']['$lte'] = end
+    
+    entries = await db.wallet_ledger.find(query, {'_id': 0}).sort('seq', 1).to_list(min(max(limit, 1), 5000))
+    
+    return {
+        'wallet_id': wallet['id'],
+        'driver_id': driver_id,
+        'balance': round(wallet['balance'], 2),
+        'entries': entries
+    }
+
+@api_router.get("/wallet/{driver_id}/reconcile")
+async def reconcile_wallet(driver_id: str, current_user: dict = Depends(get_current_user)):
+    wallet = await get_accessible_wallet(driver_id, current_user)
+    wallet_seq = wallet.get('ledger_seq', 0)
+    
+    # Replay only what happened after the latest snapshot
+    snapshot = await db.wallet_snapshots.find_one(
+        {'wallet_id': wallet['id'], 'seq': {'$lte': wallet_seq}},
+        {'_id': 0},
+        sort=[('seq', -1)]
+    ) or await opening_snapshot(wallet)
+    base_seq = snapshot['seq']
+    balance = snapshot['balance']
+    
+    entries = await db.wallet_ledger.find(
+        {'wallet_id': wallet['id'], 'seq': {'$gt': base_seq, '$lte': wallet_seq}},
+        {'_id': 0, 'seq': 1, 'entry_type': 1, 'amount': 1}
+    ).sort('seq', 1).to_list(None)
+    
+    for entry in entries:
+        balance += entry['amount'] if entry['entry_type'] == 'credit' else -entry['amount']
+    
+    seen = {entry['seq'] for entry in entries}
+    missing_seqs = [seq for seq in range(base_seq + 1, wallet_seq + 1) if seq not in seen]
+    ledger_balance = round(balance, 2)
+    
+    return {
+        'wallet_id': wallet['id'],
+        'driver_id': driver_id,
+        'wallet_balance': round(wallet['balance'], 2),
+        'ledger_balance': ledger_balance,
+        'snapshot_seq': base_seq,
+        'ledger_seq': wallet_seq,
+        'entries_replayed': len(entries),
+        'missing_seqs': missing_seqs,
+        'consistent': not missing_seqs and abs(ledger_balance - round(wallet['balance'], 2)) < 0.01
+    }
+
+@api_router.get("/funding-pool")
+async def get_funding_pool(current_user: dict = Depends(get_current_user)):
+    if current_user['role'] != 'fleet_owner':
+        raise HTTPException(status_code=403, detail="Only fleet owners have funding pools")
+    
+    pool = await db.funding_pools.find_one({'fleet_owner_id': current_user['id']}, {'_id': 0})
+    
+    return pool or {'fleet_owner_id': current_user['id'], 'balance': 0.0}
+
+@api_router.post("/wallet/disburse")
+async def bulk_disburse(disbursement_data: BulkDisbursement, current_user: dict = Depends(get_current_user)):
+    if current_user['role'] != 'fleet_owner':
+        raise HTTPException(status_code=403, detail="Only fleet owners can fund wallets")
+    
+    return await disburse_from_pool(current_user['id'], disbursement_data.disbursements)
 
 @api_router.put("/wallet/{driver_id}/limits")
 async def update_wallet_limits(
@@ -338,27 +1292,87 @@ async def update_wallet_limits(
     food_limit: Optional[float] = None,
     lodging_limit: Optional[float] = None,
     repair_limit: Optional[float] = None,
+    fuel_period: Optional[str] = None,
+    toll_period: Optional[str] = None,
+    food_period: Optional[str] = None,
+    lodging_period: Optional[str] = None,
+    repair_period: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
     if current_user['role'] != 'fleet_owner':
         raise HTTPException(status_code=403, detail="Only fleet owners can update limits")
     
-    update_data = {}
-    if fuel_limit is not None:
-        update_data['fuel_limit'] = fuel_limit
-    if toll_limit is not None:
-        update_data['toll_limit'] = toll_limit
-    if food_limit is not None:
-        update_data['food_limit'] = food_limit
-    if lodging_limit is not None:
-        update_data['lodging_limit'] = lodging_limit
-    if repair_limit is not None:
-        update_data['repair_limit'] = repair_limit
+    driver = await db.users.find_one(
+        {'id': driver_id, 'role': 'driver', 'fleet_owner_id': current_user['id']},
+        {'_id': 0, 'id': 1}
+    )
+    if not driver:
+        raise HTTPException(status_code=404, detail="Driver not found")
+    
+    periods = {
+        'fuel': fuel_period,
+        'toll': toll_period,
+        'food': food_period,
+        'lodging': lodging_period,
+        'repair': repair_period
+    }
+    update_data = wallet_limits_update(WalletLimits(
+        fuel_limit=fuel_limit,
+        toll_limit=toll_limit,
+        food_limit=food_limit,
+        lodging_limit=lodging_limit,
+        repair_limit=repair_limit,
+        limit_periods={category: period for category, period in periods.items() if period is not None}
+    ))
     
     await db.wallets.update_one({'driver_id': driver_id}, {'$set': update_data})
     
     return {"message": "Wallet limits updated successfully"}
 
+@api_router.put("/wallet/limits/bulk")
+async def bulk_update_wallet_limits(bulk_data: BulkWalletLimitsUpdate, current_user: dict = Depends(get_current_user)):
+    if current_user['role'] != 'fleet_owner':
+        raise HTTPException(status_code=403, detail="Only fleet owners can update limits")
+    
+    update_data = wallet_limits_update(bulk_data.template)
+    
+    # Only drivers in the caller's fleet are eligible
+    query = {'role': 'driver', 'fleet_owner_id': current_user['id']}
+    if bulk_data.driver_ids is not None:
+        query['id'] = {'$in': bulk_data.driver_ids}
+    drivers = await db.users.find(query, {'_id': 0, 'id': 1}).to_list(None)
+    owned_ids = [d['id'] for d in drivers]
+    
+    updated_ids = set()
+    if owned_ids:
+        result = await db.wallets.bulk_write(
+            [UpdateOne({'driver_id': driver_id}, {'$set': update_data}) for driver_id in owned_ids],
+            ordered=False
+        )
+        if result.matched_count == len(owned_ids):
+            updated_ids = set(owned_ids)
+        else:
+            wallets = await db.wallets.find({'driver_id': {'$in': owned_ids}}, {'_id': 0, 'driver_id': 1}).to_list(None)
+            updated_ids = {w['driver_id'] for w in wallets}
+    
+    requested_ids = bulk_data.driver_ids if bulk_data.driver_ids is not None else owned_ids
+    owned = set(owned_ids)
+    results = []
+    for driver_id in requested_ids:
+        if driver_id in updated_ids:
+            status = 'updated'
+        elif driver_id in owned:
+            status = 'wallet_not_found'
+        else:
+            status = 'driver_not_found'
+        results.append({'driver_id': driver_id, 'status': status})
+    
+    return {
+        'updated': len(updated_ids),
+        'failed': len(results) - len(updated_ids),
+        'results': results
+    }
+
 # ==================== Trip Routes ====================
 
 @api_router.post("/trips")
@@ -366,6 +1380,27 @@ async def create_trip(trip_data: TripCreate, current_user: dict = Depends(get_cu
     if current_user['role'] != 'fleet_owner':
         raise HTTPException(status_code=403, detail="Only fleet owners can create trips")
     
+    vehicle = None
+    if trip_data.vehicle_id:
+        vehicle = await db.vehicles.find_one(
+            {'id': trip_data.vehicle_id, 'fleet_owner_id': current_user['id']},
+            {'_id': 0, 'status': 1, 'vehicle_type': 1}
+        )
+        if not vehicle:
+            raise HTTPException(status_code=404, detail="Vehicle not found")
+        if vehicle['status'] != 'available':
+            raise HTTPException(status_code=409, detail="Vehicle is not available")
+    
+    if trip_data.driver_id:
+        driver = await db.users.find_one(
+            {'id': trip_data.driver_id, 'role': 'driver', 'fleet_owner_id': current_user['id']},
+            {'_id': 0, 'id': 1}
+        )
+        if not driver:
+            raise HTTPException(status_code=404, detail="Driver not found")
+        if await db.trips.find_one({'driver_id': trip_data.driver_id, 'status': 'in_progress'}, {'_id': 1}):
+            raise HTTPException(status_code=409, detail="Driver is on another trip")
+    
     trip = Trip(
         fleet_owner_id=current_user['id'],
         driver_id=trip_data.driver_id,
@@ -373,9 +1408,24 @@ async def create_trip(trip_data: TripCreate, current_user: dict = Depends(get_cu
         origin=trip_data.origin,
         destination=trip_data.destination,
         cargo_details=trip_data.cargo_details,
-        estimated_distance=trip_data.estimated_distance
+        cargo_weight=trip_data.cargo_weight,
+        vehicle_type=trip_data.vehicle_type,
+        estimated_distance=(
+            trip_data.estimated_distance
+            if trip_data.estimated_distance is not None
+            else road_graph.distance(trip_data.origin, trip_data.destination)
+        )
     )
     
+    if cost_model:
+        trip.ai_cost_prediction = cost_model.predict({
+            'origin': trip.origin,
+            'destination': trip.destination,
+            'estimated_distance': trip.estimated_distance,
+            'cargo_weight': trip.cargo_weight,
+            'vehicle_type': trip.vehicle_type or (vehicle or {}).get('vehicle_type')
+        })
+    
     trip_dict = trip.model_dump()
     trip_dict['created_at'] = trip_dict['created_at'].isoformat()
     if trip_dict['started_at']:
@@ -384,11 +1434,19 @@ async def create_trip(trip_data: TripCreate, current_user: dict = Depends(get_cu
         trip_dict['completed_at'] = trip_dict['completed_at'].isoformat()
     
     await db.trips.insert_one(trip_dict)
+    scopes = [f"owner:{trip.fleet_owner_id}"]
+    if trip.driver_id:
+        scopes.append(f"driver:{trip.driver_id}")
+    await bump_versions(scopes, ['trips'])
     
     return trip.model_dump()
 
 @api_router.get("/trips")
-async def get_trips(current_user: dict = Depends(get_current_user)):
+async def get_trips(request: Request, response: Response, current_user: dict = Depends(get_current_user)):
+    cached = not_modified(request, response, await list_etag(user_scope(current_user), 'trips'))
+    if cached:
+        return cached
+    
     if current_user['role'] == 'fleet_owner':
         trips = await db.trips.find({'fleet_owner_id': current_user['id']}, {'_id': 0}).to_list(1000)
     else:
@@ -404,74 +1462,318 @@ async def get_trip(trip_id: str, current_user: dict = Depends(get_current_user))
     
     return trip
 
-@api_router.put("/trips/{trip_id}/status")
-async def update_trip_status(trip_id: str, status: str, current_user: dict = Depends(get_current_user)):
-    update_data = {'status': status}
+TRANSITION_ERRORS = {
+    'trip_not_found': (404, "Trip not found"),
+    'forbidden': (403, "Not allowed to update this trip"),
+    'invalid_transition': (400, "Invalid status transition"),
+    'duplicate': (400, "Trip listed more than once"),
+    'unassigned': (400, "Trip has no driver or vehicle assigned"),
+    'revenue_not_allowed': (403, "Only the fleet owner can record revenue"),
+    'revenue_without_completion': (400, "Revenue can only be recorded when completing a trip"),
+    'vehicle_unavailable': (409, "Vehicle is not available"),
+    'expenses_pending': (409, "Trip has expenses pending review")
+}
+
+def lane_stats_update(trip: Dict, revenue: Optional[float]) -> UpdateOne:
+    origin, destination = canonical_lane(trip)
+    return UpdateOne(
+        {'_id': lane_id(trip['fleet_owner_id'], origin, destination)},
+        {
+            '$inc': lane_increments(trip, revenue),
+            '$setOnInsert': {'fleet_owner_id': trip['fleet_owner_id'], 'origin': origin, 'destination': destination}
+        },
+        upsert=True
+    )
+
+async def apply_trip_transitions(changes: List[TripStatusChange], current_user: dict) -> List[Dict]:
+    # Flush GPS points while the trips are still in_progress so completion sees the final actual_distance
+    if any(change.status == 'completed' for change in changes):
+        await telemetry_buffer.flush(db.trip_telemetry, db.trips)
     
-    if status == 'in_progress':
-        update_data['started_at'] = datetime.now(timezone.utc).isoformat()
-    elif status == 'completed':
-        update_data['completed_at'] = datetime.now(timezone.utc).isoformat()
+    results: List[Dict] = []
+    applied: List[Dict] = []
     
-    await db.trips.update_one({'id': trip_id}, {'$set': update_data})
+    async def transition(session):
+        results.clear()
+        applied.clear()
+        trip_ids = [change.trip_id for change in changes]
+        trips = await db.trips.find(
+            {'id': {'$in': trip_ids}},
+            {
+                '_id': 0, 'id': 1, 'fleet_owner_id': 1, 'driver_id': 1, 'vehicle_id': 1, 'status': 1,
+                'origin': 1, 'destination': 1, 'total_expenses': 1, 'actual_distance': 1,
+                'estimated_distance': 1, 'revenue': 1, 'pending_expenses': 1
+            },
+            session=session
+        ).to_list(None)
+        trips_by_id = {t['id']: t for t in trips}
+        vehicle_ids = list({t['vehicle_id'] for t in trips if t.get('vehicle_id')})
+        vehicles = await db.vehicles.find(
+            {'id': {'$in': vehicle_ids}},
+            {'_id': 0, 'id': 1, 'status': 1},
+            session=session
+        ).to_list(None)
+        vehicle_status = {v['id']: v['status'] for v in vehicles}
+        
+        now = datetime.now(timezone.utc).isoformat()
+        seen = set()
+        trip_ops, vehicle_ops, lane_ops = [], [], []
+        for change in changes:
+            trip = trips_by_id.get(change.trip_id)
+            if change.trip_id in seen:
+                error = 'duplicate'
+            elif not trip:
+                error = 'trip_not_found'
+            elif current_user['id'] not in (trip['fleet_owner_id'], trip['driver_id']):
+                error = 'forbidden'
+            elif change.status not in TRIP_TRANSITIONS.get(trip['status'], ()):
+                error = 'invalid_transition'
+            elif change.status == 'in_progress' and not (trip.get('driver_id') and trip.get('vehicle_id')):
+                error = 'unassigned'
+            elif change.status == 'in_progress' and vehicle_status.get(trip['vehicle_id'], 'available') != 'available':
+                error = 'vehicle_unavailable'
+            elif change.status == 'completed' and trip.get('pending_expenses', 0) > 0:
+                error = 'expenses_pending'
+            elif change.revenue is not None and change.status != 'completed':
+                error = 'revenue_without_completion'
+            elif change.revenue is not None and current_user['id'] != trip['fleet_owner_id']:
+                error = 'revenue_not_allowed'
+            else:
+                error = None
+            seen.add(change.trip_id)
+            
+            if error:
+                results.append({'trip_id': change.trip_id, 'status': 'rejected', 'error': error})
+                continue
+            
+            update_data = {'status': change.status}
+            if change.status == 'in_progress':
+                update_data['started_at'] = now
+            elif change.status == 'completed':
+                update_data['completed_at'] = now
+                revenue = change.revenue if change.revenue is not None else trip.get('revenue')
+                if revenue is not None:
+                    update_data['revenue'] = revenue
+                    update_data['profitability'] = round(revenue - (trip.get('total_expenses') or 0.0), 2)
+                lane_ops.append(lane_stats_update(trip, revenue))
+            trip_ops.append(UpdateOne({'id': trip['id'], 'status': trip['status']}, {'$set': update_data}))
+            
+            vehicle_op = vehicle_update(trip, change.status)
+            if vehicle_op:
+                vehicle_ops.append(vehicle_op)
+                # A second trip in the same batch cannot start on this vehicle
+                vehicle_status[trip['vehicle_id']] = VEHICLE_TRANSITIONS[(trip['status'], change.status)][1]
+            
+            results.append({'trip_id': change.trip_id, 'status': change.status, 'previous_status': trip['status']})
+            applied.append({**trip, 'new_status': change.status})
+        
+        if trip_ops:
+            await db.trips.bulk_write(trip_ops, ordered=False, session=session)
+        if vehicle_ops:
+            await db.vehicles.bulk_write(vehicle_ops, ordered=False, session=session)
+        if lane_ops:
+            await db.lane_stats.bulk_write(lane_ops, session=session)
+    
+    await run_transaction(transition)
+    
+    # Points that arrived during the transaction, applied now that the trips are completed
+    for trip in applied:
+        if trip['new_status'] == 'completed':
+            await telemetry_buffer.finish(trip['id'], db.trip_telemetry, db.trips)
+    
+    if applied:
+        await bump_versions(
+            list({f"owner:{t['fleet_owner_id']}" for t in applied} | {f"driver:{t['driver_id']}" for t in applied if t.get('driver_id')}),
+            ['trips']
+        )
+        for owner_id in {t['fleet_owner_id'] for t in applied if vehicle_update(t, t['new_status'])}:
+            await bump_versions([f"owner:{owner_id}"], ['vehicles'])
+            await read_cache.invalidate('vehicles', owner_id)
+        for trip in applied:
+            publish_event(
+                {'type': 'trip.status', 'trip_id': trip['id'], 'status': trip['new_status']},
+                fleet_owner_id=trip['fleet_owner_id'],
+                driver_id=trip['driver_id']
+            )
+    
+    return results
+
+@api_router.put("/trips/{trip_id}/status")
+async def update_trip_status(
+    trip_id: str,
+    status: str,
+    revenue: Optional[float] = Query(None, ge=0),
+    current_user: dict = Depends(get_current_user)
+):
+    change = TripStatusChange(trip_id=trip_id, status=status, revenue=revenue)
+    result = (await apply_trip_transitions([change], current_user))[0]
+    if 'error' in result:
+        status_code, detail = TRANSITION_ERRORS[result['error']]
+        raise HTTPException(status_code=status_code, detail=detail)
     
     return {"message": "Trip status updated"}
 
+@api_router.post("/trips/status/bulk")
+async def bulk_update_trip_status(bulk_data: BulkTripStatusUpdate, current_user: dict = Depends(get_current_user)):
+    results = await apply_trip_transitions(bulk_data.transitions, current_user)
+    updated = sum(1 for r in results if 'error' not in r)
+    
+    return {
+        'updated': updated,
+        'rejected': len(results) - updated,
+        'results': results
+    }
+
+@api_router.post("/trips/{trip_id}/telemetry")
+async def ingest_telemetry(trip_id: str, batch: TelemetryBatch, current_user: dict = Depends(get_current_user)):
+    if current_user['role'] != 'driver':
+        raise HTTPException(status_code=403, detail="Only drivers can send telemetry")
+    
+    if telemetry_buffer.is_full():
+        raise HTTPException(status_code=503, detail="Telemetry buffer full, retry shortly")
+    
+    # The trip is re-read at most every TELEMETRY_RECHECK_SECONDS per worker; in between, batches are
+    # checked against the in-memory track and the distance update itself only applies to in_progress trips
+    track = telemetry_buffer.track(trip_id)
+    if track is None:
+        trip = await db.trips.find_one(
+            {'id': trip_id},
+            {'_id': 0, 'driver_id': 1, 'fleet_owner_id': 1, 'status': 1}
+        )
+        if not trip:
+            raise HTTPException(status_code=404, detail="Trip not found")
+        if trip['driver_id'] != current_user['id']:
+            raise HTTPException(status_code=403, detail="Not your trip")
+        if trip['status'] != 'in_progress':
+            raise HTTPException(status_code=400, detail="Trip is not in progress")
+        track = telemetry_buffer.start_track(trip_id, trip)
+    elif track.driver_id != current_user['id']:
+        raise HTTPException(status_code=403, detail="Not your trip")
+    
+    telemetry_buffer.add(trip_id, [point.model_dump() for point in batch.points])
+    
+    return {'accepted': len(batch.points)}
+
 # ==================== Expense Routes ====================
 
 @api_router.post("/expenses")
 async def create_expense(expense_data: ExpenseCreate, current_user: dict = Depends(get_current_user)):
-    # Check wallet limits
-    wallet = await db.wallets.find_one({'driver_id': expense_data.driver_id})
-    if not wallet:
-        raise HTTPException(status_code=404, detail="Wallet not found")
-    
-    category_limit_map = {
-        'fuel': wallet.get('fuel_limit', 0),
-        'toll': wallet.get('toll_limit', 0),
-        'food': wallet.get('food_limit', 0),
-        'lodging': wallet.get('lodging_limit', 0),
-        'repair': wallet.get('repair_limit', 0)
-    }
-    
-    limit = category_limit_map.get(expense_data.category, 0)
+    if expense_data.category not in EXPENSE_CATEGORIES:
+        raise HTTPException(status_code=400, detail="Invalid expense category")
     
-    if expense_data.amount > limit:
-        raise HTTPException(status_code=400, detail=f"Expense exceeds {expense_data.category} limit")
+    if expense_data.amount <= 0:
+        raise HTTPException(status_code=400, detail="Expense amount must be positive")
     
-    if wallet['balance'] < expense_data.amount:
-        raise HTTPException(status_code=400, detail="Insufficient wallet balance")
+    trip = await db.trips.find_one(
+        {'id': expense_data.trip_id},
+        {'_id': 0, 'fleet_owner_id': 1, 'vehicle_id': 1, 'origin': 1, 'destination': 1, 'status': 1}
+    )
+    if not trip:
+        raise HTTPException(status_code=404, detail="Trip not found")
+    if trip['status'] == 'completed':
+        raise HTTPException(status_code=400, detail="Expenses cannot be added to a completed trip")
     
+    now = datetime.now(timezone.utc)
     expense = Expense(
         trip_id=expense_data.trip_id,
         driver_id=expense_data.driver_id,
         category=expense_data.category,
         amount=expense_data.amount,
         description=expense_data.description,
-        location=expense_data.location
+        location=expense_data.location,
+        created_at=now
     )
     
+    # In-memory statistics only: no extra round trip on the write path
+    keys = anomaly_keys(expense_data.model_dump(), trip)
+    anomaly = anomaly_scorer.check(keys, expense.amount)
+    if anomaly:
+        expense.status = 'pending'
+        expense.anomaly_score = anomaly['score']
+        expense.anomaly_key = anomaly['key']
+    
     expense_dict = expense.model_dump()
     expense_dict['created_at'] = expense_dict['created_at'].isoformat()
     
-    await db.expenses.insert_one(expense_dict)
+    async def record_expense(session):
+        # Check cumulative limit and balance, then deduct, in a single conditional update
+        wallet = await update_wallet_with_ledger(
+            spend_limit_filter(expense_data.driver_id, expense_data.category, expense_data.amount, expense_data.trip_id, now),
+            spend_limit_update(expense_data.category, expense_data.amount, expense_data.trip_id, now),
+            'debit', expense.amount, 'expense', expense.id,
+            session=session
+        )
+        if not wallet:
+            return None
+        # Completion fixes profitability and lane stats, so the trip must still be open when this commits
+        if expense.status == 'pending':
+            increments = {'pending_expenses': 1}
+        else:
+            increments = {'total_expenses': expense.amount}
+        result = await db.trips.update_one(
+            {'id': expense.trip_id, 'status': {'$ne': 'completed'}},
+            {'$inc': increments},
+            session=session
+        )
+        if not result.matched_count:
+            if session is None:
+                # Nothing to abort: hand the debit straight back
+                await update_wallet_with_ledger(
+                    {'driver_id': expense_data.driver_id},
+                    spend_refund_update(expense_data.category, expense_data.amount, expense_data.trip_id, now),
+                    'credit', expense.amount, 'expense_reversed', expense.id
+                )
+            raise HTTPException(status_code=400, detail="Expenses cannot be added to a completed trip")
+        await db.expenses.insert_one(expense_dict, session=session)
+        return wallet
+    
+    wallet = await run_transaction(record_expense)
     
-    # Deduct from wallet
-    await db.wallets.update_one(
-        {'driver_id': expense_data.driver_id},
-        {'$inc': {'balance': -expense_data.amount}}
-    )
+    if not wallet:
+        wallet = await db.wallets.find_one({'driver_id': expense_data.driver_id}, {'_id': 0})
+        if not wallet:
+            raise HTTPException(status_code=404, detail="Wallet not found")
+        
+        limit = wallet.get(f'{expense_data.category}_limit', 0)
+        spent = period_spend(wallet, expense_data.category, expense_data.trip_id, now)
+        if spent + expense_data.amount > limit:
+            raise HTTPException(status_code=400, detail=f"Expense exceeds {expense_data.category} limit")
+        
+        raise HTTPException(status_code=400, detail="Insufficient wallet balance")
     
-    # Update trip expenses
-    await db.trips.update_one(
-        {'id': expense_data.trip_id},
-        {'$inc': {'total_expenses': expense_data.amount}}
+    anomaly_scorer.settle(keys, expense.amount, anomaly)
+    
+    # total_expenses or pending_expenses changed as well, so trip lists are stale too
+    if expense.status != 'pending':
+        await update_expense_rollups(trip, expense_dict)
+    await bump_versions([f"driver:{expense.driver_id}", f"owner:{trip['fleet_owner_id']}"], ['expenses', 'trips'])
+    publish_event(
+        {
+            'type': 'expense.created',
+            'expense_id': expense.id,
+            'trip_id': expense.trip_id,
+            'driver_id': expense.driver_id,
+            'category': expense.category,
+            'amount': expense.amount,
+            'status': expense.status
+        },
+        fleet_owner_id=trip['fleet_owner_id'],
+        driver_id=expense.driver_id
     )
     
     return expense.model_dump()
 
 @api_router.get("/expenses")
-async def get_expenses(trip_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+async def get_expenses(
+    request: Request,
+    response: Response,
+    trip_id: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    cached = not_modified(request, response, await list_etag(user_scope(current_user), 'expenses', trip_id))
+    if cached:
+        return cached
+    
     query = {}
     
     if trip_id:
@@ -489,6 +1791,86 @@ async def get_expenses(trip_id: Optional[str] = None, current_user: dict = Depen
     
     return expenses
 
+@api_router.get("/expenses/pending")
+async def get_pending_expenses(current_user: dict = Depends(get_current_user)):
+    if current_user['role'] != 'fleet_owner':
+        raise HTTPException(status_code=403, detail="Only fleet owners can review expenses")
+    
+    trip_id_list = await owner_trip_ids(current_user['id'])
+    expenses = await db.expenses.find(
+        {'trip_id': {'$in': trip_id_list}, 'status': 'pending'},
+        {'_id': 0}
+    ).sort('anomaly_score', -1).to_list(1000)
+    
+    return expenses
+
+@api_router.put("/expenses/{expense_id}/review")
+async def review_expense(expense_id: str, review: ExpenseReview, current_user: dict = Depends(get_current_user)):
+    if current_user['role'] != 'fleet_owner':
+        raise HTTPException(status_code=403, detail="Only fleet owners can review expenses")
+    if review.decision not in ('approve', 'reject'):
+        raise HTTPException(status_code=400, detail="Decision must be approve or reject")
+    
+    expense = await db.expenses.find_one({'id': expense_id}, {'_id': 0})
+    if not expense:
+        raise HTTPException(status_code=404, detail="Expense not found")
+    trip = await db.trips.find_one(
+        {'id': expense['trip_id'], 'fleet_owner_id': current_user['id']},
+        {'_id': 0, 'fleet_owner_id': 1, 'vehicle_id': 1, 'origin': 1, 'destination': 1}
+    )
+    if not trip:
+        raise HTTPException(status_code=404, detail="Expense not found")
+    
+    status = 'approved' if review.decision == 'approve' else 'rejected'
+    
+    async def apply_review(session):
+        # Claim the pending expense so two reviewers cannot both refund it
+        claimed = await db.expenses.find_one_and_update(
+            {'id': expense_id, 'status': 'pending'},
+            {'$set': {
+                'status': status,
+                'reviewed_by': current_user['id'],
+                'reviewed_at': datetime.now(timezone.utc).isoformat(),
+                'review_note': review.note
+            }},
+            projection={'_id': 0},
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+        if not claimed:
+            raise HTTPException(status_code=409, detail="Expense is not pending review")
+        
+        # A trip cannot complete while this is pending, so its profitability and lane stats are not yet fixed
+        increments = {'pending_expenses': -1}
+        if status == 'approved':
+            increments['total_expenses'] = claimed['amount']
+        else:
+            await update_wallet_with_ledger(
+                {'driver_id': claimed['driver_id']},
+                spend_refund_update(
+                    claimed['category'], claimed['amount'], claimed['trip_id'], datetime.fromisoformat(claimed['created_at'])
+                ),
+                'credit', claimed['amount'], 'expense_rejected', expense_id,
+                session=session
+            )
+        await db.trips.update_one({'id': claimed['trip_id']}, {'$inc': increments}, session=session)
+        return claimed
+    
+    expense = await run_transaction(apply_review)
+    
+    if status == 'approved':
+        anomaly_scorer.observe(anomaly_keys(expense, trip), expense['amount'])
+        await update_expense_rollups(trip, expense)
+    
+    await bump_versions([f"driver:{expense['driver_id']}", f"owner:{current_user['id']}"], ['expenses', 'trips'])
+    publish_event(
+        {'type': 'expense.reviewed', 'expense_id': expense_id, 'trip_id': expense['trip_id'], 'status': status},
+        fleet_owner_id=current_user['id'],
+        driver_id=expense['driver_id']
+    )
+    
+    return expense
+
 # ==================== Vehicle Routes ====================
 
 @api_router.post("/vehicles")
@@ -507,16 +1889,112 @@ async def create_vehicle(vehicle_data: VehicleCreate, current_user: dict = Depen
     vehicle_dict = vehicle.model_dump()
     vehicle_dict['created_at'] = vehicle_dict['created_at'].isoformat()
     
-    await db.vehicles.insert_one(vehicle_dict)
+    try:
+        await db.vehicles.insert_one(vehicle_dict)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="A vehicle with this registration number already exists")
+    await bump_versions([f"owner:{vehicle.fleet_owner_id}"], ['vehicles'])
+    await read_cache.invalidate('vehicles', vehicle.fleet_owner_id)
     
     return vehicle.model_dump()
 
+@api_router.post("/vehicles/import")
+async def import_vehicles(request: Request, current_user: dict = Depends(get_current_user)):
+    if current_user['role'] != 'fleet_owner':
+        raise HTTPException(status_code=403, detail="Only fleet owners can add vehicles")
+    fmt = stream_format(request.headers.get('content-type', ''))
+    if fmt is None:
+        raise HTTPException(status_code=415, detail="Upload text/csv or application/x-ndjson")
+    
+    started = time.perf_counter()
+    summary = {'received': 0, 'accepted': 0, 'rejected': 0}
+    errors: List[Dict] = []
+    seen_registrations = set()
+    batch: List[Tuple[int, Dict]] = []
+    
+    def reject(row_number: int, registration_number: Optional[str], message: str):
+        summary['rejected'] += 1
+        if len(errors) < VEHICLE_IMPORT_MAX_ERRORS:
+            errors.append({'row': row_number, 'registration_number': registration_number, 'error': message})
+    
+    async def flush():
+        documents = [document for _, document in batch]
+        failed: Dict[int, str] = {}
+        try:
+            await db.vehicles.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            failed = failed_rows(e.details.get('writeErrors', []), "Registration number already exists")
+        for index, (row_number, document) in enumerate(batch):
+            if index in failed:
+                reject(row_number, document['registration_number'], failed[index])
+        summary['accepted'] += len(batch) - len(failed)
+        batch.clear()
+    
+    try:
+        async for row_number, record in iter_records(request.stream(), fmt):
+            if row_number > VEHICLE_IMPORT_MAX_ROWS:
+                reject(row_number, None, f"Row limit of {VEHICLE_IMPORT_MAX_ROWS} reached; the rest of the file was not read")
+                break
+            summary['received'] += 1
+            if isinstance(record, str):
+                reject(row_number, None, record)
+                continue
+            try:
+                vehicle_data = VehicleCreate(**{key: value for key, value in record.items() if value not in (None, '')})
+            except ValidationError as e:
+                message = '; '.join(f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors())
+                reject(row_number, record.get('registration_number'), message)
+                continue
+            
+            registration_number = vehicle_data.registration_number.strip()
+            if registration_number in seen_registrations:
+                reject(row_number, registration_number, "Duplicate registration number in upload")
+                continue
+            seen_registrations.add(registration_number)
+            
+            vehicle = Vehicle(
+                fleet_owner_id=current_user['id'],
+                registration_number=registration_number,
+                vehicle_type=vehicle_data.vehicle_type,
+                capacity=vehicle_data.capacity,
+                model=vehicle_data.model
+            )
+            vehicle_dict = vehicle.model_dump()
+            vehicle_dict['created_at'] = vehicle_dict['created_at'].isoformat()
+            batch.append((row_number, vehicle_dict))
+            if len(batch) >= VEHICLE_IMPORT_CHUNK_SIZE:
+                await flush()
+    except ValueError as e:
+        # Undecodable bytes or an unterminated line; chunks already written stay imported
+        errors.append({'row': None, 'registration_number': None, 'error': str(e)})
+    
+    if batch:
+        await flush()
+    if summary['accepted']:
+        await bump_versions([f"owner:{current_user['id']}"], ['vehicles'])
+        await read_cache.invalidate('vehicles', current_user['id'])
+    
+    return {
+        **summary,
+        'errors': sorted(errors, key=lambda error: error['row'] or 0),
+        'errors_truncated': summary['rejected'] > len(errors),
+        'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+
 @api_router.get("/vehicles")
-async def get_vehicles(current_user: dict = Depends(get_current_user)):
+async def get_vehicles(request: Request, response: Response, current_user: dict = Depends(get_current_user)):
     if current_user['role'] != 'fleet_owner':
         raise HTTPException(status_code=403, detail="Only fleet owners can view vehicles")
     
-    vehicles = await db.vehicles.find({'fleet_owner_id': current_user['id']}, {'_id': 0}).to_list(1000)
+    cached = not_modified(request, response, await list_etag(user_scope(current_user), 'vehicles'))
+    if cached:
+        return cached
+    
+    vehicles = await read_cache.get_or_load(
+        'vehicles',
+        current_user['id'],
+        lambda: db.vehicles.find({'fleet_owner_id': current_user['id']}, {'_id': 0}).to_list(1000)
+    )
     
     return vehicles
 
@@ -534,19 +2012,40 @@ async def create_return_load(load_data: ReturnLoadCreate, current_user: dict = D
         cargo_type=load_data.cargo_type,
         weight=load_data.weight,
         offered_price=load_data.offered_price,
-        pickup_date=load_data.pickup_date
+        pickup_date=load_data.pickup_date,
+        estimated_distance=road_graph.distance(load_data.origin, load_data.destination)
     )
     
     load_dict = return_load.model_dump()
     load_dict['created_at'] = load_dict['created_at'].isoformat()
     
     await db.return_loads.insert_one(load_dict)
+    await bump_versions([GLOBAL_SCOPE], ['return_loads'])
+    await read_cache.invalidate('return_loads', 'available')
     
     return return_load.model_dump()
 
 @api_router.get("/return-loads")
-async def get_return_loads(current_user: dict = Depends(get_current_user)):
-    loads = await db.return_loads.find({'status': 'available'}, {'_id': 0}).to_list(1000)
+async def get_return_loads(
+    request: Request,
+    response: Response,
+    near: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    cached = not_modified(request, response, await list_etag(GLOBAL_SCOPE, 'return_loads', near))
+    if cached:
+        return cached
+    
+    loads = await read_cache.get_or_load(
+        'return_loads',
+        'available',
+        lambda: db.return_loads.find({'status': 'available'}, {'_id': 0}).to_list(1000)
+    )
+    
+    if near:
+        # Rank by empty running from where the truck is now to each load's pickup
+        loads = [{**load, 'deadhead_km': road_graph.distance(near, load['origin'])} for load in loads]
+        loads.sort(key=lambda load: (load['deadhead_km'] is None, load['deadhead_km'] or 0.0))
     
     return loads
 
@@ -555,10 +2054,24 @@ async def book_return_load(load_id: str, current_user: dict = Depends(get_curren
     if current_user['role'] != 'fleet_owner':
         raise HTTPException(status_code=403, detail="Only fleet owners can book loads")
     
-    await db.return_loads.update_one(
-        {'id': load_id},
-        {'$set': {'status': 'booked', 'booked_by': current_user['id']}}
+    # Only an available load can be booked, so of two owners racing for it exactly one wins
+    load = await db.return_loads.find_one_and_update(
+        {'id': load_id, 'status': 'available'},
+        {'$set': {'status': 'booked', 'booked_by': current_user['id']}},
+        projection={'_id': 0, 'fleet_owner_id': 1}
     )
+    if not load:
+        if not await db.return_loads.find_one({'id': load_id}, {'_id': 1}):
+            raise HTTPException(status_code=404, detail="Return load not found")
+        raise HTTPException(status_code=409, detail="Return load is no longer available")
+    
+    await bump_versions([GLOBAL_SCOPE], ['return_loads'])
+    await read_cache.invalidate('return_loads', 'available')
+    
+    event = {'type': 'return_load.booked', 'load_id': load_id, 'booked_by': current_user['id']}
+    publish_event(event, fleet_owner_id=load['fleet_owner_id'])
+    if load['fleet_owner_id'] != current_user['id']:
+        publish_event(event, fleet_owner_id=current_user['id'])
     
     return {"message": "Return load booked successfully"}
 
@@ -573,43 +2086,189 @@ async def get_driver_performance(driver_id: str, current_user: dict = Depends(ge
     return performance
 
 @api_router.get("/drivers")
-async def get_drivers(current_user: dict = Depends(get_current_user)):
+async def get_drivers(request: Request, response: Response, current_user: dict = Depends(get_current_user)):
     if current_user['role'] != 'fleet_owner':
         raise HTTPException(status_code=403, detail="Only fleet owners can view drivers")
     
-    drivers = await db.users.find(
-        {'role': 'driver', 'fleet_owner_id': current_user['id']},
-        {'_id': 0, 'password': 0}
-    ).to_list(1000)
+    cached = not_modified(request, response, await list_etag(user_scope(current_user), 'drivers'))
+    if cached:
+        return cached
+    
+    drivers = await read_cache.get_or_load(
+        'drivers',
+        current_user['id'],
+        lambda: db.users.find(
+            {'role': 'driver', 'fleet_owner_id': current_user['id']},
+            {'_id': 0, 'password': 0}
+        ).to_list(1000)
+    )
     
     return drivers
 
+@api_router.post("/drivers/bulk")
+async def bulk_onboard_drivers(request: Request, current_user: dict = Depends(get_current_user)):
+    if current_user['role'] != 'fleet_owner':
+        raise HTTPException(status_code=403, detail="Only fleet owners can onboard drivers")
+    
+    # The whole file is parsed at once (JSON lists cannot be streamed), so cap what gets buffered
+    too_large = HTTPException(status_code=413, detail=f"Upload must be at most {BULK_DRIVER_MAX_BYTES} bytes")
+    if int(request.headers.get('content-length') or 0) > BULK_DRIVER_MAX_BYTES:
+        raise too_large
+    try:
+        body = await read_limited(request.stream(), BULK_DRIVER_MAX_BYTES)
+    except UploadTooLarge:
+        raise too_large
+    try:
+        rows = parse_rows(body, request.headers.get('content-type', ''))
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Body must be CSV with a header row or a JSON list of drivers")
+    if len(rows) > BULK_DRIVER_MAX_ROWS:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_DRIVER_MAX_ROWS} drivers per upload")
+    
+    # Row numbers are 1-based data rows, matching what the owner sees in their spreadsheet
+    errors = []
+    valid: List[Tuple[int, DriverImportRow]] = []
+    seen_emails = set()
+    for row_number, row in enumerate(rows, start=1):
+        try:
+            driver = DriverImportRow(**{key: value for key, value in row.items() if value not in (None, '')})
+        except ValidationError as e:
+            message = '; '.join(f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors())
+            errors.append({'row': row_number, 'email': row.get('email'), 'error': message})
+            continue
+        driver.email = driver.email.strip()
+        if driver.email in seen_emails:
+            errors.append({'row': row_number, 'email': driver.email, 'error': "Duplicate email in upload"})
+            continue
+        seen_emails.add(driver.email)
+        valid.append((row_number, driver))
+    
+    hashes = await password_hasher.hash_many([driver.password for _, driver in valid])
+    
+    # No per-row existence check: the unique email index rejects duplicates during the insert
+    user_docs = []
+    for (_, driver), hashed_password in zip(valid, hashes):
+        user = User(
+            email=driver.email,
+            name=driver.name,
+            role='driver',
+            phone=driver.phone,
+            fleet_owner_id=current_user['id']
+        )
+        user_dict = user.model_dump()
+        user_dict['password'] = hashed_password
+        user_dict['created_at'] = user_dict['created_at'].isoformat()
+        user_docs.append(user_dict)
+    
+    failed: Dict[int, str] = {}
+    if user_docs:
+        try:
+            await db.users.insert_many(user_docs, ordered=False)
+        except BulkWriteError as e:
+            failed = failed_rows(e.details.get('writeErrors', []), "Email already registered")
+    
+    created = []
+    wallet_docs = []
+    perf_docs = []
+    for index, ((row_number, driver), user_dict) in enumerate(zip(valid, user_docs)):
+        if index in failed:
+            errors.append({'row': row_number, 'email': driver.email, 'error': failed[index]})
+            continue
+        created.append({'row': row_number, 'id': user_dict['id'], 'email': driver.email})
+        
+        wallet_dict = Wallet(driver_id=user_dict['id'], balance=0.0).model_dump()
+        wallet_dict['created_at'] = wallet_dict['created_at'].isoformat()
+        wallet_docs.append(wallet_dict)
+        
+        perf_dict = DriverPerformance(driver_id=user_dict['id']).model_dump()
+        perf_dict['created_at'] = perf_dict['created_at'].isoformat()
+        perf_dict['updated_at'] = perf_dict['updated_at'].isoformat()
+        perf_docs.append(perf_dict)
+    
+    setup_failed: Dict[int, str] = {}
+    for collection, docs in ((db.wallets, wallet_docs), (db.driver_performance, perf_docs)):
+        if not docs:
+            continue
+        try:
+            await collection.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            setup_failed.update(failed_rows(e.details.get('writeErrors', []), "Driver records already exist"))
+        except PyMongoError:
+            setup_failed.update({index: "Could not create wallet and performance records" for index in range(len(docs))})
+    if setup_failed:
+        # A driver without a wallet cannot log expenses; remove the account so the row can be uploaded again
+        failed_ids = [created[index]['id'] for index in setup_failed]
+        await db.users.delete_many({'id': {'$in': failed_ids}})
+        await db.wallets.delete_many({'driver_id': {'$in': failed_ids}})
+        await db.driver_performance.delete_many({'driver_id': {'$in': failed_ids}})
+        for index, message in setup_failed.items():
+            errors.append({'row': created[index]['row'], 'email': created[index]['email'], 'error': message})
+        created = [driver for index, driver in enumerate(created) if index not in setup_failed]
+    
+    if created:
+        await bump_versions([f"owner:{current_user['id']}"], ['drivers'])
+        await read_cache.invalidate('drivers', current_user['id'])
+    
+    errors.sort(key=lambda error: error['row'])
+    return {
+        'created': len(created),
+        'failed': len(errors),
+        'drivers': created,
+        'errors': errors
+    }
+
 # ==================== Dashboard Routes ====================
 
-@api_router.get("/dashboard/stats")
-async def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
+# Only the fields the dashboards render
+DASHBOARD_PROJECTIONS = {
+    'trips': {
+        '_id': 0, 'id': 1, 'driver_id': 1, 'vehicle_id': 1, 'origin': 1, 'destination': 1,
+        'cargo_details': 1, 'estimated_distance': 1, 'status': 1, 'total_expenses': 1, 'created_at': 1
+    },
+    'drivers': {'_id': 0, 'id': 1, 'name': 1, 'email': 1, 'phone': 1},
+    'vehicles': {'_id': 0, 'id': 1, 'registration_number': 1, 'vehicle_type': 1, 'capacity': 1, 'model': 1, 'status': 1},
+    'expenses': {
+        '_id': 0, 'id': 1, 'trip_id': 1, 'driver_id': 1, 'category': 1, 'amount': 1,
+        'description': 1, 'location': 1, 'status': 1, 'created_at': 1
+    },
+    'return_loads': {
+        '_id': 0, 'id': 1, 'origin': 1, 'destination': 1, 'cargo_type': 1, 'weight': 1,
+        'offered_price': 1, 'pickup_date': 1, 'estimated_distance': 1, 'status': 1
+    },
+    'wallet': {
+        '_id': 0, 'id': 1, 'driver_id': 1, 'balance': 1, 'fuel_limit': 1, 'toll_limit': 1,
+        'food_limit': 1, 'lodging_limit': 1, 'repair_limit': 1, 'limit_periods': 1, 'spend': 1
+    },
+    'performance': {
+        '_id': 0, 'driver_id': 1, 'total_trips': 1, 'total_distance': 1,
+        'average_fuel_efficiency': 1, 'safety_score': 1, 'reward_points': 1
+    }
+}
+
+async def owner_trip_ids(fleet_owner_id: str) -> List[str]:
+    trips = await db.trips.find({'fleet_owner_id': fleet_owner_id}, {'id': 1, '_id': 0}).to_list(1000)
+    return [t['id'] for t in trips]
+
+async def sum_expenses(query: Dict) -> float:
+    result = await db.expenses.aggregate([
+        {'$match': query},
+        {'$group': {'_id': None, 'total': {'$sum': '$amount'}}}
+    ]).to_list(1)
+    return result[0]['total'] if result else 0.0
+
+async def dashboard_stats(current_user: dict) -> Dict:
     if current_user['role'] == 'fleet_owner':
-        # Get total trips
-        total_trips = await db.trips.count_documents({'fleet_owner_id': current_user['id']})
-        
-        # Get total expenses
-        trip_ids = await db.trips.find({'fleet_owner_id': current_user['id']}, {'id': 1, '_id': 0}).to_list(1000)
-        trip_id_list = [t['id'] for t in trip_ids]
-        
-        expenses = await db.expenses.find({'trip_id': {'$in': trip_id_list}}, {'_id': 0}).to_list(10000)
-        total_expenses = sum(e['amount'] for e in expenses)
+        owner_id = current_user['id']
         
-        # Get active trips
-        active_trips = await db.trips.count_documents(
-            {'fleet_owner_id': current_user['id'], 'status': 'in_progress'}
-        )
-        
-        # Get total vehicles
-        total_vehicles = await db.vehicles.count_documents({'fleet_owner_id': current_user['id']})
+        async def owner_expense_total():
+            return await sum_expenses({'trip_id': {'$in': await owner_trip_ids(owner_id)}, 'status': COUNTED_EXPENSE_STATUS})
         
-        # Get total drivers
-        total_drivers = await db.users.count_documents(
-            {'role': 'driver', 'fleet_owner_id': current_user['id']}
+        total_trips, total_expenses, active_trips, total_vehicles, total_drivers = await asyncio.gather(
+            db.trips.count_documents({'fleet_owner_id': owner_id}),
+            owner_expense_total(),
+            db.trips.count_documents({'fleet_owner_id': owner_id, 'status': 'in_progress'}),
+            db.vehicles.count_documents({'fleet_owner_id': owner_id}),
+            db.users.count_documents({'role': 'driver', 'fleet_owner_id': owner_id})
         )
         
         return {
@@ -621,15 +2280,14 @@ async def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
         }
     else:
         # Driver stats
-        total_trips = await db.trips.count_documents({'driver_id': current_user['id']})
-        
-        expenses = await db.expenses.find({'driver_id': current_user['id']}, {'_id': 0}).to_list(10000)
-        total_expenses = sum(e['amount'] for e in expenses)
-        
-        wallet = await db.wallets.find_one({'driver_id': current_user['id']}, {'_id': 0})
+        driver_id = current_user['id']
+        total_trips, total_expenses, wallet, performance = await asyncio.gather(
+            db.trips.count_documents({'driver_id': driver_id}),
+            sum_expenses({'driver_id': driver_id, 'status': COUNTED_EXPENSE_STATUS}),
+            db.wallets.find_one({'driver_id': driver_id}, {'_id': 0, 'balance': 1}),
+            db.driver_performance.find_one({'driver_id': driver_id}, {'_id': 0, 'reward_points': 1})
+        )
         wallet_balance = wallet['balance'] if wallet else 0
-        
-        performance = await db.driver_performance.find_one({'driver_id': current_user['id']}, {'_id': 0})
         reward_points = performance['reward_points'] if performance else 0
         
         return {
@@ -639,21 +2297,337 @@ async def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
             'reward_points': reward_points
         }
 
+@api_router.get("/dashboard/stats")
+async def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
+    return await dashboard_stats(current_user)
+
+@api_router.get("/dashboard/bootstrap")
+async def get_dashboard_bootstrap(current_user: dict = Depends(get_current_user)):
+    # One authenticated request in place of the dashboard's initial fan-out
+    if current_user['role'] == 'fleet_owner':
+        owner_id = current_user['id']
+        
+        async def owner_expenses():
+            trip_ids = await owner_trip_ids(owner_id)
+            return await db.expenses.find(
+                {'trip_id': {'$in': trip_ids}},
+                DASHBOARD_PROJECTIONS['expenses']
+            ).to_list(1000)
+        
+        stats, trips, drivers, vehicles, expenses, return_loads = await asyncio.gather(
+            dashboard_stats(current_user),
+            db.trips.find({'fleet_owner_id': owner_id}, DASHBOARD_PROJECTIONS['trips']).to_list(1000),
+            db.users.find({'role': 'driver', 'fleet_owner_id': owner_id}, DASHBOARD_PROJECTIONS['drivers']).to_list(1000),
+            db.vehicles.find({'fleet_owner_id': owner_id}, DASHBOARD_PROJECTIONS['vehicles']).to_list(1000),
+            owner_expenses(),
+            db.return_loads.find({'status': 'available'}, DASHBOARD_PROJECTIONS['return_loads']).to_list(1000)
+        )
+        
+        return {
+            'stats': stats,
+            'trips': trips,
+            'drivers': drivers,
+            'vehicles': vehicles,
+            'expenses': expenses,
+            'return_loads': return_loads
+        }
+    else:
+        driver_id = current_user['id']
+        stats, wallet, trips, expenses, performance = await asyncio.gather(
+            dashboard_stats(current_user),
+            db.wallets.find_one({'driver_id': driver_id}, DASHBOARD_PROJECTIONS['wallet']),
+            db.trips.find({'driver_id': driver_id}, DASHBOARD_PROJECTIONS['trips']).to_list(1000),
+            db.expenses.find({'driver_id': driver_id}, DASHBOARD_PROJECTIONS['expenses']).to_list(1000),
+            db.driver_performance.find_one({'driver_id': driver_id}, DASHBOARD_PROJECTIONS['performance'])
+        )
+        
+        return {
+            'stats': stats,
+            'wallet': wallet,
+            'trips': trips,
+            'expenses': expenses,
+            'performance': performance
+        }
+
+# ==================== Dispatch Routes ====================
+
+@api_router.get("/dispatch/suggest")
+async def suggest_dispatch(current_user: dict = Depends(get_current_user)):
+    if current_user['role'] != 'fleet_owner':
+        raise HTTPException(status_code=403, detail="Only fleet owners can dispatch trips")
+    
+    owner_id = current_user['id']
+    unassigned_trips, busy_trips, vehicles, drivers = await asyncio.gather(
+        db.trips.find(
+            {'fleet_owner_id': owner_id, 'status': 'planned', 'driver_id': None, 'vehicle_id': None},
+            {'_id': 0, 'id': 1, 'origin': 1, 'destination': 1, 'cargo_weight': 1, 'vehicle_type': 1, 'estimated_distance': 1}
+        ).to_list(1000),
+        db.trips.find(
+            {'fleet_owner_id': owner_id, 'status': {'$in': ['planned', 'in_progress']}},
+            {'_id': 0, 'driver_id': 1, 'vehicle_id': 1}
+        ).to_list(None),
+        db.vehicles.find(
+            {'fleet_owner_id': owner_id, 'status': 'available'},
+            {'_id': 0, 'id': 1, 'registration_number': 1, 'vehicle_type': 1, 'capacity': 1}
+        ).to_list(None),
+        db.users.find({'role': 'driver', 'fleet_owner_id': owner_id}, {'_id': 0, 'id': 1, 'name': 1}).to_list(None)
+    )
+    
+    # Anything already on a planned or running trip is spoken for
+    busy_drivers = {t['driver_id'] for t in busy_trips if t.get('driver_id')}
+    busy_vehicles = {t['vehicle_id'] for t in busy_trips if t.get('vehicle_id')}
+    idle_drivers = [d for d in drivers if d['id'] not in busy_drivers]
+    free_vehicles = [v for v in vehicles if v['id'] not in busy_vehicles]
+    
+    performance = await db.driver_performance.find(
+        {'driver_id': {'$in': [d['id'] for d in idle_drivers]}},
+        {'_id': 0, 'driver_id': 1, 'safety_score': 1, 'average_fuel_efficiency': 1, 'total_trips': 1}
+    ).to_list(None)
+    performance_by_driver = {p['driver_id']: p for p in performance}
+    
+    started = time.perf_counter()
+    plan = suggest_assignments(
+        unassigned_trips,
+        free_vehicles,
+        idle_drivers,
+        [performance_by_driver.get(d['id']) for d in idle_drivers]
+    )
+    
+    return {
+        **plan,
+        'trips_considered': len(unassigned_trips),
+        'vehicles_available': len(free_vehicles),
+        'drivers_idle': len(idle_drivers),
+        'solve_ms': round((time.perf_counter() - started) * 1000, 2)
+    }
+
+@api_router.post("/dispatch/assign")
+async def assign_dispatch(dispatch_data: DispatchAssign, current_user: dict = Depends(get_current_user)):
+    if current_user['role'] != 'fleet_owner':
+        raise HTTPException(status_code=403, detail="Only fleet owners can dispatch trips")
+    if not dispatch_data.assignments:
+        raise HTTPException(status_code=400, detail="No assignments provided")
+    
+    owner_id = current_user['id']
+    assignments = dispatch_data.assignments
+    driver_ids = list({a.driver_id for a in assignments})
+    vehicle_ids = list({a.vehicle_id for a in assignments})
+    open_trips, busy_trips, vehicles, drivers = await asyncio.gather(
+        db.trips.find(
+            {'id': {'$in': [a.trip_id for a in assignments]}, 'fleet_owner_id': owner_id},
+            {'_id': 0, 'id': 1, 'status': 1, 'driver_id': 1, 'vehicle_id': 1}
+        ).to_list(None),
+        db.trips.find(
+            {
+                'status': {'$in': ['planned', 'in_progress']},
+                '$or': [{'driver_id': {'$in': driver_ids}}, {'vehicle_id': {'$in': vehicle_ids}}]
+            },
+            {'_id': 0, 'driver_id': 1, 'vehicle_id': 1}
+        ).to_list(None),
+        db.vehicles.find(
+            {'id': {'$in': vehicle_ids}, 'fleet_owner_id': owner_id, 'status': 'available'},
+            {'_id': 0, 'id': 1}
+        ).to_list(None),
+        db.users.find({'id': {'$in': driver_ids}, 'role': 'driver', 'fleet_owner_id': owner_id}, {'_id': 0, 'id': 1}).to_list(None)
+    )
+    
+    # Same availability rules as /dispatch/suggest: a driver or vehicle on a planned or running trip is taken
+    trips_by_id = {t['id']: t for t in open_trips}
+    busy_drivers = {t['driver_id'] for t in busy_trips if t.get('driver_id')}
+    busy_vehicles = {t['vehicle_id'] for t in busy_trips if t.get('vehicle_id')}
+    free_vehicles = {v['id'] for v in vehicles} - busy_vehicles
+    idle_drivers = {d['id'] for d in drivers} - busy_drivers
+    
+    results: List[Dict] = []
+    accepted: List[DispatchAssignment] = []
+    seen = set()
+    for assignment in assignments:
+        trip = trips_by_id.get(assignment.trip_id)
+        if assignment.trip_id in seen:
+            error = 'duplicate'
+        elif not trip:
+            error = 'trip_not_found'
+        elif trip['status'] != 'planned' or trip.get('driver_id') or trip.get('vehicle_id'):
+            error = 'already_assigned'
+        elif assignment.vehicle_id not in free_vehicles:
+            error = 'vehicle_unavailable'
+        elif assignment.driver_id not in idle_drivers:
+            error = 'driver_unavailable'
+        else:
+            error = None
+        seen.add(assignment.trip_id)
+        
+        if error:
+            results.append({'trip_id': assignment.trip_id, 'status': 'rejected', 'error': error})
+            continue
+        # Taken for the rest of the batch too
+        free_vehicles.discard(assignment.vehicle_id)
+        idle_drivers.discard(assignment.driver_id)
+        results.append({'trip_id': assignment.trip_id, 'status': 'assigned'})
+        accepted.append(assignment)
+    
+    if accepted:
+        # Conditional on the trip still being open, so a concurrent assign or status change wins cleanly
+        await db.trips.bulk_write(
+            [
+                UpdateOne(
+                    {'id': a.trip_id, 'fleet_owner_id': owner_id, 'status': 'planned', 'driver_id': None, 'vehicle_id': None},
+                    {'$set': {'driver_id': a.driver_id, 'vehicle_id': a.vehicle_id}}
+                )
+                for a in accepted
+            ],
+            ordered=False
+        )
+        # Read back which pairs landed; a trip that lost a race keeps whatever the other writer set
+        written = await db.trips.find(
+            {'id': {'$in': [a.trip_id for a in accepted]}},
+            {'_id': 0, 'id': 1, 'driver_id': 1, 'vehicle_id': 1}
+        ).to_list(None)
+        landed = {t['id']: (t.get('driver_id'), t.get('vehicle_id')) for t in written}
+        accepted = [a for a in accepted if landed.get(a.trip_id) == (a.driver_id, a.vehicle_id)]
+        assigned_ids = {a.trip_id for a in accepted}
+        for result in results:
+            if result['status'] == 'assigned' and result['trip_id'] not in assigned_ids:
+                result.update({'status': 'rejected', 'error': 'already_assigned'})
+    
+    if accepted:
+        await bump_versions([f"owner:{owner_id}"] + [f"driver:{a.driver_id}" for a in accepted], ['trips'])
+        for assignment in accepted:
+            publish_event(
+                {'type': 'trip.assigned', 'trip_id': assignment.trip_id, 'vehicle_id': assignment.vehicle_id},
+                fleet_owner_id=owner_id,
+                driver_id=assignment.driver_id
+            )
+    
+    return {
+        'assigned': len(accepted),
+        'rejected': len(results) - len(accepted),
+        'results': results
+    }
+
+# ==================== Analytics Routes ====================
+
+@api_router.get("/analytics/expenses")
+async def get_expense_analytics(
+    granularity: str = 'day',
+    dimension: str = 'total',
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user['role'] != 'fleet_owner':
+        raise HTTPException(status_code=403, detail="Only fleet owners can view expense analytics")
+    
+    if granularity not in ROLLUP_GRANULARITIES:
+        raise HTTPException(status_code=400, detail="Invalid granularity")
+    if dimension not in ROLLUP_DIMENSIONS:
+        raise HTTPException(status_code=400, detail="Invalid dimension")
+    
+    query = {
+        'fleet_owner_id': current_user['id'],
+        'granularity': granularity,
+        'dimension': dimension
+    }
+    bucket_range = {}
+    try:
+        if start:
+            bucket_range['$gte'] = rollup_bucket(date.fromisoformat(start[:10]), granularity)
+        if end:
+            bucket_range['$lte'] = date.fromisoformat(end[:10]).isoformat()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be in YYYY-MM-DD format")
+    if bucket_range:
+        query['bucket'] = bucket_range
+    
+    rollups = await db.expense_rollups.find(
+        query,
+        {'_id': 0, 'bucket': 1, 'key': 1, 'total': 1, 'count': 1}
+    ).sort('bucket', 1).to_list(5000)
+    
+    return {
+        'granularity': granularity,
+        'dimension': dimension,
+        'series': [
+            {**rollup, 'total': round(rollup['total'], 2)} for rollup in rollups if rollup['count'] > 0
+        ]
+    }
+
+@api_router.post("/analytics/expenses/rebuild")
+async def rebuild_expense_analytics(current_user: dict = Depends(get_current_user)):
+    if current_user['role'] != 'fleet_owner':
+        raise HTTPException(status_code=403, detail="Only fleet owners can rebuild expense analytics")
+    
+    trip_ids = await db.trips.find({'fleet_owner_id': current_user['id']}, {'id': 1, '_id': 0}).to_list(None)
+    trip_id_list = [t['id'] for t in trip_ids]
+    
+    await db.expense_rollups.delete_many({'fleet_owner_id': current_user['id']})
+    await db.expenses.aggregate(expense_rollup_pipeline(current_user['id'], trip_id_list)).to_list(None)
+    
+    rollup_count = await db.expense_rollups.count_documents({'fleet_owner_id': current_user['id']})
+    
+    return {"message": "Expense analytics rebuilt", "rollups": rollup_count}
+
+@api_router.get("/analytics/lanes")
+async def get_lane_analytics(
+    sort: str = 'trips',
+    min_trips: int = 1,
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user['role'] != 'fleet_owner':
+        raise HTTPException(status_code=403, detail="Only fleet owners can view lane analytics")
+    if sort not in ('trips', 'profit', 'margin', 'revenue'):
+        raise HTTPException(status_code=400, detail="Invalid sort")
+    
+    lanes = await db.lane_stats.find(
+        {'fleet_owner_id': current_user['id'], 'trips': {'$gte': min_trips}},
+        {'_id': 0}
+    ).to_list(5000)
+    summaries = [lane_summary(lane) for lane in lanes]
+    summaries.sort(key=lambda lane: (lane[sort] is not None, lane[sort] or 0), reverse=True)
+    
+    return {'lanes': summaries[:limit], 'total_lanes': len(summaries)}
+
+@api_router.post("/analytics/lanes/rebuild")
+async def rebuild_lane_analytics(current_user: dict = Depends(get_current_user)):
+    if current_user['role'] != 'fleet_owner':
+        raise HTTPException(status_code=403, detail="Only fleet owners can rebuild lane analytics")
+    
+    trips = await db.trips.find(
+        {'fleet_owner_id': current_user['id'], 'status': 'completed'},
+        {
+            '_id': 0, 'fleet_owner_id': 1, 'origin': 1, 'destination': 1, 'total_expenses': 1,
+            'actual_distance': 1, 'estimated_distance': 1, 'revenue': 1
+        }
+    ).to_list(None)
+    
+    await db.lane_stats.delete_many({'fleet_owner_id': current_user['id']})
+    if trips:
+        await db.lane_stats.bulk_write([lane_stats_update(trip, trip.get('revenue')) for trip in trips])
+    
+    lane_count = await db.lane_stats.count_documents({'fleet_owner_id': current_user['id']})
+    
+    return {"message": "Lane analytics rebuilt", "lanes": lane_count}
+
+# ==================== Distance Routes ====================
+
+@api_router.get("/distance")
+async def get_distance(origin: str, destination: str, current_user: dict = Depends(get_current_user)):
+    route = road_graph.route(origin, destination)
+    if route is None:
+        raise HTTPException(status_code=404, detail="No road route found between these cities")
+    return route
+
 # ==================== AI Routes ====================
 
-@api_router.post("/ai/route-optimize")
+@api_router.post("/ai/route-optimize", dependencies=[Depends(admit('ai'))])
 async def optimize_route(route_data: AIRouteRequest, current_user: dict = Depends(get_current_user)):
     try:
-        api_key = os.environ.get('EMERGENT_LLM_KEY')
-        if not api_key:
+        try:
+            llm = get_llm_provider()
+        except IntegrationNotConfigured:
             raise HTTPException(status_code=500, detail="AI service not configured")
         
-        chat = LlmChat(
-            api_key=api_key,
-            session_id=f"route_{current_user['id']}_{datetime.now(timezone.utc).timestamp()}",
-            system_message="You are an AI route optimization expert for Indian road transport. Provide practical route suggestions, estimated costs, and fuel efficiency tips."
-        ).with_model("openai", "gpt-4o-mini")
-        
         prompt = f"""Optimize route for:
 Origin: {route_data.origin}
 Destination: {route_data.destination}
@@ -669,8 +2643,11 @@ Provide:
 
 Keep response concise and practical."""
         
-        user_message = UserMessage(text=prompt)
-        response = await chat.send_message(user_message)
+        response = await llm.complete(
+            session_id=f"route_{current_user['id']}_{datetime.now(timezone.utc).timestamp()}",
+            system_message="You are an AI route optimization expert for Indian road transport. Provide practical route suggestions, estimated costs, and fuel efficiency tips.",
+            prompt=prompt
+        )
         
         return {
             'route_suggestion': response,
@@ -688,6 +2665,41 @@ PACKAGES = {
     'large': 2000.0   # ₹2000
 }
 
+async def credit_payment(session_id: str):
+    # The webhook and the status poll both end here, in either order. Claiming credited lets exactly
+    # one of them credit a paid checkout; rows from before the flag have no credited field and were
+    # already credited by the poll, so they never match
+    async def claim_and_credit(session):
+        transaction = await db.payment_transactions.find_one_and_update(
+            {'session_id': session_id, 'payment_status': 'paid', 'credited': False},
+            {'$set': {'credited': True}},
+            projection={'_id': 0, 'user_id': 1, 'amount': 1, 'metadata': 1},
+            session=session
+        )
+        if not transaction:
+            return
+        try:
+            # Credit wallet for driver, funding pool for fleet owner
+            role = (transaction.get('metadata') or {}).get('role')
+            if role == 'driver':
+                wallet = await update_wallet_with_ledger(
+                    {'driver_id': transaction['user_id']},
+                    {'$inc': {'balance': transaction['amount'], 'ledger_seq': 1}},
+                    'credit', transaction['amount'], 'checkout', session_id,
+                    session=session
+                )
+                if not wallet:
+                    raise HTTPException(status_code=404, detail="Wallet not found")
+            elif role == 'fleet_owner':
+                await credit_funding_pool(transaction['user_id'], transaction['amount'], session=session)
+        except Exception:
+            if session is None:
+                # Nothing to abort: release the claim so the next poll or webhook credits it
+                await db.payment_transactions.update_one({'session_id': session_id}, {'$set': {'credited': False}})
+            raise
+    
+    await run_transaction(claim_and_credit)
+
 @api_router.post("/payments/checkout")
 async def create_checkout_session(
     request: Request,
@@ -710,32 +2722,28 @@ async def create_checkout_session(
         success_url = f"{origin}/payment-success?session_id={{{{CHECKOUT_SESSION_ID}}}}"
         cancel_url = f"{origin}/dashboard"
         
-        # Initialize Stripe
-        stripe_api_key = os.environ.get('STRIPE_API_KEY')
-        stripe_checkout = StripeCheckout(api_key=stripe_api_key, webhook_url=webhook_url)
-        
         # Create checkout session
-        checkout_request = CheckoutSessionRequest(
+        metadata = {
+            'user_id': current_user['id'],
+            'package': checkout_data.package,
+            'role': current_user['role']
+        }
+        session = await get_payment_provider().create_checkout_session(
             amount=amount,
             currency="inr",
             success_url=success_url,
             cancel_url=cancel_url,
-            metadata={
-                'user_id': current_user['id'],
-                'package': checkout_data.package,
-                'role': current_user['role']
-            }
+            metadata=metadata,
+            webhook_url=webhook_url
         )
         
-        session = await stripe_checkout.create_checkout_session(checkout_request)
-        
         # Create payment transaction record
         transaction = PaymentTransaction(
             user_id=current_user['id'],
             session_id=session.session_id,
             amount=amount,
             currency="inr",
-            metadata=checkout_request.metadata
+            metadata=metadata
         )
         
         trans_dict = transaction.model_dump()
@@ -767,37 +2775,29 @@ async def get_payment_status(
         if not transaction:
             raise HTTPException(status_code=404, detail="Transaction not found")
         
-        # If already paid, return cached status
-        if transaction['payment_status'] == 'paid':
+        # If already paid and credited, return cached status
+        if transaction['payment_status'] == 'paid' and transaction.get('credited', True):
             return transaction
         
-        # Check with Stripe
-        stripe_api_key = os.environ.get('STRIPE_API_KEY')
-        webhook_url = ""  # Not needed for status check
-        stripe_checkout = StripeCheckout(api_key=stripe_api_key, webhook_url=webhook_url)
-        
-        status_response = await stripe_checkout.get_checkout_status(session_id)
-        
-        # Update transaction
-        update_data = {
-            'payment_status': status_response.payment_status,
-            'status': 'completed' if status_response.payment_status == 'paid' else status_response.status,
-            'updated_at': datetime.now(timezone.utc).isoformat()
-        }
-        
-        await db.payment_transactions.update_one(
-            {'session_id': session_id},
-            {'$set': update_data}
-        )
+        paid = transaction['payment_status'] == 'paid'
+        if not paid:
+            # Check with Stripe
+            status_response = await get_payment_provider().get_checkout_status(session_id)
+            paid = status_response.payment_status == 'paid'
+            
+            # Update transaction
+            await db.payment_transactions.update_one(
+                {'session_id': session_id, 'payment_status': {'$ne': 'paid'}},
+                {'$set': {
+                    'payment_status': status_response.payment_status,
+                    'status': 'completed' if paid else status_response.status,
+                    'updated_at': datetime.now(timezone.utc).isoformat()
+                }}
+            )
         
-        # If payment successful and not yet credited, credit the wallet
-        if status_response.payment_status == 'paid' and transaction['payment_status'] != 'paid':
-            # Credit wallet for driver
-            if current_user['role'] == 'driver':
-                await db.wallets.update_one(
-                    {'driver_id': current_user['id']},
-                    {'$inc': {'balance': transaction['amount']}}
-                )
+        # The webhook may have marked it paid first; whichever path gets here first credits it
+        if paid:
+            await credit_payment(session_id)
         
         # Get updated transaction
         updated_transaction = await db.payment_transactions.find_one(
@@ -816,11 +2816,7 @@ async def stripe_webhook(request: Request):
         body = await request.body()
         signature = request.headers.get("stripe-signature")
         
-        stripe_api_key = os.environ.get('STRIPE_API_KEY')
-        webhook_url = ""  # Not needed for webhook handling
-        stripe_checkout = StripeCheckout(api_key=stripe_api_key, webhook_url=webhook_url)
-        
-        webhook_response = await stripe_checkout.handle_webhook(body, signature)
+        webhook_response = await get_payment_provider().handle_webhook(body, signature)
         
         # Update transaction based on webhook
         if webhook_response.event_type in ['checkout.session.completed', 'payment_intent.succeeded']:
@@ -832,12 +2828,157 @@ async def stripe_webhook(request: Request):
                     'updated_at': datetime.now(timezone.utc).isoformat()
                 }}
             )
+            if webhook_response.payment_status == 'paid':
+                await credit_payment(webhook_response.session_id)
         
         return {"status": "success"}
     except Exception as e:
         logger.error(f"Webhook error: {str(e)}")
         return {"status": "error", "message": str(e)}
 
+# ==================== Live Event Routes ====================
+
+@api_router.websocket("/ws")
+async def event_stream(websocket: WebSocket, token: str):
+    # Browsers cannot set Authorization on a WebSocket handshake, so the JWT comes as ?token=
+    try:
+        payload = await authenticate(token)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+    
+    user = {'id': payload['user_id'], 'role': payload['role']}
+    await websocket.accept()
+    subscription = event_hub.subscribe(*event_topics(user))
+    
+    async def send_events():
+        while True:
+            event = await subscription.queue.get()
+            if subscription.overflowed:
+                # Too far behind; the client reconnects and refetches
+                await websocket.close(code=1013)
+                return
+            await websocket.send_json(event)
+    
+    async def drain_client():
+        # Incoming frames are only keepalives; this returns when the client goes away
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            return
+    
+    tasks = [asyncio.create_task(send_events()), asyncio.create_task(drain_client())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        event_hub.unsubscribe(subscription)
+
+# ==================== Health Routes ====================
+
+@api_router.get("/health")
+async def health():
+    # Liveness only: the worker's event loop is answering
+    return {'status': 'ok', 'pid': os.getpid()}
+
+@api_router.get("/ready")
+async def ready(request: Request, response: Response):
+    checks = {
+        'startup': bool(getattr(request.app.state, 'ready', False)),
+        'mongo': await mongo.ping()
+    }
+    if not all(checks.values()):
+        response.status_code = 503
+    return {
+        'status': 'ready' if all(checks.values()) else 'not_ready',
+        'pid': os.getpid(),
+        'checks': checks,
+        # Informational: without transactions multi-document writes are ordered but not atomic
+        'transactions': bool(getattr(request.app.state, 'transactions', False))
+    }
+
+def runtime_metrics() -> List[str]:
+    hub = event_hub.stats()
+    lines = [
+        "# HELP transops_ws_subscriptions Open WebSocket event subscriptions.",
+        "# TYPE transops_ws_subscriptions gauge",
+        f"transops_ws_subscriptions {hub['subscriptions']}",
+        "# HELP transops_read_cache_lookups_total Read cache lookups by namespace and result.",
+        "# TYPE transops_read_cache_lookups_total counter"
+    ]
+    for namespace, counters in sorted(read_cache.stats()['namespaces'].items()):
+        for result in ('hits', 'misses'):
+            lines.append(f'transops_read_cache_lookups_total{{namespace="{namespace}",result="{result}"}} {counters[result]}')
+    lines += [
+        "# HELP transops_admission_decisions_total Admission decisions for rate-limited routes by class and outcome.",
+        "# TYPE transops_admission_decisions_total counter"
+    ]
+    for route_class, counters in sorted(admission.stats()['classes'].items()):
+        for outcome in ('admitted', 'rate', 'concurrency', 'class_concurrency'):
+            lines.append(f'transops_admission_decisions_total{{class="{route_class}",outcome="{outcome}"}} {counters[outcome]}')
+    return lines
+
+registry.add_collector(runtime_metrics)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(authorization: Optional[str] = Header(None)):
+    if METRICS_TOKEN and authorization != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(content=registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+# ==================== Admin Routes ====================
+
+@api_router.get("/admin/cache/stats")
+async def get_cache_stats(admin_user: dict = Depends(get_admin_user)):
+    return {**read_cache.stats(), 'roads': road_graph.stats()}
+
+@api_router.get("/admin/cost-model")
+async def get_cost_model_info(admin_user: dict = Depends(get_admin_user)):
+    if not cost_model:
+        return {'loaded': False}
+    return {'loaded': True, **cost_model.metadata}
+
+@api_router.post("/admin/cost-model/retrain")
+async def retrain_cost_model_now(admin_user: dict = Depends(get_admin_user)):
+    metadata = await retrain_cost_model()
+    if metadata is None:
+        raise HTTPException(status_code=400, detail="Not enough completed trips to train the cost model")
+    return metadata
+
+@api_router.get("/admin/anomaly/stats")
+async def get_anomaly_stats(admin_user: dict = Depends(get_admin_user)):
+    return anomaly_scorer.stats()
+
+@api_router.get("/admin/slow-queries")
+async def get_slow_queries(
+    sort: str = "total_ms",
+    limit: int = Query(20, ge=1, le=200),
+    since_minutes: Optional[int] = Query(None, ge=1),
+    admin_user: dict = Depends(get_admin_user)
+):
+    if sort not in ('total_ms', 'count', 'max_ms', 'avg_ms'):
+        raise HTTPException(status_code=400, detail="Invalid sort")
+    since = None
+    if since_minutes:
+        since = (datetime.now(timezone.utc) - timedelta(minutes=since_minutes)).isoformat()
+    offenders = await db.slow_queries.aggregate(worst_offenders_pipeline(sort, limit, since)).to_list(limit)
+    return {**slow_query_log.stats(), 'offenders': offenders}
+
+@api_router.get("/admin/admission/stats")
+async def get_admission_stats(admin_user: dict = Depends(get_admin_user)):
+    return admission.stats()
+
+@api_router.get("/admin/revocation/stats")
+async def get_revocation_stats(admin_user: dict = Depends(get_admin_user)):
+    return revocation_list.stats()
+
+@api_router.get("/admin/events/stats")
+async def get_event_stats(admin_user: dict = Depends(get_admin_user)):
+    return event_hub.stats()
+
 # ==================== Root Route ====================
 
 @api_router.get("/")
@@ -853,8 +2994,68 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+if METRICS_ENABLED:
+    app.add_middleware(RequestMetricsMiddleware, duration=http_request_duration, requests=http_requests)
+
+if slow_query_log.enabled:
+    app.add_middleware(RouteContextMiddleware)
+
+async def create_unique_index(collection, keys: List[Tuple[str, int]]):
+    # Data written before the index existed may hold duplicates; the build then fails, and the
+    # worker starts without it (inserts are not deduplicated) until the duplicates are merged
+    try:
+        await collection.create_index(keys, unique=True)
+    except OperationFailure as e:
+        fields = ', '.join(field for field, _ in keys)
+        logger.error(
+            f"Unique index on {collection.name} ({fields}) not created: {str(e)}. "
+            f"Remove duplicate {collection.name} documents and restart to enforce it."
+        )
+
+async def create_indexes():
+    await db.expense_rollups.create_index(
+        [('fleet_owner_id', 1), ('granularity', 1), ('dimension', 1), ('bucket', 1)]
+    )
+    await db.funding_pools.create_index('fleet_owner_id', unique=True)
+    await db.wallet_ledger.create_index([('wallet_id', 1), ('seq', 1)], unique=True)
+    await db.wallet_ledger.create_index([('wallet_id', 1), ('created_at', 1)])
+    await db.wallet_snapshots.create_index([('wallet_id', 1), ('seq', -1)])
+    await db.lane_stats.create_index([('fleet_owner_id', 1), ('trips', -1)])
+    await db.expenses.create_index([('status', 1), ('trip_id', 1)])
+    await db.revoked_tokens.create_index('expires_at', expireAfterSeconds=0)
+    await db.revoked_tokens.create_index('revoked_at')
+    await create_unique_index(db.users, [('email', 1)])
+    await create_unique_index(db.vehicles, [('fleet_owner_id', 1), ('registration_number', 1)])
+    try:
+        await db.create_collection(
+            'trip_telemetry',
+            timeseries={'timeField': 'ts', 'metaField': 'meta', 'granularity': 'seconds'}
+        )
+    except CollectionInvalid:
+        pass
+    try:
+        await db.create_collection('slow_queries', capped=True, size=SLOW_QUERY_LOG_BYTES)
+    except CollectionInvalid:
+        pass
+
+def start_telemetry_flusher() -> asyncio.Task:
+    return asyncio.create_task(telemetry_buffer.run(db.trip_telemetry, db.trips))
+
+async def start_anomaly_scorer() -> asyncio.Task:
+    anomaly_scorer.load(await db.anomaly_stats.find({}).to_list(None))
+    return asyncio.create_task(anomaly_scorer.run(db.anomaly_stats))
+
+async def start_revocation_list() -> asyncio.Task:
+    await revocation_list.refresh(db.revoked_tokens)
+    return asyncio.create_task(revocation_list.run(db.revoked_tokens))
+
+def start_slow_query_log() -> asyncio.Task:
+    return asyncio.create_task(slow_query_log.run(db))
+
+def start_cost_model() -> asyncio.Task:
+    global cost_model
+    cost_model = CostModel.load(COST_MODEL_PATH)
+    return asyncio.create_task(maintain_cost_model())
\ No newline at end of file
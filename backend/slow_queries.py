@@ -0,0 +1,310 @@
+"""Slow MongoDB command log with explain() capture.
+
+A PyMongo command listener notes which read/write commands ran longer than the threshold;
+a background task explains them off the request path and appends one document per slow
+command to a capped collection. Only the query *shape* (field names and operators, values
+replaced by '?') is stored, so the log holds no customer data.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# ASGI scope of the request being served; Motor copies the context into its executor
+# threads, so the listener can see which route issued a command
+current_scope: ContextVar[Optional[Dict[str, Any]]] = ContextVar('current_scope', default=None)
+
+EXPLAINABLE = frozenset({'find', 'aggregate', 'count', 'distinct', 'update', 'delete', 'findAndModify'})
+# Fields of each command that explain accepts; session, transaction and cluster fields are dropped
+EXPLAIN_FIELDS = {
+    'find': ('find', 'filter', 'sort', 'projection', 'hint', 'skip', 'limit', 'collation'),
+    'aggregate': ('aggregate', 'pipeline', 'hint', 'collation'),
+    'count': ('count', 'query', 'hint', 'skip', 'limit', 'collation'),
+    'distinct': ('distinct', 'key', 'query', 'collation'),
+    'update': ('update', 'updates'),
+    'delete': ('delete', 'deletes'),
+    'findAndModify': ('findAndModify', 'query', 'sort', 'update', 'remove', 'upsert', 'new', 'fields',
+                      'arrayFilters', 'hint', 'collation')
+}
+
+
+def query_shape(value: Any) -> Any:
+    """Field names and operators kept, literal values replaced, so {'a': 1} and {'a': 2} match."""
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        shapes = [query_shape(item) for item in value if isinstance(item, (dict, list, tuple))]
+        return shapes if shapes else ['?']
+    return '?'
+
+
+def command_shape(command_name: str, command: Dict[str, Any]) -> Dict[str, Any]:
+    if command_name == 'find':
+        source = {'filter': command.get('filter', {})}
+    elif command_name == 'aggregate':
+        # Stage names plus the shape of each stage; $match/$sort are what pick the plan
+        source = {'pipeline': command.get('pipeline', [])}
+    elif command_name in ('count', 'distinct', 'findAndModify'):
+        source = {'filter': command.get('query', {})}
+    elif command_name in ('update', 'delete'):
+        statements = command.get(command_name + 's') or [{}]
+        source = {'filter': statements[0].get('q', {})}
+    else:
+        source = {}
+    shape = {key: query_shape(item) for key, item in source.items()}
+    # Sort directions and the distinct key are part of the shape, not data
+    for key in ('sort', 'key'):
+        if command.get(key) is not None:
+            shape[key] = command[key]
+    return shape
+
+
+def shape_id(collection: str, command_name: str, shape: Dict[str, Any]) -> str:
+    raw = json.dumps([collection, command_name, shape], sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+def explain_command(command_name: str, command: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    explained = {key: command[key] for key in EXPLAIN_FIELDS.get(command_name, ()) if key in command}
+    if not explained:
+        return None
+    if command_name == 'aggregate':
+        if any(isinstance(stage, dict) and ({'$out', '$merge'} & set(stage)) for stage in explained.get('pipeline', [])):
+            return None
+        explained['cursor'] = {}
+    # A batched write is explained by its first statement
+    for batch in ('updates', 'deletes'):
+        if batch in explained:
+            explained[batch] = explained[batch][:1]
+    return explained
+
+
+def _plan_section(explain: Dict[str, Any]) -> Dict[str, Any]:
+    """The part of an explain reply holding queryPlanner/executionStats; aggregate nests it in $cursor."""
+    if 'queryPlanner' in explain:
+        return explain
+    for stage in explain.get('stages', []):
+        cursor = stage.get('$cursor') if isinstance(stage, dict) else None
+        if isinstance(cursor, dict) and 'queryPlanner' in cursor:
+            return cursor
+    return {}
+
+
+def _plan_stages(plan: Any, stages: List[str], indexes: List[str]):
+    if not isinstance(plan, dict):
+        return
+    if 'stage' in plan:
+        stages.append(plan['stage'])
+    if plan.get('indexName'):
+        indexes.append(plan['indexName'])
+    # classic plans nest via inputStage(s); slot-based plans wrap the tree in queryPlan
+    for key in ('queryPlan', 'inputStage'):
+        _plan_stages(plan.get(key), stages, indexes)
+    for child in plan.get('inputStages', []):
+        _plan_stages(child, stages, indexes)
+
+
+def summarize_explain(explain: Dict[str, Any]) -> Dict[str, Any]:
+    section = _plan_section(explain)
+    stages: List[str] = []
+    indexes: List[str] = []
+    _plan_stages(section.get('queryPlanner', {}).get('winningPlan'), stages, indexes)
+    execution = section.get('executionStats', {})
+    return {
+        'stages': stages,
+        'collscan': 'COLLSCAN' in stages,
+        'indexes': sorted(set(indexes)),
+        'docs_examined': execution.get('totalDocsExamined'),
+        'keys_examined': execution.get('totalKeysExamined'),
+        'n_returned': execution.get('nReturned'),
+        'execution_ms': execution.get('executionTimeMillis')
+    }
+
+
+def _route(scope: Optional[Dict[str, Any]]) -> str:
+    if scope is None:
+        return 'background'
+    route = scope.get('route')
+    template = getattr(route, 'path', None) or scope.get('path', 'unmatched')
+    return f"{scope.get('method', 'WS')} {template}"
+
+
+class RouteContextMiddleware:
+    """Pure ASGI middleware exposing the request scope to the command listener."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] not in ('http', 'websocket'):
+            await self.app(scope, receive, send)
+            return
+        token = current_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_scope.reset(token)
+
+
+class SlowQueryLog(monitoring.CommandListener):
+    def __init__(self, threshold_ms: float, log_collection: str = 'slow_queries', max_pending: int = 1000,
+                 explain_interval: float = 300.0, flush_interval: float = 5.0):
+        self.threshold_ms = threshold_ms
+        self.log_collection = log_collection
+        self.explain_interval = explain_interval
+        self.flush_interval = flush_interval
+        self._inflight: Dict[Tuple[int, Any], Tuple[Dict[str, Any], Optional[Dict[str, Any]]]] = {}
+        self._lock = threading.Lock()
+        # Bounded so a slow database cannot grow memory without limit; overflow is counted
+        self._pending: Deque[Dict[str, Any]] = deque(maxlen=max_pending)
+        # shape_id -> (monotonic time, summary): one explain per shape per interval
+        self._explained: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self.slow = 0
+        self.dropped = 0
+        self.recorded = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold_ms > 0
+
+    def started(self, event):
+        if event.command_name not in EXPLAINABLE or event.command.get(event.command_name) == self.log_collection:
+            return
+        with self._lock:
+            self._inflight[(event.request_id, event.connection_id)] = (event.command, current_scope.get())
+
+    def succeeded(self, event):
+        with self._lock:
+            entry = self._inflight.pop((event.request_id, event.connection_id), None)
+        if entry is None or event.duration_micros < self.threshold_ms * 1000:
+            return
+        command, scope = entry
+        self.slow += 1
+        if len(self._pending) == self._pending.maxlen:
+            self.dropped += 1
+        self._pending.append({
+            'database': event.database_name,
+            'command_name': event.command_name,
+            'command': command,
+            'route': _route(scope),
+            'duration_ms': event.duration_micros / 1000,
+            'at': datetime.now(timezone.utc).isoformat()
+        })
+
+    def failed(self, event):
+        with self._lock:
+            self._inflight.pop((event.request_id, event.connection_id), None)
+
+    async def _explain(self, client, record: Dict[str, Any], key: str) -> Dict[str, Any]:
+        cached = self._explained.get(key)
+        if cached and time.monotonic() - cached[0] < self.explain_interval:
+            return cached[1]
+        explained = explain_command(record['command_name'], record['command'])
+        if explained is None:
+            return {'error': "not explainable"}
+        try:
+            reply = await client[record['database']].command({'explain': explained, 'verbosity': 'executionStats'})
+            summary = summarize_explain(reply)
+        except Exception as e:
+            summary = {'error': str(e)}
+        self._explained[key] = (time.monotonic(), summary)
+        return summary
+
+    async def flush(self, db):
+        documents = []
+        while self._pending:
+            record = self._pending.popleft()
+            collection = str(record['command'].get(record['command_name'], '-'))
+            shape = command_shape(record['command_name'], record['command'])
+            key = shape_id(collection, record['command_name'], shape)
+            documents.append({
+                'shape_id': key,
+                'collection': collection,
+                'command': record['command_name'],
+                'shape': json.dumps(shape, sort_keys=True, default=str),
+                'route': record['route'],
+                'duration_ms': round(record['duration_ms'], 3),
+                'explain': await self._explain(db.client, record, key),
+                'created_at': record['at']
+            })
+        if documents:
+            await db.get_collection(self.log_collection).insert_many(documents, ordered=False)
+            self.recorded += len(documents)
+
+    async def run(self, db):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush(db)
+            except Exception as e:
+                logger.error(f"Slow query log flush failed: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'threshold_ms': self.threshold_ms,
+            'slow': self.slow,
+            'pending': len(self._pending),
+            'dropped': self.dropped,
+            'recorded': self.recorded,
+            'explained_shapes': len(self._explained)
+        }
+
+
+def worst_offenders_pipeline(sort: str = 'total_ms', limit: int = 20, since: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Aggregate the capped log by query shape, worst first."""
+    pipeline: List[Dict[str, Any]] = []
+    if since:
+        pipeline.append({'$match': {'created_at': {'$gte': since}}})
+    pipeline += [
+        {'$sort': {'created_at': 1}},
+        {'$group': {
+            '_id': '$shape_id',
+            'collection': {'$first': '$collection'},
+            'command': {'$first': '$command'},
+            'shape': {'$first': '$shape'},
+            'routes': {'$addToSet': '$route'},
+            'count': {'$sum': 1},
+            'total_ms': {'$sum': '$duration_ms'},
+            'avg_ms': {'$avg': '$duration_ms'},
+            'max_ms': {'$max': '$duration_ms'},
+            'collscan': {'$max': '$explain.collscan'},
+            'last_explain': {'$last': '$explain'},
+            'last_seen': {'$last': '$created_at'}
+        }},
+        {'$sort': {sort: -1}},
+        {'$limit': limit},
+        {'$project': {
+            '_id': 0,
+            'shape_id': '$_id',
+            'collection': 1,
+            'command': 1,
+            'shape': 1,
+            'routes': 1,
+            'count': 1,
+            'total_ms': {'$round': ['$total_ms', 1]},
+            'avg_ms': {'$round': ['$avg_ms', 1]},
+            'max_ms': 1,
+            'collscan': 1,
+            'stages': '$last_explain.stages',
+            'indexes': '$last_explain.indexes',
+            'docs_examined': '$last_explain.docs_examined',
+            'n_returned': '$last_explain.n_returned',
+            'examined_per_returned': {'$cond': [
+                {'$gt': [{'$ifNull': ['$last_explain.n_returned', 0]}, 0]},
+                {'$round': [{'$divide': ['$last_explain.docs_examined', '$last_explain.n_returned']}, 1]},
+                None
+            ]},
+            'last_seen': 1
+        }}
+    ]
+    return pipeline
@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from geo import EARTH_RADIUS_KM
+
+logger = logging.getLogger(__name__)
+
+
+def as_utc(ts: datetime) -> datetime:
+    # Mongo hands back naive UTC datetimes; clients may send either
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts.astimezone(timezone.utc)
+
+
+def _haversine_expr(a: str, b: str) -> Dict[str, Any]:
+    """geo.haversine_km as an aggregation expression over two {lat, lon} documents."""
+    lat1 = {'$degreesToRadians': f'{a}.lat'}
+    lat2 = {'$degreesToRadians': f'{b}.lat'}
+    half_dlat = {'$divide': [{'$subtract': [lat2, lat1]}, 2]}
+    half_dlon = {'$divide': [{'$degreesToRadians': {'$subtract': [f'{b}.lon', f'{a}.lon']}}, 2]}
+    h = {'$add': [
+        {'$pow': [{'$sin': half_dlat}, 2]},
+        {'$multiply': [{'$cos': lat1}, {'$cos': lat2}, {'$pow': [{'$sin': half_dlon}, 2]}]}
+    ]}
+    return {'$multiply': [2 * EARTH_RADIUS_KM, {'$asin': {'$sqrt': {'$min': [1, h]}}}]}
+
+
+def distance_update(points: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Pipeline update extending the trip's path from its persisted telemetry_last_point.
+
+    Every worker measures from the same stored point, so batches for one trip that land on
+    different workers add up to the same distance, and points at or before the stored
+    point (late, or already applied by a retried flush) add nothing.
+    """
+    no_last = {'$eq': [{'$ifNull': ['$$value.last', None]}, None]}
+    return [
+        {'$set': {'_telemetry': {'$reduce': {
+            'input': {'$literal': points},
+            'initialValue': {'last': '$telemetry_last_point', 'km': 0.0},
+            'in': {'$cond': [
+                {'$or': [no_last, {'$gt': ['$$this.ts', '$$value.last.ts']}]},
+                {
+                    'last': '$$this',
+                    'km': {'$add': ['$$value.km', {'$cond': [no_last, 0.0, _haversine_expr('$$value.last', '$$this')]}]}
+                },
+                '$$value'
+            ]}
+        }}}},
+        {'$set': {
+            'actual_distance': {'$round': [{'$add': [{'$ifNull': ['$actual_distance', 0.0]}, '$_telemetry.km']}, 4]},
+            'telemetry_last_point': '$_telemetry.last'
+        }},
+        {'$unset': '_telemetry'}
+    ]
+
+
+class TripTrack:
+    """A trip reporting to this worker; points holds the path segment not yet applied to the trip."""
+
+    def __init__(self, driver_id: str, fleet_owner_id: Optional[str] = None):
+        self.driver_id = driver_id
+        self.fleet_owner_id = fleet_owner_id
+        self.points: List[Dict[str, Any]] = []
+        self.last_seen = time.monotonic()
+        self.verified_at = time.monotonic()
+
+
+class TelemetryBuffer:
+    """Buffers GPS points in memory and writes them with insert_many on a timer or when the buffer fills.
+
+    on_distance is awaited with the tracks whose trip distance was updated by a flush.
+    """
+
+    def __init__(self, flush_size: int = 5000, flush_interval: float = 1.0, max_pending: int = 200000,
+                 idle_timeout: float = 900.0, recheck_interval: float = 30.0,
+                 on_distance: Optional[Callable[[List[TripTrack]], Awaitable[None]]] = None):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.idle_timeout = idle_timeout
+        self.recheck_interval = recheck_interval
+        self.on_distance = on_distance
+        self.tracks: Dict[str, TripTrack] = {}
+        self._pending: List[Dict[str, Any]] = []
+        self._flush_requested = asyncio.Event()
+        self._lock = asyncio.Lock()
+
+    def track(self, trip_id: str) -> Optional[TripTrack]:
+        """The cached track, or None when the trip must be (re)checked against the database."""
+        track = self.tracks.get(trip_id)
+        if track is None or time.monotonic() - track.verified_at > self.recheck_interval:
+            return None
+        return track
+
+    def start_track(self, trip_id: str, trip: Dict[str, Any]) -> TripTrack:
+        track = self.tracks.get(trip_id)
+        if track is None:
+            track = self.tracks[trip_id] = TripTrack(trip['driver_id'], trip.get('fleet_owner_id'))
+        track.verified_at = time.monotonic()
+        return track
+
+    def is_full(self) -> bool:
+        return len(self._pending) >= self.max_pending
+
+    def add(self, trip_id: str, points: List[Dict[str, Any]]) -> TripTrack:
+        track = self.tracks[trip_id]
+        meta = {'trip_id': trip_id, 'driver_id': track.driver_id}
+        for point in points:
+            ts = as_utc(point['ts'])
+            self._pending.append({'ts': ts, 'meta': meta, 'lat': point['lat'], 'lon': point['lon'], 'speed': point.get('speed')})
+            track.points.append({'lat': point['lat'], 'lon': point['lon'], 'ts': ts})
+        track.last_seen = time.monotonic()
+        if len(self._pending) >= self.flush_size:
+            self._flush_requested.set()
+        return track
+
+    async def flush(self, telemetry_collection, trips_collection, completed: Iterable[str] = ()):
+        """Write buffered points and distances. Distance only moves on in_progress trips, plus
+        the trips in `completed`, which this worker has just completed itself."""
+        completed = set(completed)
+        async with self._lock:
+            points, self._pending = self._pending, []
+            segments = {trip_id: track.points for trip_id, track in self.tracks.items() if track.points}
+            flushed = [self.tracks[trip_id] for trip_id in segments]
+            for track in flushed:
+                track.points = []
+
+            try:
+                if points:
+                    await telemetry_collection.insert_many(points, ordered=False)
+            except Exception as e:
+                # Keep whatever was not written for the next flush; ordered=False reports per-point failures
+                failed = points
+                if isinstance(e, BulkWriteError):
+                    failed = [points[error['index']] for error in e.details.get('writeErrors', [])]
+                self._pending[:0] = failed
+                logger.error(f"Telemetry flush error ({len(failed)} of {len(points)} points kept): {str(e)}")
+
+            updates = []
+            for trip_id, segment in segments.items():
+                status = {'$in': ['in_progress', 'completed']} if trip_id in completed else 'in_progress'
+                updates.append(UpdateOne(
+                    {'id': trip_id, 'status': status},
+                    distance_update(sorted(segment, key=lambda p: p['ts']))
+                ))
+            try:
+                if updates:
+                    await trips_collection.bulk_write(updates, ordered=False)
+            except Exception as e:
+                # The update skips points at or before the stored last point, so re-sending is safe
+                for trip_id, segment in segments.items():
+                    if trip_id in self.tracks:
+                        self.tracks[trip_id].points[:0] = segment
+                logger.error(f"Telemetry distance update error ({len(updates)} trips): {str(e)}")
+                flushed = []
+
+            # Trips that stopped reporting (or were completed on another worker) are reloaded on demand
+            cutoff = time.monotonic() - self.idle_timeout
+            for trip_id in [t for t, track in self.tracks.items() if track.last_seen < cutoff and not track.points]:
+                del self.tracks[trip_id]
+
+        if flushed and self.on_distance:
+            try:
+                await self.on_distance(flushed)
+            except Exception as e:
+                logger.error(f"Telemetry distance callback error: {str(e)}")
+
+    async def finish(self, trip_id: str, telemetry_collection, trips_collection):
+        """Apply this worker's last points to a trip it has just completed and forget the track."""
+        await self.flush(telemetry_collection, trips_collection, completed=[trip_id])
+        self.tracks.pop(trip_id, None)
+
+    async def run(self, telemetry_collection, trips_collection):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush(telemetry_collection, trips_collection)
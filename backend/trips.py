@@ -0,0 +1,32 @@
+from typing import Any, Dict, Optional
+
+from pymongo import UpdateOne
+
+TRIP_TRANSITIONS = {
+    'planned': ('in_progress', 'cancelled'),
+    'in_progress': ('completed', 'cancelled')
+}
+
+# (trip status before, after) -> (vehicle status the trip left it in, status to set). A planned
+# trip never took its vehicle, so cancelling it leaves the vehicle alone.
+VEHICLE_TRANSITIONS = {
+    ('planned', 'in_progress'): ('available', 'in_use'),
+    ('in_progress', 'completed'): ('in_use', 'available'),
+    ('in_progress', 'cancelled'): ('in_use', 'available')
+}
+
+
+def vehicle_update(trip: Dict[str, Any], status: str) -> Optional[UpdateOne]:
+    """Vehicle write for moving trip to status, or None when the vehicle is not affected.
+
+    The filter requires the status this trip's own transition expects, so a vehicle that has
+    since gone into maintenance or been released is never overwritten.
+    """
+    transition = VEHICLE_TRANSITIONS.get((trip['status'], status))
+    if not transition or not trip.get('vehicle_id'):
+        return None
+    expected, new = transition
+    return UpdateOne(
+        {'id': trip['vehicle_id'], 'fleet_owner_id': trip['fleet_owner_id'], 'status': expected},
+        {'$set': {'status': new}}
+    )
@@ -0,0 +1,344 @@
+"""In-process API benchmark suite.
+
+Drives the FastAPI app through httpx's ASGI transport (no network, no uvicorn)
+against a local Mongo, or against mongomock-motor with --in-memory, after
+seeding a realistic fleet: thousands of drivers, tens of thousands of trips
+and hundreds of thousands of expenses. Reports p50/p95/p99 latency and
+requests/s per endpoint, and can save or compare against a baseline.
+
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_api.py --save benchmarks/api_baseline.json
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_api.py --compare benchmarks/api_baseline.json
+    python benchmarks/bench_api.py --in-memory --drivers 100 --trips 500 --expenses 3000   # needs mongomock-motor
+
+The seeded database (BENCH_DB_NAME, default transops_bench) is dropped first.
+mongomock is pure Python and scans collections on every query, so --in-memory
+is for small offline runs; only compare baselines recorded on the same backend.
+A scenario with failed requests is reported, left out of --save and --compare,
+and makes the run exit non-zero unless --allow-errors is given: its latencies
+would describe the error path, not the endpoint.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'backend'
+
+CATEGORY_AMOUNTS = {  # (median INR, log-space spread)
+    'fuel': (4500.0, 0.5),
+    'toll': (900.0, 0.6),
+    'food': (350.0, 0.4),
+    'lodging': (1200.0, 0.4),
+    'repair': (3000.0, 0.9)
+}
+
+
+def configure_environment(in_memory):
+    os.environ['DB_NAME'] = os.environ.get('BENCH_DB_NAME', 'transops_bench')
+    os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.chdir(BACKEND_DIR)
+    import server
+
+    if in_memory:
+        from mongomock_motor import AsyncMongoMockClient
+
+        def connect():
+            server.mongo.client = AsyncMongoMockClient()
+            server.mongo.db = server.mongo.client[server.mongo.db_name]
+            server.mongo.pid = os.getpid()
+
+        async def create_indexes():
+            # mongomock has no time-series collections; its indexes do not change query plans anyway
+            pass
+
+        server.mongo.connect = connect
+        server.create_indexes = create_indexes
+    return server
+
+
+def doc(model):
+    data = model.model_dump()
+    for field in ('created_at', 'updated_at'):
+        if isinstance(data.get(field), datetime):
+            data[field] = data[field].isoformat()
+    return data
+
+
+async def insert_batched(collection, docs, batch=10000):
+    for start in range(0, len(docs), batch):
+        await collection.insert_many(docs[start:start + batch], ordered=False)
+
+
+async def seed(server, args, rng):
+    db = server.db
+    for name in await db.list_collection_names():
+        await db.drop_collection(name)
+    await server.create_indexes()
+
+    cities = list(server.road_graph.coords)
+    owners = [server.User(email=f"owner{i}@bench.local", name=f"Owner {i}", role='fleet_owner')
+              for i in range(max(1, args.drivers // 100))]
+    drivers = [server.User(email=f"driver{i}@bench.local", name=f"Driver {i}", role='driver',
+                           fleet_owner_id=owners[i % len(owners)].id)
+               for i in range(args.drivers)]
+    vehicles = [server.Vehicle(fleet_owner_id=owners[i % len(owners)].id, registration_number=f"MH{i:06d}",
+                               vehicle_type=rng.choice(['truck', 'trailer', 'container', 'mini_truck']),
+                               capacity=rng.choice([7.5, 10, 16, 25]))
+                for i in range(max(len(owners), args.drivers // 2))]
+    drivers_by_owner, vehicles_by_owner = {}, {}
+    for driver in drivers:
+        drivers_by_owner.setdefault(driver.fleet_owner_id, []).append(driver)
+    for vehicle in vehicles:
+        vehicles_by_owner.setdefault(vehicle.fleet_owner_id, []).append(vehicle)
+
+    now = datetime.now(timezone.utc)
+    trips = []
+    for _ in range(args.trips):
+        owner = rng.choice(owners)
+        origin, destination = rng.sample(cities, 2)
+        created = now - timedelta(days=rng.uniform(0, 180))
+        completed = rng.random() < 0.85
+        trips.append({
+            **doc(server.Trip(
+                fleet_owner_id=owner.id,
+                driver_id=rng.choice(drivers_by_owner[owner.id]).id,
+                vehicle_id=rng.choice(vehicles_by_owner[owner.id]).id,
+                origin=origin,
+                destination=destination,
+                cargo_weight=round(rng.uniform(1, 20), 1),
+                estimated_distance=server.road_graph.distance(origin, destination),
+                status='completed' if completed else 'in_progress'
+            )),
+            'created_at': created.isoformat(),
+            'completed_at': (created + timedelta(days=2)).isoformat() if completed else None
+        })
+
+    expenses = []
+    for _ in range(args.expenses):
+        trip = rng.choice(trips)
+        category = rng.choice(list(CATEGORY_AMOUNTS))
+        median, spread = CATEGORY_AMOUNTS[category]
+        amount = round(median * math.exp(rng.gauss(0, spread)), 2)
+        trip['total_expenses'] += amount
+        created = datetime.fromisoformat(trip['created_at']) + timedelta(hours=rng.uniform(0, 48))
+        expenses.append({
+            **doc(server.Expense(trip_id=trip['id'], driver_id=trip['driver_id'], category=category, amount=amount)),
+            'created_at': created.isoformat()
+        })
+    for trip in trips:
+        trip['total_expenses'] = round(trip['total_expenses'], 2)
+        if trip['status'] == 'completed':
+            trip['revenue'] = round(trip['total_expenses'] * rng.uniform(1.05, 1.6), 2)
+            trip['profitability'] = round(trip['revenue'] - trip['total_expenses'], 2)
+
+    # Generous limits so the write scenario measures the happy path
+    wallets = [{
+        **doc(server.Wallet(driver_id=driver.id, balance=1e9, **{f"{c}_limit": 1e9 for c in CATEGORY_AMOUNTS})),
+        'limit_periods': {c: 'monthly' for c in CATEGORY_AMOUNTS}
+    } for driver in drivers]
+
+    await insert_batched(db.users, [doc(user) for user in owners + drivers])
+    await insert_batched(db.vehicles, [doc(vehicle) for vehicle in vehicles])
+    await insert_batched(db.wallets, wallets)
+    await insert_batched(db.driver_performance, [
+        doc(server.DriverPerformance(driver_id=driver.id, total_trips=rng.randint(0, 200),
+                                     average_fuel_efficiency=round(rng.uniform(2.5, 5.0), 2),
+                                     safety_score=round(rng.uniform(60, 100), 1)))
+        for driver in drivers
+    ])
+    await insert_batched(db.trips, trips)
+    await insert_batched(db.expenses, expenses)
+    await insert_batched(db.return_loads, [
+        doc(server.ReturnLoad(fleet_owner_id=rng.choice(owners).id, origin=o, destination=d,
+                              offered_price=round(rng.uniform(5000, 60000), -2),
+                              estimated_distance=server.road_graph.distance(o, d)))
+        for o, d in (rng.sample(cities, 2) for _ in range(500))
+    ])
+    return owners, drivers, trips
+
+
+async def rebuild_analytics(http, owners, tokens):
+    for owner in owners:
+        headers = {'Authorization': f"Bearer {tokens[owner.id]}"}
+        await http.post('/api/analytics/expenses/rebuild', headers=headers)
+        await http.post('/api/analytics/lanes/rebuild', headers=headers)
+
+
+def scenarios(owners, drivers, trips, tokens, rng):
+    active = [t for t in trips if t['status'] == 'in_progress']
+    cities = ['Mumbai', 'Pune', 'Delhi', 'Bengaluru', 'Chennai', 'Kolkata', 'Nagpur', 'Jaipur']
+
+    def owner():
+        return {'Authorization': f"Bearer {tokens[rng.choice(owners).id]}"}
+
+    def driver_of(driver_id):
+        return {'Authorization': f"Bearer {tokens[driver_id]}"}
+
+    def driver():
+        return driver_of(rng.choice(drivers).id)
+
+    def new_expense():
+        trip = rng.choice(active)
+        category = rng.choice(list(CATEGORY_AMOUNTS))
+        return ('POST', '/api/expenses', driver_of(trip['driver_id']), {
+            'trip_id': trip['id'], 'driver_id': trip['driver_id'], 'category': category,
+            'amount': round(CATEGORY_AMOUNTS[category][0] * rng.uniform(0.7, 1.3), 2)
+        })
+
+    return [
+        ('GET /trips (owner)', lambda: ('GET', '/api/trips', owner(), None)),
+        ('GET /trips (driver)', lambda: ('GET', '/api/trips', driver(), None)),
+        ('GET /expenses (owner)', lambda: ('GET', '/api/expenses', owner(), None)),
+        ('GET /vehicles', lambda: ('GET', '/api/vehicles', owner(), None)),
+        ('GET /drivers', lambda: ('GET', '/api/drivers', owner(), None)),
+        ('GET /dashboard/bootstrap (owner)', lambda: ('GET', '/api/dashboard/bootstrap', owner(), None)),
+        ('GET /dashboard/bootstrap (driver)', lambda: ('GET', '/api/dashboard/bootstrap', driver(), None)),
+        ('GET /analytics/expenses', lambda: ('GET', '/api/analytics/expenses?dimension=category', owner(), None)),
+        ('GET /analytics/lanes', lambda: ('GET', '/api/analytics/lanes', owner(), None)),
+        ('GET /return-loads?near=', lambda: ('GET', f"/api/return-loads?near={rng.choice(cities)}", owner(), None)),
+        ('GET /distance', lambda: ('GET', f"/api/distance?origin={rng.choice(cities)}&destination=Guwahati", owner(), None)),
+        ('POST /expenses', new_expense),
+    ]
+
+
+async def measure(http, make_request, requests, concurrency):
+    latencies, failures = [], Counter()
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            method, url, headers, body = make_request()
+            start = time.perf_counter()
+            response = await http.request(method, url, headers=headers, json=body)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                failures[response.status_code] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    quantiles = statistics.quantiles(latencies, n=100, method='inclusive')
+    return {
+        'p50_ms': round(quantiles[49] * 1000, 2),
+        'p95_ms': round(quantiles[94] * 1000, 2),
+        'p99_ms': round(quantiles[98] * 1000, 2),
+        'rps': round(len(latencies) / elapsed, 1),
+        'errors': sum(failures.values()),
+        'error_statuses': {str(status): count for status, count in sorted(failures.items())}
+    }
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    print(f"\n{'endpoint':<36} {'p95 ms':>17} {'req/s':>19}")
+    for name, result in results.items():
+        before = baseline.get('results', {}).get(name)
+        if not before:
+            print(f"{name:<36} {'(new)':>17}")
+            continue
+        p95_change = (result['p95_ms'] - before['p95_ms']) / before['p95_ms'] if before['p95_ms'] else 0.0
+        rps_change = (result['rps'] - before['rps']) / before['rps'] if before['rps'] else 0.0
+        flag = ''
+        if p95_change > tolerance or rps_change < -tolerance:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f"{name:<36} {before['p95_ms']:>7.1f}->{result['p95_ms']:<7.1f}{p95_change:+6.0%} "
+              f"{before['rps']:>7.0f}->{result['rps']:<7.0f}{rps_change:+6.0%}{flag}")
+    return regressions
+
+
+async def run(args):
+    import httpx
+
+    server = configure_environment(args.in_memory)
+    rng = random.Random(args.seed)
+
+    async with server.lifespan(server.app):
+        seed_start = time.perf_counter()
+        owners, drivers, trips = await seed(server, args, rng)
+        tokens = {user.id: server.create_token(user.model_dump()) for user in owners + drivers}
+        print(f"seeded {len(owners)} owners, {len(drivers)} drivers, {len(trips)} trips, "
+              f"{args.expenses} expenses in {time.perf_counter() - seed_start:.1f}s")
+
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench') as http:
+            if not args.in_memory:
+                await rebuild_analytics(http, owners, tokens)
+
+            results, failed = {}, []
+            print(f"\n{'endpoint':<36} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'errors':>7}")
+            for name, make_request in scenarios(owners, drivers, trips, tokens, rng):
+                if args.only and args.only not in name:
+                    continue
+                await measure(http, make_request, args.warmup, args.concurrency)
+                result = await measure(http, make_request, args.requests, args.concurrency)
+                results[name] = result
+                print(f"{name:<36} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} "
+                      f"{result['rps']:>8.0f} {result['errors']:>7}")
+                if result['errors']:
+                    failed.append(name)
+
+    for name in failed:
+        statuses = ', '.join(f"{count}x {status}" for status, count in results[name]['error_statuses'].items())
+        print(f"\nwarning: {name}: {results[name]['errors']}/{args.requests} requests failed ({statuses}); "
+              f"not saved or compared")
+    clean = {name: result for name, result in results.items() if name not in failed}
+
+    report = {
+        'backend': 'mongomock' if args.in_memory else 'mongodb',
+        'dataset': {'drivers': args.drivers, 'trips': args.trips, 'expenses': args.expenses},
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'results': clean
+    }
+    regressions = []
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        if baseline.get('backend') != report['backend'] or baseline.get('dataset') != report['dataset']:
+            print("\nwarning: baseline was recorded with a different backend or dataset size")
+        regressions = compare(clean, baseline, args.tolerance)
+    if args.save:
+        Path(args.save).write_text(json.dumps(report, indent=2) + '\n')
+    return regressions, failed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--in-memory', action='store_true', help='use mongomock-motor instead of MONGO_URL')
+    parser.add_argument('--drivers', type=int, default=2000)
+    parser.add_argument('--trips', type=int, default=20000)
+    parser.add_argument('--expenses', type=int, default=200000)
+    parser.add_argument('--requests', type=int, default=500, help='measured requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--only', help='run endpoints whose name contains this text')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--save', help='write results to this JSON file')
+    parser.add_argument('--compare', help='compare against a JSON file written by --save')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed p95/rps change before flagging')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    parser.add_argument('--allow-errors', action='store_true', help='exit 0 even if some requests failed')
+    args = parser.parse_args()
+    if args.compare:
+        args.compare = str(Path(args.compare).resolve())
+    if args.save:
+        args.save = str(Path(args.save).resolve())
+
+    regressions, failed = asyncio.run(run(args))
+    if (regressions and args.fail_on_regression) or (failed and not args.allow_errors):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Local cost model accuracy and latency, optionally against the LLM.
+
+Trains backend/cost_model.py on synthetic completed trips (or a JSON export of
+real ones), reports holdout error and per-prediction latency. With
+EMERGENT_LLM_KEY set, a small sample is also priced by the LLM for comparison.
+
+    python benchmarks/bench_cost_model.py --trips 5000
+    python benchmarks/bench_cost_model.py --input completed_trips.json --llm-sample 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+from cost_model import CostModel  # noqa: E402
+
+CITIES = ['Mumbai', 'Delhi', 'Bengaluru', 'Chennai', 'Kolkata', 'Hyderabad', 'Pune', 'Ahmedabad',
+          'Jaipur', 'Lucknow', 'Nagpur', 'Indore', 'Surat', 'Kanpur', 'Bhopal', 'Patna']
+VEHICLE_RATES = {'truck': 38.0, 'mini_truck': 24.0, 'trailer': 52.0, 'container': 46.0, 'tanker': 44.0}
+
+
+def synthetic_trips(count, seed=42):
+    rng = random.Random(seed)
+    lane_distance = {}
+    lane_toll = {}
+    trips = []
+    for _ in range(count):
+        origin, destination = rng.sample(CITIES, 2)
+        lane = (origin, destination)
+        if lane not in lane_distance:
+            lane_distance[lane] = rng.uniform(150, 2200)
+            lane_toll[lane] = rng.uniform(0.5, 3.0)
+        vehicle_type = rng.choice(list(VEHICLE_RATES))
+        distance = lane_distance[lane] * rng.uniform(0.95, 1.1)
+        cargo = rng.uniform(1, 25)
+        cost = distance * (VEHICLE_RATES[vehicle_type] / 10 + lane_toll[lane]) + cargo * 40 + rng.gauss(0, 150)
+        trips.append({
+            'origin': origin,
+            'destination': destination,
+            'vehicle_type': vehicle_type,
+            'estimated_distance': round(distance, 1),
+            'cargo_weight': round(cargo, 2),
+            'total_expenses': round(max(cost, 0.0), 2)
+        })
+    return trips
+
+
+def mae(predicted, actual):
+    return sum(abs(p - a) for p, a in zip(predicted, actual)) / len(actual)
+
+
+async def llm_predictions(trips):
+    from emergentintegrations.llm.chat import LlmChat, UserMessage
+
+    predictions, latencies = [], []
+    for index, trip in enumerate(trips):
+        chat = LlmChat(
+            api_key=os.environ['EMERGENT_LLM_KEY'],
+            session_id=f"bench_cost_{index}",
+            system_message="You estimate total trip expenses in INR for Indian road transport. Reply with a number only."
+        ).with_model("openai", "gpt-4o-mini")
+        prompt = (f"Origin: {trip['origin']}\nDestination: {trip['destination']}\n"
+                  f"Vehicle: {trip['vehicle_type']}\nDistance: {trip['estimated_distance']} km\n"
+                  f"Cargo: {trip['cargo_weight']} tons")
+        start = time.perf_counter()
+        response = await chat.send_message(UserMessage(text=prompt))
+        latencies.append(time.perf_counter() - start)
+        match = re.search(r"[\d,]+(?:\.\d+)?", str(response))
+        predictions.append(float(match.group().replace(',', '')) if match else 0.0)
+    return predictions, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--trips', type=int, default=5000)
+    parser.add_argument('--input', help='JSON list of completed trips with total_expenses')
+    parser.add_argument('--holdout', type=float, default=0.2)
+    parser.add_argument('--llm-sample', type=int, default=10)
+    args = parser.parse_args()
+
+    trips = json.loads(Path(args.input).read_text()) if args.input else synthetic_trips(args.trips)
+    split = int(len(trips) * (1 - args.holdout))
+    train, test = trips[:split], trips[split:]
+    actual = [t['total_expenses'] for t in test]
+
+    start = time.perf_counter()
+    model = CostModel.fit(train, [t['total_expenses'] for t in train])
+    print(f"fit            {len(train)} trips in {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+    start = time.perf_counter()
+    predicted = [model.predict(t) for t in test]
+    per_call = (time.perf_counter() - start) / len(test)
+    print(f"local model    holdout MAE {mae(predicted, actual):10.2f}  {per_call * 1e6:8.1f} us/prediction")
+
+    baseline = sum(t['total_expenses'] for t in train) / len(train)
+    print(f"mean baseline  holdout MAE {mae([baseline] * len(test), actual):10.2f}")
+
+    if os.environ.get('EMERGENT_LLM_KEY') and args.llm_sample:
+        sample = test[:args.llm_sample]
+        llm, latencies = asyncio.run(llm_predictions(sample))
+        sample_actual = [t['total_expenses'] for t in sample]
+        local = [model.predict(t) for t in sample]
+        print(f"llm ({len(sample)} trips) MAE {mae(llm, sample_actual):10.2f}  "
+              f"{sum(latencies) / len(latencies) * 1000:8.1f} ms/prediction")
+        print(f"local (same)   MAE {mae(local, sample_actual):10.2f}")
+
+
+if __name__ == '__main__':
+    main()
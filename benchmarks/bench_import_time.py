@@ -0,0 +1,80 @@
+"""Import-time report for the backend, in the style of `python -X importtime`.
+
+Runs `import server` in fresh interpreters, reports the median wall time and
+the modules with the largest cumulative import cost, and checks that the
+lazily loaded integrations stayed out of the import graph. --save/--compare
+track the numbers against a stored baseline.
+
+    python benchmarks/bench_import_time.py --runs 5 --top 15
+    python benchmarks/bench_import_time.py --save benchmarks/import_baseline.json
+    python benchmarks/bench_import_time.py --compare benchmarks/import_baseline.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'backend'
+LAZY_MODULES = ('emergentintegrations',)
+ENV = {'MONGO_URL': 'mongodb://127.0.0.1:27017', 'DB_NAME': 'transops_import_bench'}
+
+
+def import_once(module):
+    env = {**os.environ, **ENV}
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        # "import time:       self [us] |  cumulative | imported package"
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line.split(':', 1)[1].split('|', 2)
+        modules[name.strip()] = {'self_us': int(self_us), 'cumulative_us': int(cumulative_us)}
+    return float(result.stdout.strip().splitlines()[-1]), modules
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--module', default='server')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--save', help='write the report to this JSON file')
+    parser.add_argument('--compare', help='compare against a report saved with --save')
+    args = parser.parse_args()
+
+    timings, modules = [], {}
+    for _ in range(args.runs):
+        elapsed, modules = import_once(args.module)
+        timings.append(elapsed)
+    median_ms = statistics.median(timings) * 1000
+
+    print(f"import {args.module}: median {median_ms:.1f} ms over {args.runs} runs "
+          f"(min {min(timings) * 1000:.1f}, max {max(timings) * 1000:.1f})")
+    print(f"\n{'cumulative ms':>14} {'self ms':>8}  module")
+    ranked = sorted(modules.items(), key=lambda item: item[1]['cumulative_us'], reverse=True)
+    for name, cost in ranked[:args.top]:
+        print(f"{cost['cumulative_us'] / 1000:>14.1f} {cost['self_us'] / 1000:>8.1f}  {name}")
+
+    eager = [name for name in modules if name.split('.')[0] in LAZY_MODULES]
+    print(f"\nlazy integrations imported at startup: {', '.join(eager) if eager else 'none'}")
+
+    report = {'module': args.module, 'median_ms': round(median_ms, 1), 'modules': len(modules)}
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        change = (median_ms - baseline['median_ms']) / baseline['median_ms'] * 100
+        print(f"baseline {baseline['median_ms']:.1f} ms ({baseline['modules']} modules) -> "
+              f"{median_ms:.1f} ms ({len(modules)} modules), {change:+.1f}%")
+    if args.save:
+        Path(args.save).write_text(json.dumps(report, indent=2) + '\n')
+    if eager:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
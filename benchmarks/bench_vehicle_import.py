@@ -0,0 +1,87 @@
+"""Streaming vehicle import benchmark.
+
+Generates a CSV or NDJSON file of vehicles (with a few invalid and duplicate rows),
+streams it to POST /api/vehicles/import in 64 KiB chunks through httpx's ASGI
+transport, and reports the import time, rows/s and the accepted/rejected summary.
+
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_vehicle_import.py --vehicles 10000
+    python benchmarks/bench_vehicle_import.py --in-memory --vehicles 10000 --format ndjson   # needs mongomock-motor
+
+Uses the same BENCH_DB_NAME database as bench_api.py, which is dropped first.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from bench_api import configure_environment
+
+VEHICLE_TYPES = ('truck', 'trailer', 'container', 'tanker', 'van')
+CHUNK_BYTES = 64 * 1024
+
+
+def build_file(count, fmt, rng):
+    rows = []
+    for i in range(count):
+        row = {
+            'registration_number': f"MH{rng.randint(1, 50):02d}AB{i:05d}",
+            'vehicle_type': rng.choice(VEHICLE_TYPES),
+            'capacity': round(rng.uniform(5, 40), 1),
+            'model': f"Model {rng.randint(1, 20)}"
+        }
+        if i % 500 == 1:
+            row['capacity'] = 'heavy'  # fails validation
+        if i % 700 == 2:
+            row['registration_number'] = rows[0]['registration_number']  # duplicate within the file
+        rows.append(row)
+    if fmt == 'csv':
+        lines = ['registration_number,vehicle_type,capacity,model']
+        lines += [f"{r['registration_number']},{r['vehicle_type']},{r['capacity']},{r['model']}" for r in rows]
+        return ('\n'.join(lines) + '\n').encode(), 'text/csv'
+    return ''.join(json.dumps(r) + '\n' for r in rows).encode(), 'application/x-ndjson'
+
+
+async def chunks(data):
+    for start in range(0, len(data), CHUNK_BYTES):
+        yield data[start:start + CHUNK_BYTES]
+
+
+async def run(args):
+    import httpx
+
+    server = configure_environment(args.in_memory)
+    rng = random.Random(args.seed)
+    data, content_type = build_file(args.vehicles, args.format, rng)
+
+    async with server.lifespan(server.app):
+        await server.client.drop_database(server.mongo.db_name)
+        await server.create_indexes()
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=None) as http:
+            owner = (await http.post('/api/auth/register', json={
+                'email': f"import-{rng.random()}@bench.local", 'password': 'bench-pass',
+                'name': 'Import Bench', 'role': 'fleet_owner'
+            })).json()
+            headers = {'Authorization': f"Bearer {owner['token']}", 'Content-Type': content_type}
+            start = time.perf_counter()
+            response = await http.post('/api/vehicles/import', content=chunks(data), headers=headers)
+            elapsed = time.perf_counter() - start
+
+    summary = response.json()
+    print(f"{args.vehicles} vehicles, {len(data) / 1024:.0f} KiB {args.format}: {elapsed:.2f}s "
+          f"({summary['received'] / elapsed:.0f} rows/s)")
+    print(f"accepted {summary['accepted']}, rejected {summary['rejected']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--vehicles', type=int, default=10000)
+    parser.add_argument('--format', choices=('csv', 'ndjson'), default='csv')
+    parser.add_argument('--in-memory', action='store_true', help='use mongomock-motor instead of MONGO_URL')
+    parser.add_argument('--seed', type=int, default=7)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Per-driver limit updates vs a single bulk_write.
+
+Mirrors what PUT /api/wallet/{driver_id}/limits (looped) and
+PUT /api/wallet/limits/bulk do against the wallets collection.
+
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_wallet_limits.py --drivers 500
+"""
+import argparse
+import asyncio
+import os
+import time
+import uuid
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+LIMITS = {
+    'fuel_limit': 5000.0,
+    'toll_limit': 1500.0,
+    'food_limit': 800.0,
+    'lodging_limit': 2000.0,
+    'repair_limit': 3000.0
+}
+
+
+async def seed(db, count):
+    await db.wallets.delete_many({})
+    driver_ids = [str(uuid.uuid4()) for _ in range(count)]
+    await db.wallets.insert_many([
+        {'id': str(uuid.uuid4()), 'driver_id': driver_id, 'balance': 0.0}
+        for driver_id in driver_ids
+    ])
+    await db.wallets.create_index('driver_id')
+    return driver_ids
+
+
+async def per_driver_loop(db, driver_ids):
+    for driver_id in driver_ids:
+        await db.wallets.update_one({'driver_id': driver_id}, {'$set': LIMITS})
+
+
+async def bulk(db, driver_ids):
+    await db.wallets.bulk_write(
+        [UpdateOne({'driver_id': driver_id}, {'$set': LIMITS}) for driver_id in driver_ids],
+        ordered=False
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--drivers', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    db = client[os.environ.get('BENCH_DB_NAME', 'transops_bench')]
+    driver_ids = await seed(db, args.drivers)
+
+    for name, fn in (('per-driver loop', per_driver_loop), ('bulk_write', bulk)):
+        timings = []
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            await fn(db, driver_ids)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        print(f"{name:<16} {args.drivers} drivers  best {best * 1000:8.1f} ms  "
+              f"({args.drivers / best:,.0f} wallets/s)")
+
+    await db.wallets.delete_many({})
+    client.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,125 @@
+"""Throughput scaling across uvicorn worker counts on one box.
+
+Starts `uvicorn server:app --workers N` from backend/ for each N, waits for
+/api/ready, registers a fleet owner, then drives a DB-backed endpoint from
+several load-generator processes and reports requests/s and latency.
+
+    MONGO_URL=mongodb://localhost:27017 DB_NAME=transops_bench \\
+        python benchmarks/bench_workers.py --workers 1 2 4 8 --duration 15
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'backend'
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] if ordered else 0.0
+
+
+async def drive(base_url, path, token, concurrency, duration):
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    headers = {'Authorization': f"Bearer {token}"}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=30) as http:
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                response = await http.get(path)
+                if response.status_code == 200:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors
+
+
+def load_process(args):
+    return asyncio.run(drive(*args))
+
+
+def wait_ready(base_url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{base_url}/api/ready", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("server did not become ready")
+
+
+def register_owner(base_url):
+    response = httpx.post(f"{base_url}/api/auth/register", json={
+        'email': f"bench-{uuid.uuid4().hex[:8]}@example.com",
+        'password': 'bench-password',
+        'name': 'Bench Owner',
+        'role': 'fleet_owner'
+    }, timeout=30)
+    response.raise_for_status()
+    token = response.json()['token']
+    for index in range(20):
+        httpx.post(f"{base_url}/api/vehicles", headers={'Authorization': f"Bearer {token}"}, json={
+            'registration_number': f"MH12BM{index:04d}",
+            'vehicle_type': 'truck',
+            'capacity': 10
+        }, timeout=30).raise_for_status()
+    return token
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--path', default='/api/trips')
+    parser.add_argument('--duration', type=float, default=15.0)
+    parser.add_argument('--clients', type=int, default=max(2, (os.cpu_count() or 2) // 2),
+                        help='load-generator processes')
+    parser.add_argument('--concurrency', type=int, default=32, help='in-flight requests per client process')
+    args = parser.parse_args()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    print(f"{'workers':>7} {'req/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    baseline = None
+    for workers in args.workers:
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'server:app', '--port', str(args.port),
+             '--workers', str(workers), '--log-level', 'warning'],
+            cwd=BACKEND_DIR
+        )
+        try:
+            wait_ready(base_url)
+            token = register_owner(base_url)
+            job = (base_url, args.path, token, args.concurrency, args.duration)
+            with multiprocessing.Pool(args.clients) as pool:
+                results = pool.map(load_process, [job] * args.clients)
+            latencies = [latency for chunk, _ in results for latency in chunk]
+            errors = sum(errors for _, errors in results)
+            rps = len(latencies) / args.duration
+            baseline = baseline or rps
+            print(f"{workers:>7} {rps:>10,.0f} {percentile(latencies, 50) * 1000:>8.1f} "
+                  f"{percentile(latencies, 99) * 1000:>8.1f} {errors:>7}   x{rps / baseline:.2f}")
+        finally:
+            server.send_signal(signal.SIGINT)
+            server.wait(timeout=30)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Thousands of idle /api/ws connections, then one event fanned out to all of them.
+
+Runs against a live server (one uvicorn worker, since the hub is in-process):
+
+    cd backend && uvicorn server:app --port 8001
+    python benchmarks/bench_ws_idle.py --base-url http://localhost:8001 --connections 5000
+
+Raise the open-file limit first (ulimit -n 20000) for large connection counts.
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+import httpx
+import websockets
+
+
+async def setup_fleet(http):
+    suffix = uuid.uuid4().hex[:8]
+    owner = (await http.post('/api/auth/register', json={
+        'email': f'ws_owner_{suffix}@bench.local', 'password': 'password123',
+        'name': 'WS Bench Owner', 'role': 'fleet_owner'
+    })).json()
+    driver = (await http.post('/api/auth/register', json={
+        'email': f'ws_driver_{suffix}@bench.local', 'password': 'password123',
+        'name': 'WS Bench Driver', 'role': 'driver', 'fleet_owner_id': owner['user']['id']
+    })).json()
+    headers = {'Authorization': f"Bearer {owner['token']}"}
+    vehicle = (await http.post('/api/vehicles', headers=headers, json={
+        'registration_number': f'WS-{suffix}', 'vehicle_type': 'truck'
+    })).json()
+    trip = (await http.post('/api/trips', headers=headers, json={
+        'driver_id': driver['user']['id'], 'vehicle_id': vehicle['id'],
+        'origin': 'Mumbai', 'destination': 'Pune'
+    })).json()
+    return owner['token'], trip['id']
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--base-url', default='http://localhost:8001')
+    parser.add_argument('--connections', type=int, default=2000)
+    parser.add_argument('--idle-seconds', type=float, default=10.0)
+    args = parser.parse_args()
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as http:
+        token, trip_id = await setup_fleet(http)
+        ws_url = args.base_url.replace('http', 'ws', 1) + f'/api/ws?token={token}'
+
+        start = time.perf_counter()
+        sockets = []
+        for batch_start in range(0, args.connections, 200):
+            batch = min(200, args.connections - batch_start)
+            sockets += await asyncio.gather(*(websockets.connect(ws_url, ping_interval=None) for _ in range(batch)))
+        connect_time = time.perf_counter() - start
+        print(f"connected {len(sockets)} sockets in {connect_time:.2f}s ({len(sockets) / connect_time:,.0f}/s)")
+
+        await asyncio.sleep(args.idle_seconds)
+
+        received = []
+
+        async def wait_for_event(ws):
+            await ws.recv()
+            received.append(time.perf_counter())
+
+        waiters = [asyncio.create_task(wait_for_event(ws)) for ws in sockets]
+        sent_at = time.perf_counter()
+        await http.put(f'/api/trips/{trip_id}/status', params={'status': 'in_progress'},
+                       headers={'Authorization': f'Bearer {token}'})
+        await asyncio.wait(waiters, timeout=30)
+
+        latencies = sorted(t - sent_at for t in received)
+        if latencies:
+            p50 = latencies[len(latencies) // 2]
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            print(f"event delivered to {len(latencies)}/{len(sockets)} sockets  "
+                  f"p50 {p50 * 1000:.1f} ms  p99 {p99 * 1000:.1f} ms  last {latencies[-1] * 1000:.1f} ms")
+        else:
+            print("event was not delivered to any socket")
+
+        await asyncio.gather(*(ws.close() for ws in sockets), return_exceptions=True)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
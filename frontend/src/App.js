@@ -12,11 +12,55 @@ const API = `${BACKEND_URL}/api`;
 
 export const AuthContext = React.createContext();
 
+// Requests that must not trigger a token refresh when they fail with 401
+const NO_REFRESH = /\/auth\/(login|register|refresh|logout)$/;
+
+// Concurrent 401s share one refresh request
+let refreshPromise = null;
+
+const refreshAccessToken = async () => {
+  const refreshToken = localStorage.getItem('refreshToken');
+  if (!refreshToken) {
+    throw new Error('No refresh token');
+  }
+  const response = await axios.post(`${API}/auth/refresh`, { refresh_token: refreshToken });
+  localStorage.setItem('token', response.data.token);
+  localStorage.setItem('refreshToken', response.data.refresh_token);
+  return response.data.token;
+};
+
 function App() {
   const [user, setUser] = useState(null);
   const [token, setToken] = useState(localStorage.getItem('token'));
   const [loading, setLoading] = useState(true);
 
+  useEffect(() => {
+    // Access tokens are short-lived: on a 401, refresh once and replay the request
+    const interceptor = axios.interceptors.response.use(
+      (response) => response,
+      async (error) => {
+        const original = error.config;
+        if (error.response?.status !== 401 || !original || original._retried || NO_REFRESH.test(original.url)) {
+          return Promise.reject(error);
+        }
+        original._retried = true;
+        try {
+          refreshPromise = refreshPromise || refreshAccessToken().finally(() => {
+            refreshPromise = null;
+          });
+          const newToken = await refreshPromise;
+          setToken(newToken);
+          original.headers.Authorization = `Bearer ${newToken}`;
+          return axios(original);
+        } catch (refreshError) {
+          clearSession();
+          return Promise.reject(error);
+        }
+      }
+    );
+    return () => axios.interceptors.response.eject(interceptor);
+  }, []);
+
   useEffect(() => {
     if (token) {
       fetchUser();
@@ -33,24 +77,42 @@ function App() {
       setUser(response.data);
     } catch (error) {
       console.error('Failed to fetch user:', error);
-      logout();
+      clearSession();
     } finally {
       setLoading(false);
     }
   };
 
-  const login = (newToken, userData) => {
+  const login = (newToken, userData, newRefreshToken) => {
     localStorage.setItem('token', newToken);
+    localStorage.setItem('refreshToken', newRefreshToken);
     setToken(newToken);
     setUser(userData);
   };
 
-  const logout = () => {
+  const clearSession = () => {
     localStorage.removeItem('token');
+    localStorage.removeItem('refreshToken');
     setToken(null);
     setUser(null);
   };
 
+  const logout = async () => {
+    const currentToken = localStorage.getItem('token');
+    if (currentToken) {
+      try {
+        await axios.post(
+          `${API}/auth/logout`,
+          { refresh_token: localStorage.getItem('refreshToken') },
+          { headers: { Authorization: `Bearer ${currentToken}` } }
+        );
+      } catch (error) {
+        console.error('Failed to revoke session:', error);
+      }
+    }
+    clearSession();
+  };
+
   if (loading) {
     return (
       <div className="flex items-center justify-center min-h-screen">
@@ -56,25 +56,13 @@ const DriverDashboard = () => {
   const fetchDashboardData = async () => {
     try {
       setLoading(true);
-      const [statsRes, walletRes, tripsRes, expensesRes] = await Promise.all([
-        axios.get(`${API}/dashboard/stats`, axiosConfig),
-        axios.get(`${API}/wallet`, axiosConfig),
-        axios.get(`${API}/trips`, axiosConfig),
-        axios.get(`${API}/expenses`, axiosConfig)
-      ]);
+      const { data } = await axios.get(`${API}/dashboard/bootstrap`, axiosConfig);
 
-      setStats(statsRes.data);
-      setWallet(walletRes.data);
-      setTrips(tripsRes.data);
-      setExpenses(expensesRes.data);
-
-      // Fetch performance
-      try {
-        const perfRes = await axios.get(`${API}/performance/${user.id}`, axiosConfig);
-        setPerformance(perfRes.data);
-      } catch (error) {
-        console.log('Performance data not available');
-      }
+      setStats(data.stats);
+      setWallet(data.wallet);
+      setTrips(data.trips);
+      setExpenses(data.expenses);
+      setPerformance(data.performance);
     } catch (error) {
       toast.error('Failed to fetch dashboard data');
     } finally {
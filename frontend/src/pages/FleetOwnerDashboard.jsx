@@ -86,21 +86,14 @@ const FleetOwnerDashboard = () => {
   const fetchDashboardData = async () => {
     try {
       setLoading(true);
-      const [statsRes, tripsRes, driversRes, vehiclesRes, expensesRes, loadsRes] = await Promise.all([
-        axios.get(`${API}/dashboard/stats`, axiosConfig),
-        axios.get(`${API}/trips`, axiosConfig),
-        axios.get(`${API}/drivers`, axiosConfig),
-        axios.get(`${API}/vehicles`, axiosConfig),
-        axios.get(`${API}/expenses`, axiosConfig),
-        axios.get(`${API}/return-loads`, axiosConfig)
-      ]);
-
-      setStats(statsRes.data);
-      setTrips(tripsRes.data);
-      setDrivers(driversRes.data);
-      setVehicles(vehiclesRes.data);
-      setExpenses(expensesRes.data);
-      setReturnLoads(loadsRes.data);
+      const { data } = await axios.get(`${API}/dashboard/bootstrap`, axiosConfig);
+
+      setStats(data.stats);
+      setTrips(data.trips);
+      setDrivers(data.drivers);
+      setVehicles(data.vehicles);
+      setExpenses(data.expenses);
+      setReturnLoads(data.return_loads);
     } catch (error) {
       toast.error('Failed to fetch dashboard data');
     } finally {
@@ -29,7 +29,7 @@ const LandingPage = () => {
     setLoading(true);
     try {
       const response = await axios.post(`${API}/auth/login`, loginData);
-      login(response.data.token, response.data.user);
+      login(response.data.token, response.data.user, response.data.refresh_token);
       toast.success('Login successful!');
     } catch (error) {
       toast.error(error.response?.data?.detail || 'Login failed');
@@ -43,7 +43,7 @@ const LandingPage = () => {
     setLoading(true);
     try {
       const response = await axios.post(`${API}/auth/register`, registerData);
-      login(response.data.token, response.data.user);
+      login(response.data.token, response.data.user, response.data.refresh_token);
       toast.success('Registration successful!');
     } catch (error) {
       toast.error(error.response?.data?.detail || 'Registration failed');
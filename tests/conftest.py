@@ -0,0 +1,125 @@
+import os
+import sys
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+# Backend modules are imported the same way uvicorn loads them, from backend/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+
+def iso(document):
+    for field in ('created_at', 'updated_at', 'started_at', 'completed_at'):
+        if isinstance(document.get(field), datetime):
+            document[field] = document[field].isoformat()
+    return document
+
+
+class Api:
+    """The app behind a TestClient, plus direct database access for seeding and checking state.
+
+    mongomock has no replica set, so this is the standalone-mongod path: run_transaction runs
+    its callbacks without a session.
+    """
+
+    def __init__(self, server, client):
+        self.server = server
+        self.client = client
+
+    @property
+    def db(self):
+        return self.server.mongo.db
+
+    def run(self, awaitable):
+        # Motor calls have to run on the app's event loop
+        async def wait():
+            return await awaitable
+        return self.client.portal.call(wait)
+
+    def call(self, method, url, user=None, **kwargs):
+        headers = {**kwargs.pop('headers', {}), **(user['headers'] if user else {})}
+        return self.client.request(method, f"/api{url}", headers=headers, **kwargs)
+
+    def user(self, role='fleet_owner', fleet_owner_id=None, **wallet):
+        server = self.server
+        user = server.User(email=f"{uuid.uuid4().hex[:12]}@test.local", name=role, role=role, fleet_owner_id=fleet_owner_id)
+        self.run(self.db.users.insert_one({**iso(user.model_dump()), 'password': 'unused'}))
+        if role == 'driver':
+            wallet.setdefault('balance', 0.0)
+            self.run(self.db.wallets.insert_one(iso(server.Wallet(driver_id=user.id, **wallet).model_dump())))
+            self.run(self.db.driver_performance.insert_one(iso(server.DriverPerformance(driver_id=user.id).model_dump())))
+        return {**user.model_dump(), 'headers': {'Authorization': f"Bearer {server.create_token(user.model_dump())}"}}
+
+    def pool(self, owner, balance):
+        pool = self.server.FundingPool(fleet_owner_id=owner['id'], balance=balance)
+        self.run(self.db.funding_pools.insert_one(iso(pool.model_dump())))
+
+    def vehicle(self, owner, **fields):
+        vehicle = self.server.Vehicle(
+            fleet_owner_id=owner['id'], registration_number=uuid.uuid4().hex[:8], vehicle_type='truck', **fields
+        )
+        self.run(self.db.vehicles.insert_one(iso(vehicle.model_dump())))
+        return vehicle.model_dump()
+
+    def trip(self, owner, driver=None, vehicle=None, **fields):
+        fields.setdefault('status', 'in_progress')
+        trip = self.server.Trip(
+            fleet_owner_id=owner['id'],
+            driver_id=driver['id'] if driver else None,
+            vehicle_id=vehicle['id'] if vehicle else None,
+            origin='Pune',
+            destination='Mumbai',
+            **fields
+        )
+        self.run(self.db.trips.insert_one(iso(trip.model_dump())))
+        return trip.model_dump()
+
+    def find(self, collection, query, **kwargs):
+        return self.run(self.db[collection].find(query, {'_id': 0}, **kwargs).to_list(None))
+
+    def find_one(self, collection, query):
+        return self.run(self.db[collection].find_one(query, {'_id': 0}))
+
+
+def find_by_id(find_and_modify):
+    """mongomock re-reads the returned document with the caller's filter unless it kept the _id,
+    so a projection without _id made every find_one_and_update that changes a filtered field
+    come back as None. Fetch with the _id and drop it afterwards instead."""
+
+    def wrapper(self, query, projection=None, *args, **kwargs):
+        hide_id = isinstance(projection, dict) and not projection.get('_id', True)
+        if hide_id:
+            projection = {field: value for field, value in projection.items() if field != '_id'} or None
+        document = find_and_modify(self, query, projection, *args, **kwargs)
+        if hide_id and document:
+            document.pop('_id', None)
+        return document
+    return wrapper
+
+
+@pytest.fixture
+def api(monkeypatch):
+    mongomock_motor = pytest.importorskip('mongomock_motor')
+    from fastapi.testclient import TestClient
+    from mongomock.collection import Collection
+
+    monkeypatch.setenv('MONGO_URL', os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    monkeypatch.setenv('DB_NAME', os.environ.get('DB_NAME', 'transops_test'))
+    import server
+
+    def connect():
+        server.mongo.client = mongomock_motor.AsyncMongoMockClient()
+        server.mongo.db = server.mongo.client[server.mongo.db_name]
+        server.mongo.pid = os.getpid()
+
+    async def create_indexes():
+        # mongomock has no time-series or capped collections
+        pass
+
+    monkeypatch.setattr(Collection, '_find_and_modify', find_by_id(Collection._find_and_modify))
+    monkeypatch.setattr(server.mongo, 'connect', connect)
+    monkeypatch.setattr(server, 'create_indexes', create_indexes)
+    with TestClient(server.app) as client:
+        yield Api(server, client)
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected, InMemoryLimiterBackend, RouteClass
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_bucket_allows_a_burst_then_refills_at_the_rate():
+    clock = FakeClock()
+    backend = InMemoryLimiterBackend(clock=clock)
+
+    async def scenario():
+        waits = [await backend.take('ai:u1', rate=0.5, burst=3) for _ in range(4)]
+        assert waits[:3] == [0.0, 0.0, 0.0]
+        assert waits[3] == pytest.approx(2.0)
+        clock.now = 2.0
+        assert await backend.take('ai:u1', rate=0.5, burst=3) == 0.0
+        # Other callers have their own bucket
+        assert await backend.take('ai:u2', rate=0.5, burst=3) == 0.0
+
+    asyncio.run(scenario())
+
+
+def test_bucket_store_is_bounded():
+    backend = InMemoryLimiterBackend(max_keys=2)
+
+    async def scenario():
+        for caller in ('a', 'b', 'c'):
+            await backend.take(caller, rate=1.0, burst=1)
+
+    asyncio.run(scenario())
+    assert backend.stats()['buckets'] == 2
+    assert backend.stats()['evictions'] == 1
+
+
+def test_rate_rejection_reports_retry_after():
+    clock = FakeClock()
+    controller = AdmissionController(InMemoryLimiterBackend(clock=clock), {
+        'auth': RouteClass(rate=10 / 60, burst=2, concurrency=5)
+    })
+
+    async def scenario():
+        for _ in range(2):
+            async with controller.admit('auth', 'ip:1.2.3.4'):
+                pass
+        with pytest.raises(AdmissionRejected) as rejected:
+            async with controller.admit('auth', 'ip:1.2.3.4'):
+                pass
+        assert rejected.value.reason == 'rate'
+        assert rejected.value.retry_after == pytest.approx(6.0)
+
+    asyncio.run(scenario())
+    stats = controller.stats()['classes']['auth']
+    assert (stats['admitted'], stats['rate']) == (2, 1)
+    assert controller.stats()['backend']['callers_in_flight'] == 0
+
+
+def test_concurrency_caps_per_caller_and_per_class():
+    controller = AdmissionController(InMemoryLimiterBackend(), {
+        'ai': RouteClass(rate=100.0, burst=100, concurrency=1, max_inflight=2)
+    })
+
+    async def scenario():
+        async with controller.admit('ai', 'user:a'):
+            with pytest.raises(AdmissionRejected) as same_caller:
+                async with controller.admit('ai', 'user:a'):
+                    pass
+            assert same_caller.value.reason == 'concurrency'
+            async with controller.admit('ai', 'user:b'):
+                with pytest.raises(AdmissionRejected) as whole_class:
+                    async with controller.admit('ai', 'user:c'):
+                        pass
+                assert whole_class.value.reason == 'class_concurrency'
+        # Slots are released once the requests finish, including on errors
+        with pytest.raises(ValueError):
+            async with controller.admit('ai', 'user:a'):
+                raise ValueError
+        async with controller.admit('ai', 'user:a'):
+            pass
+
+    asyncio.run(scenario())
+    assert controller.stats()['classes']['ai']['in_flight'] == 0
@@ -0,0 +1,109 @@
+import asyncio
+import math
+import random
+import statistics
+
+from anomaly import AnomalyScorer, RunningStats
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return self.docs
+
+
+class FakeCollection:
+    def __init__(self, docs=(), fail=False):
+        self.docs = list(docs)
+        self.fail = fail
+        self.bulk = []
+
+    async def bulk_write(self, ops, ordered=True):
+        if self.fail:
+            raise RuntimeError("write failed")
+        self.bulk.extend(ops)
+
+    def find(self, query):
+        return FakeCursor(self.docs)
+
+
+def test_merged_stats_match_a_single_pass():
+    rng = random.Random(1)
+    values = [rng.gauss(5, 2) for _ in range(200)]
+    left, right, whole = RunningStats(), RunningStats(), RunningStats()
+    for value in values[:70]:
+        left.add(value)
+    for value in values[70:]:
+        right.add(value)
+    for value in values:
+        whole.add(value)
+    merged = left.merged(right)
+    assert merged.count == 200
+    assert math.isclose(merged.mean, statistics.mean(values))
+    assert math.isclose(merged.std, statistics.stdev(values))
+    assert math.isclose(merged.m2, whole.m2)
+
+
+def record(scorer, keys, amount):
+    # What create_expense does once the wallet debit has gone through
+    anomaly = scorer.check(keys, amount)
+    scorer.settle(keys, amount, anomaly)
+    return anomaly
+
+
+def test_outliers_are_flagged_and_kept_out_of_the_statistics():
+    scorer = AnomalyScorer(threshold=3.5, min_samples=10)
+    keys = ['driver:d1:fuel', 'lane:pune>mumbai:fuel']
+    rng = random.Random(2)
+    for _ in range(50):
+        assert record(scorer, keys, rng.uniform(2000, 3000)) is None
+
+    anomaly = record(scorer, keys, 40000)
+    assert anomaly['score'] >= 3.5
+    assert anomaly['key'] in keys
+    assert scorer.stats_for(keys[0]).count == 50
+    assert scorer.stats()['flagged'] == 1
+
+
+def test_checked_amounts_only_join_the_statistics_once_settled():
+    scorer = AnomalyScorer(min_samples=10)
+    keys = ['driver:d1:toll']
+    assert scorer.check(keys, 250) is None
+    assert scorer.stats_for(keys[0]).count == 0
+
+    scorer.settle(keys, 250, None)
+    assert scorer.stats_for(keys[0]).count == 1
+
+
+def test_amounts_that_were_never_recorded_leave_no_trace():
+    # A debit refused for the limit or balance is checked but never settled
+    scorer = AnomalyScorer(min_samples=1)
+    keys = ['driver:d1:repair']
+    record(scorer, keys, 3000)
+    for _ in range(5):
+        scorer.check(keys, 3000)
+    assert scorer.stats_for(keys[0]).count == 1
+    assert scorer.stats()['flagged'] == 0
+
+
+def test_new_keys_are_not_scored_until_they_have_history():
+    scorer = AnomalyScorer(min_samples=10)
+    for amount in (100, 100000, 5):
+        assert record(scorer, ['driver:new:toll'], amount) is None
+    assert scorer.stats_for('driver:new:toll').count == 3
+
+
+def test_flush_reloads_shared_stats_and_retains_observations_on_failure():
+    scorer = AnomalyScorer()
+    scorer.observe(['driver:d1:food'], 300)
+
+    asyncio.run(scorer.flush(FakeCollection(fail=True)))
+    assert scorer.stats()['unflushed_keys'] == 1
+
+    shared = FakeCollection([{'_id': 'driver:d1:food', 'count': 40, 'mean': 5.7, 'm2': 3.2}])
+    asyncio.run(scorer.flush(shared))
+    assert len(shared.bulk) == 1
+    assert scorer.stats()['unflushed_keys'] == 0
+    assert scorer.stats_for('driver:d1:food').count == 40
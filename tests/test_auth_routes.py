@@ -0,0 +1,38 @@
+from admission import AdmissionController, InMemoryLimiterBackend, RouteClass
+
+
+def tight_admission(api, monkeypatch):
+    controller = AdmissionController(InMemoryLimiterBackend(), {
+        'auth': RouteClass(rate=1 / 60, burst=2, concurrency=2),
+        'auth_address': RouteClass(rate=1 / 60, burst=5, concurrency=4)
+    })
+    monkeypatch.setattr(api.server, 'admission', controller)
+    return controller
+
+
+def login(api, email):
+    return api.call('POST', '/auth/login', json={'email': email, 'password': 'guess'})
+
+
+def test_a_new_email_per_request_does_not_reset_the_address_budget(api, monkeypatch):
+    controller = tight_admission(api, monkeypatch)
+
+    statuses = [login(api, f"user{n}@test.local").status_code for n in range(8)]
+
+    assert statuses == [401] * 5 + [429] * 3
+    assert int(login(api, 'another@test.local').headers['Retry-After']) > 0
+    stats = controller.stats()['classes']
+    assert (stats['auth_address']['admitted'], stats['auth_address']['rate']) == (5, 4)
+    assert stats['auth']['rate'] == 0
+
+
+def test_repeated_guesses_at_one_email_hit_the_tighter_bucket(api, monkeypatch):
+    controller = tight_admission(api, monkeypatch)
+
+    statuses = [login(api, 'Target@test.local ').status_code for _ in range(3)]
+    statuses += [login(api, 'target@test.local').status_code]
+
+    assert statuses == [401, 401, 429, 429]
+    assert controller.stats()['classes']['auth']['rate'] == 2
+    # A different account from the same address still has room in the address budget
+    assert login(api, 'someone-else@test.local').status_code == 401
@@ -0,0 +1,93 @@
+import asyncio
+
+from cache import InMemoryCacheBackend, ReadCache
+
+
+def test_read_through_and_hit_rate():
+    cache = ReadCache(InMemoryCacheBackend())
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        return [{'id': 'v1'}]
+
+    async def run():
+        first = await cache.get_or_load('vehicles', 'owner-1', loader)
+        second = await cache.get_or_load('vehicles', 'owner-1', loader)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == second == [{'id': 'v1'}]
+    assert len(loads) == 1
+    assert cache.stats()['namespaces']['vehicles']['hit_rate'] == 0.5
+
+
+def test_invalidate_forces_reload():
+    cache = ReadCache(InMemoryCacheBackend())
+    version = {'n': 0}
+
+    async def loader():
+        version['n'] += 1
+        return [version['n']]
+
+    async def run():
+        await cache.get_or_load('drivers', 'owner-1', loader)
+        await cache.invalidate('drivers', 'owner-1')
+        return await cache.get_or_load('drivers', 'owner-1', loader)
+
+    assert asyncio.run(run()) == [2]
+
+
+def test_lru_eviction_by_entry_count():
+    backend = InMemoryCacheBackend(max_entries=2)
+
+    async def run():
+        await backend.set('a', [1])
+        await backend.set('b', [2])
+        await backend.get('a')
+        await backend.set('c', [3])
+        return await backend.get('a'), await backend.get('b'), await backend.get('c')
+
+    assert asyncio.run(run()) == ([1], None, [3])
+    assert backend.stats()['evictions'] == 1
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_size_bound_and_ttl():
+    clock = FakeClock()
+    backend = InMemoryCacheBackend(max_bytes=10, ttl_seconds=60, clock=clock)
+
+    async def run():
+        await backend.set('big', ['x' * 100])
+        await backend.set('small', [1])
+        fresh = await backend.get('big'), await backend.get('small')
+        clock.now = 60.0
+        return fresh, await backend.get('small')
+
+    assert asyncio.run(run()) == ((None, [1]), None)
+    assert backend.stats()['bytes'] == 0
+
+
+def test_invalidation_during_a_load_is_not_overwritten_and_nothing_is_retained():
+    cache = ReadCache(InMemoryCacheBackend())
+
+    async def run():
+        async def loader():
+            await cache.invalidate('trips', 'owner-1')
+            return ['stale']
+
+        assert await cache.get_or_load('trips', 'owner-1', loader) == ['stale']
+        assert await cache.backend.get('trips:owner-1') is None
+        for n in range(100):
+            await cache.get_or_load('trips', f"owner-{n}", lambda: asyncio.sleep(0, result=[n]))
+            await cache.invalidate('trips', f"owner-{n}")
+
+    asyncio.run(run())
+    assert cache._generations == {} and cache._loading == {}
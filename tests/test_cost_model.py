@@ -0,0 +1,60 @@
+import random
+
+import numpy as np
+
+from cost_model import CostModel, featurize
+
+
+def make_trips(count, seed=3):
+    rng = random.Random(seed)
+    rates = {'truck': 4.0, 'van': 2.0}
+    lanes = [('Mumbai', 'Pune', 150), ('Delhi', 'Jaipur', 280), ('Chennai', 'Bengaluru', 350)]
+    trips = []
+    for _ in range(count):
+        origin, destination, distance = rng.choice(lanes)
+        vehicle_type = rng.choice(list(rates))
+        cargo = rng.uniform(1, 10)
+        trips.append({
+            'origin': origin,
+            'destination': destination,
+            'vehicle_type': vehicle_type,
+            'estimated_distance': distance,
+            'cargo_weight': cargo,
+            'total_expenses': distance * rates[vehicle_type] + 30 * cargo
+        })
+    return trips
+
+
+def test_fit_learns_lane_and_vehicle_costs():
+    trips = make_trips(400)
+    model = CostModel.fit(trips, [t['total_expenses'] for t in trips], l2=0.01)
+    for trip in make_trips(50, seed=9):
+        assert abs(model.predict(trip) - trip['total_expenses']) < 0.05 * trip['total_expenses']
+    assert model.metadata['samples'] == 400
+
+
+def test_predict_matches_vectorized_path():
+    trips = make_trips(200)
+    model = CostModel.fit(trips, [t['total_expenses'] for t in trips])
+    unseen = [{'origin': 'Kochi', 'destination': 'Goa', 'vehicle_type': None, 'estimated_distance': None}]
+    batch = make_trips(20, seed=5) + unseen
+    single = [model.predict(t) for t in batch]
+    assert np.allclose(single, model.predict_many(batch), atol=0.01)
+    assert featurize(batch).shape[0] == len(batch)
+
+
+def test_save_and_load_round_trip(tmp_path):
+    trips = make_trips(100)
+    model = CostModel.fit(trips, [t['total_expenses'] for t in trips])
+    path = tmp_path / 'models' / 'cost.npz'
+    model.save(path)
+    loaded = CostModel.load(path)
+    assert loaded.metadata == model.metadata
+    assert loaded.predict(trips[0]) == model.predict(trips[0])
+    assert CostModel.load(tmp_path / 'missing.npz') is None
+
+
+def test_training_features_ignore_actual_distance():
+    # create_trip only knows the estimate, so the model must not learn from the recorded distance
+    trip = make_trips(1)[0]
+    assert np.array_equal(featurize([trip]), featurize([{**trip, 'actual_distance': 900.0}]))
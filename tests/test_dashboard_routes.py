@@ -0,0 +1,41 @@
+def projected_fields(api, name):
+    return {field for field, value in api.server.DASHBOARD_PROJECTIONS[name].items() if value and field != '_id'}
+
+
+def test_owner_bootstrap_carries_the_dashboard_in_one_response(api):
+    owner, other_owner = api.user(), api.user()
+    driver = api.user('driver', owner['id'], balance=1000, fuel_limit=1000)
+    vehicle = api.vehicle(owner, status='in_use')
+    trip = api.trip(owner, driver, vehicle)
+    api.trip(other_owner)
+    api.call('POST', '/expenses', driver, json={'trip_id': trip['id'], 'driver_id': driver['id'], 'category': 'fuel', 'amount': 300})
+
+    bootstrap = api.call('GET', '/dashboard/bootstrap', owner).json()
+
+    assert set(bootstrap) == {'stats', 'trips', 'drivers', 'vehicles', 'expenses', 'return_loads'}
+    assert bootstrap['stats'] == api.call('GET', '/dashboard/stats', owner).json()
+    assert bootstrap['stats']['total_expenses'] == 300
+    assert [t['id'] for t in bootstrap['trips']] == [trip['id']]
+    assert [d['id'] for d in bootstrap['drivers']] == [driver['id']]
+    assert [v['id'] for v in bootstrap['vehicles']] == [vehicle['id']]
+    assert [e['amount'] for e in bootstrap['expenses']] == [300]
+    for name in ('trips', 'drivers', 'vehicles', 'expenses'):
+        for item in bootstrap[name]:
+            assert set(item) <= projected_fields(api, name), name
+
+
+def test_driver_bootstrap_carries_their_wallet_and_performance(api):
+    owner = api.user()
+    driver = api.user('driver', owner['id'], balance=750, toll_limit=400)
+    trip = api.trip(owner, driver)
+
+    bootstrap = api.call('GET', '/dashboard/bootstrap', driver).json()
+
+    assert set(bootstrap) == {'stats', 'wallet', 'trips', 'expenses', 'performance'}
+    assert bootstrap['stats'] == api.call('GET', '/dashboard/stats', driver).json()
+    assert bootstrap['stats']['wallet_balance'] == 750
+    assert set(bootstrap['wallet']) == projected_fields(api, 'wallet')
+    assert bootstrap['wallet']['toll_limit'] == 400
+    assert set(bootstrap['performance']) == projected_fields(api, 'performance')
+    assert [t['id'] for t in bootstrap['trips']] == [trip['id']]
+    assert bootstrap['expenses'] == []
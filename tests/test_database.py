@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from database import MongoResources, bind, client_options
+
+
+def test_client_options_from_environment():
+    options = client_options({
+        'MONGO_MAX_POOL_SIZE': '20',
+        'MONGO_COMPRESSORS': 'zstd,zlib',
+        'MONGO_SOCKET_TIMEOUT_MS': '30000'
+    })
+    assert options['maxPoolSize'] == 20
+    assert options['compressors'] == 'zstd,zlib'
+    assert options['socketTimeoutMS'] == 30000
+    assert 'compressors' not in client_options({})
+
+
+def test_proxies_resolve_only_after_connect():
+    resources = MongoResources('mongodb://127.0.0.1:1', 'transops_test', {'serverSelectionTimeoutMS': 100})
+    _, db = bind(resources)
+    with pytest.raises(RuntimeError):
+        db.trips
+
+    resources.connect()
+    try:
+        assert db.trips.name == 'trips'
+        assert asyncio.run(resources.ping(timeout=1.0)) is False
+    finally:
+        resources.close()
+    with pytest.raises(RuntimeError):
+        db.trips
+
+
+class FakeAdmin:
+    def __init__(self, reply):
+        self.reply = reply
+
+    async def command(self, name):
+        if isinstance(self.reply, Exception):
+            raise self.reply
+        return self.reply
+
+
+def test_transactions_need_a_replica_set_or_mongos():
+    resources = MongoResources('mongodb://127.0.0.1:1', 'transops_test')
+    replies = [
+        ({'isWritablePrimary': True, 'setName': 'rs0'}, True),
+        ({'isWritablePrimary': True, 'msg': 'isdbgrid'}, True),
+        ({'isWritablePrimary': True}, False),
+        (RuntimeError("no server"), False)
+    ]
+    for reply, expected in replies:
+        resources.client = type('FakeClient', (), {'admin': FakeAdmin(reply)})()
+        assert asyncio.run(resources.supports_transactions()) is expected
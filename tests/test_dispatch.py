@@ -0,0 +1,55 @@
+import itertools
+
+import numpy as np
+
+from dispatch import INFEASIBLE, linear_sum_assignment, suggest_assignments, vehicle_cost_matrix
+
+
+def brute_force_cost(cost):
+    rows, cols = cost.shape
+    if rows <= cols:
+        return min(sum(cost[r, c] for r, c in zip(range(rows), perm))
+                   for perm in itertools.permutations(range(cols), rows))
+    return brute_force_cost(cost.T)
+
+
+def test_assignment_is_optimal_on_small_matrices():
+    rng = np.random.default_rng(7)
+    for shape in [(3, 3), (4, 6), (6, 4), (5, 5)]:
+        for _ in range(10):
+            cost = rng.random(shape) * 100
+            rows, cols = linear_sum_assignment(cost)
+            assert len(rows) == min(shape)
+            assert len(set(cols.tolist())) == len(cols)
+            assert abs(cost[rows, cols].sum() - brute_force_cost(cost)) < 1e-6
+
+
+def test_vehicle_costs_reject_overweight_and_wrong_type():
+    trips = [{'cargo_weight': 12, 'vehicle_type': 'truck'}, {'cargo_weight': None, 'vehicle_type': None}]
+    vehicles = [{'capacity': 10, 'vehicle_type': 'truck'}, {'capacity': 20, 'vehicle_type': 'truck'},
+                {'capacity': 20, 'vehicle_type': 'van'}]
+
+    cost = vehicle_cost_matrix(trips, vehicles)
+
+    assert cost[0, 0] == INFEASIBLE
+    assert cost[0, 1] == 0.4
+    assert cost[0, 2] == INFEASIBLE
+    assert cost[1].tolist() == [0.5, 0.5, 0.5]
+
+
+def test_best_driver_goes_to_longest_trip():
+    trips = [
+        {'id': 't-short', 'estimated_distance': 50, 'cargo_weight': 5},
+        {'id': 't-long', 'estimated_distance': 900, 'cargo_weight': 5},
+        {'id': 't-heavy', 'estimated_distance': 100, 'cargo_weight': 500},
+    ]
+    vehicles = [{'id': 'v1', 'capacity': 10}, {'id': 'v2', 'capacity': 10}]
+    drivers = [{'id': 'd-new'}, {'id': 'd-safe'}]
+    performances = [{'safety_score': 60, 'total_trips': 1}, {'safety_score': 99, 'total_trips': 80}]
+
+    plan = suggest_assignments(trips, vehicles, drivers, performances)
+
+    by_trip = {a['trip_id']: a for a in plan['assignments']}
+    assert by_trip['t-long']['driver_id'] == 'd-safe'
+    assert by_trip['t-short']['driver_id'] == 'd-new'
+    assert plan['unassigned'] == [{'trip_id': 't-heavy', 'reason': 'no_suitable_vehicle'}]
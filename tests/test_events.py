@@ -0,0 +1,32 @@
+from events import EventHub
+
+
+def test_publish_reaches_only_topic_subscribers():
+    hub = EventHub()
+    fleet = hub.subscribe('fleet:a')
+    other = hub.subscribe('fleet:b')
+
+    hub.publish('fleet:a', {'type': 'trip.status'})
+
+    assert fleet.queue.get_nowait() == {'type': 'trip.status'}
+    assert other.queue.empty()
+
+
+def test_slow_subscriber_overflows_without_blocking():
+    hub = EventHub(max_queue=2)
+    slow = hub.subscribe('fleet:a')
+
+    for n in range(5):
+        hub.publish('fleet:a', {'n': n})
+
+    assert slow.overflowed
+    assert slow.queue.qsize() == 2
+    assert hub.stats()['dropped_subscriptions'] == 1
+
+
+def test_unsubscribe_removes_empty_topics():
+    hub = EventHub()
+    subscription = hub.subscribe('fleet:a', 'driver:d')
+    hub.unsubscribe(subscription)
+
+    assert hub.stats()['topics'] == 0
@@ -0,0 +1,150 @@
+from datetime import date, datetime, timedelta, timezone
+
+
+def evaluate(expr, doc):
+    """Just enough of the aggregation expression language to run expense_rollup_pipeline
+    past the stages mongomock supports ($dateTrunc, $substrBytes and $merge are missing)."""
+    if isinstance(expr, str) and expr.startswith('$'):
+        value = doc
+        for part in expr[1:].split('.'):
+            # A path through an array, like $trip.vehicle_id after the $lookup, maps over it
+            if isinstance(value, list):
+                value = [item.get(part) for item in value if isinstance(item, dict)]
+            else:
+                value = value.get(part) if isinstance(value, dict) else None
+        return value
+    if isinstance(expr, list):
+        return [evaluate(item, doc) for item in expr]
+    if not isinstance(expr, dict):
+        return expr
+    if len(expr) != 1 or not next(iter(expr)).startswith('$'):
+        return {key: evaluate(value, doc) for key, value in expr.items()}
+    op, arg = next(iter(expr.items()))
+    if op == '$literal':
+        return arg
+    if op == '$ifNull':
+        value = evaluate(arg[0], doc)
+        return evaluate(arg[1], doc) if value is None else value
+    args = evaluate(arg, doc)
+    if op == '$substrBytes':
+        text, start, length = args
+        return text[start:start + length]
+    if op == '$first':
+        return args[0] if args else None
+    if op == '$concat':
+        return ''.join(args)
+    if op == '$dateFromString':
+        assert args['format'] == '%Y-%m-%d'
+        return date.fromisoformat(args['dateString'])
+    if op == '$dateToString':
+        return args['date'].strftime(args['format'])
+    if op == '$dateTrunc':
+        day = args['date']
+        if args['unit'] == 'week':
+            assert args['startOfWeek'] == 'monday'
+            return day - timedelta(days=day.weekday())
+        if args['unit'] == 'month':
+            return day.replace(day=1)
+        return day
+    raise NotImplementedError(op)
+
+
+def rebuild(api, fleet_owner_id):
+    """What POST /analytics/rollups/rebuild would write: mongomock runs the $match and $lookup,
+    the rest of the pipeline is evaluated here."""
+    trip_ids = [trip['id'] for trip in api.find('trips', {'fleet_owner_id': fleet_owner_id})]
+    pipeline = api.server.expense_rollup_pipeline(fleet_owner_id, trip_ids)
+    assert pipeline[-1]['$merge']['into'] == 'expense_rollups'
+    docs = api.run(api.db.expenses.aggregate(pipeline[:2]).to_list(None))
+    for stage in pipeline[2:-1]:
+        (name, spec), = stage.items()
+        if name == '$set':
+            docs = [{**doc, **{key: evaluate(value, doc) for key, value in spec.items()}} for doc in docs]
+        elif name == '$unwind':
+            field = spec[1:]
+            docs = [{**doc, field: item} for doc in docs for item in doc[field]]
+        elif name == '$group':
+            groups = {}
+            for doc in docs:
+                group_id = evaluate(spec['_id'], doc)
+                group = groups.setdefault(tuple(sorted(group_id.items())), {'_id': group_id, 'total': 0, 'count': 0})
+                for field in ('total', 'count'):
+                    group[field] += evaluate(spec[field]['$sum'], doc)
+            docs = list(groups.values())
+        elif name == '$project':
+            docs = [
+                {field: doc[field] if value == 1 else evaluate(value, doc) for field, value in spec.items()}
+                for doc in docs
+            ]
+        else:
+            raise NotImplementedError(name)
+    return {doc['_id']: doc for doc in docs}
+
+
+def expense(api, driver, trip, category, amount):
+    return api.call('POST', '/expenses', driver, json={
+        'trip_id': trip['id'], 'driver_id': driver['id'], 'category': category, 'amount': amount
+    })
+
+
+def test_rollup_increments_match_a_full_rebuild(api):
+    owner = api.user()
+    driver = api.user('driver', owner['id'], balance=10000, fuel_limit=5000, toll_limit=5000, food_limit=5000)
+    vehicle = api.vehicle(owner, status='in_use')
+    on_road = api.trip(owner, driver, vehicle)
+    unassigned = api.trip(owner, status='planned')
+
+    for trip, category, amount in [(on_road, 'fuel', 1200), (on_road, 'toll', 300), (unassigned, 'food', 250)]:
+        response = expense(api, driver, trip, category, amount)
+        assert response.status_code == 200, response.text
+
+    # Flagged expenses only reach the rollups once approved, and on the day they were spent
+    spent_at = (datetime.now(timezone.utc) - timedelta(days=40)).isoformat()
+    held = [
+        api.server.Expense(trip_id=on_road['id'], driver_id=driver['id'], category='fuel', amount=amount, status='pending')
+        for amount in (900, 4000)
+    ]
+    api.run(api.db.expenses.insert_many([{**flagged.model_dump(), 'created_at': spent_at} for flagged in held]))
+    api.run(api.db.trips.update_one({'id': on_road['id']}, {'$inc': {'pending_expenses': len(held)}}))
+    for flagged, decision in zip(held, ('approve', 'reject')):
+        response = api.call('PUT', f"/expenses/{flagged.id}/review", owner, json={'decision': decision})
+        assert response.status_code == 200, response.text
+
+    incremental = {doc['_id']: doc for doc in api.run(api.db.expense_rollups.find({'fleet_owner_id': owner['id']}).to_list(None))}
+    rebuilt = rebuild(api, owner['id'])
+
+    assert incremental == rebuilt
+    totals = {doc['bucket']: doc['total'] for doc in rebuilt.values() if doc['granularity'] == 'day' and doc['dimension'] == 'total'}
+    assert sorted(totals.values()) == [900, 1750]
+    assert rebuilt[f"{owner['id']}:month:vehicle:unknown:{date.today().replace(day=1).isoformat()}"]['total'] == 250
+
+
+def test_spend_limits_accumulate_within_a_period_and_reset_across_periods(api):
+    owner = api.user()
+    last_month = (datetime.now(timezone.utc).replace(day=1) - timedelta(days=1)).strftime('%Y-%m')
+    driver = api.user(
+        'driver', owner['id'], balance=10000, fuel_limit=1000, toll_limit=500,
+        limit_periods={'fuel': 'monthly', 'toll': 'trip'},
+        spend={'fuel': {'period': f"month:{last_month}", 'amount': 900}}
+    )
+    first, second = api.trip(owner, driver), api.trip(owner, driver)
+
+    # Last month's 900 no longer counts against this month's limit
+    assert expense(api, driver, first, 'fuel', 600).status_code == 200
+    rejected = expense(api, driver, second, 'fuel', 500)
+    assert rejected.status_code == 400
+    assert rejected.json()['detail'] == "Expense exceeds fuel limit"
+    assert expense(api, driver, second, 'fuel', 400).status_code == 200
+
+    # A trip limit counts per trip
+    assert expense(api, driver, first, 'toll', 300).status_code == 200
+    assert expense(api, driver, first, 'toll', 300).status_code == 400
+    assert expense(api, driver, second, 'toll', 300).status_code == 200
+
+    wallet = api.find_one('wallets', {'driver_id': driver['id']})
+    assert wallet['balance'] == 10000 - 600 - 400 - 300 - 300
+    assert wallet['spend']['fuel'] == {'period': f"month:{datetime.now(timezone.utc).strftime('%Y-%m')}", 'amount': 1000}
+    assert wallet['spend']['toll'] == {'period': f"trip:{second['id']}", 'amount': 300}
+    ledger = api.find('wallet_ledger', {'driver_id': driver['id']})
+    assert sorted(entry['amount'] for entry in ledger) == [300, 300, 400, 600]
+    assert [entry['seq'] for entry in sorted(ledger, key=lambda entry: entry['seq'])] == [1, 2, 3, 4]
@@ -0,0 +1,23 @@
+import sys
+
+import pytest
+
+import integrations
+
+
+def test_providers_do_not_import_sdks_until_used(monkeypatch):
+    monkeypatch.setenv('EMERGENT_LLM_KEY', 'test-key')
+    integrations.get_llm_provider.cache_clear()
+    integrations.get_payment_provider.cache_clear()
+
+    assert isinstance(integrations.get_llm_provider(), integrations.EmergentLLMProvider)
+    assert isinstance(integrations.get_payment_provider(), integrations.EmergentStripeProvider)
+    assert not any(name.split('.')[0] == 'emergentintegrations' for name in sys.modules)
+
+
+def test_llm_provider_requires_a_key(monkeypatch):
+    monkeypatch.delenv('EMERGENT_LLM_KEY', raising=False)
+    integrations.get_llm_provider.cache_clear()
+    with pytest.raises(integrations.IntegrationNotConfigured):
+        integrations.get_llm_provider()
+    integrations.get_llm_provider.cache_clear()
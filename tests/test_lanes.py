@@ -0,0 +1,40 @@
+from lanes import COST_PER_KM_BUCKET, histogram_percentile, lane_increments, lane_summary
+
+
+def fold(trips):
+    lane = {'origin': 'Pune', 'destination': 'Mumbai', 'cost_per_km_hist': {}}
+    for trip, revenue in trips:
+        for field, value in lane_increments(trip, revenue).items():
+            if field.startswith('cost_per_km_hist.'):
+                bucket = field.split('.', 1)[1]
+                lane['cost_per_km_hist'][bucket] = lane['cost_per_km_hist'].get(bucket, 0) + value
+            else:
+                lane[field] = lane.get(field, 0) + value
+    return lane
+
+
+def test_margin_only_counts_trips_with_revenue():
+    lane = fold([
+        ({'total_expenses': 6000, 'estimated_distance': 150}, 10000),
+        ({'total_expenses': 4000, 'estimated_distance': 150}, None),
+        ({'total_expenses': 500}, None)
+    ])
+    summary = lane_summary(lane)
+    assert summary['trips'] == 3
+    assert summary['revenue_trips'] == 1
+    assert summary['profit'] == 4000
+    assert summary['margin'] == 0.4
+    assert summary['avg_cost_per_km'] == round(10000 / 300, 2)
+
+
+def test_histogram_percentiles_track_exact_values_within_a_bucket():
+    costs = list(range(10, 110))
+    lane = fold([({'total_expenses': cost * 100, 'actual_distance': 100}, None) for cost in costs])
+    for percentile in (50, 90, 95):
+        exact = costs[int(len(costs) * percentile / 100) - 1]
+        assert abs(histogram_percentile(lane['cost_per_km_hist'], percentile) - exact) <= COST_PER_KM_BUCKET
+
+
+def test_empty_histogram_has_no_percentiles():
+    assert histogram_percentile({}, 50) is None
+    assert lane_summary({'origin': 'A', 'destination': 'B'})['cost_per_km'] == {'p50': None, 'p90': None, 'p95': None}
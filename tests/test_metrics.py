@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from metrics import MetricsRegistry, MongoCommandMetrics, RequestMetricsMiddleware
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.histogram('latency_seconds', 'Latency.', ('route',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(('/a',), value)
+
+    text = registry.render()
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 2' in text
+    assert 'latency_seconds_bucket{route="/a",le="1"} 3' in text
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 4' in text
+    assert 'latency_seconds_count{route="/a"} 4' in text
+
+
+def test_middleware_labels_by_route_template():
+    registry = MetricsRegistry()
+    duration = registry.histogram('http_request_duration_seconds', 'Latency.', ('method', 'route'))
+    requests = registry.counter('http_requests_total', 'Requests.', ('method', 'route', 'status'))
+    app = FastAPI()
+    app.add_middleware(RequestMetricsMiddleware, duration=duration, requests=requests)
+
+    @app.get("/trips/{trip_id}")
+    async def get_trip(trip_id: str):
+        return {'id': trip_id}
+
+    client = TestClient(app)
+    client.get('/trips/1')
+    client.get('/trips/2')
+    client.get('/nowhere')
+
+    text = registry.render()
+    assert 'http_requests_total{method="GET",route="/trips/{trip_id}",status="200"} 2' in text
+    assert 'http_requests_total{method="GET",route="unmatched",status="404"} 1' in text
+
+
+def test_command_listener_records_collection_duration_and_documents():
+    registry = MetricsRegistry()
+    listener = MongoCommandMetrics(
+        registry.histogram('cmd_seconds', 'Commands.', ('collection', 'command')),
+        registry.counter('cmd_documents_total', 'Documents.', ('collection', 'command')),
+        registry.counter('cmd_failures_total', 'Failures.', ('collection', 'command'))
+    )
+
+    def event(command_name, **fields):
+        return SimpleNamespace(command_name=command_name, request_id=1, connection_id=('db', 27017), **fields)
+
+    listener.started(event('find', command={'find': 'trips', 'filter': {}}))
+    listener.succeeded(event('find', duration_micros=2500, reply={'cursor': {'firstBatch': [{}, {}, {}]}}))
+    listener.started(event('insert', command={'insert': 'expenses'}))
+    listener.failed(event('insert', duration_micros=800))
+    listener.started(event('hello', command={'hello': 1}))
+    listener.succeeded(event('hello', duration_micros=100, reply={}))
+
+    text = registry.render()
+    assert 'cmd_seconds_count{collection="trips",command="find"} 1' in text
+    assert 'cmd_documents_total{collection="trips",command="find"} 3' in text
+    assert 'cmd_failures_total{collection="expenses",command="insert"} 1' in text
+    assert 'hello' not in text
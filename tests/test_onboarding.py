@@ -0,0 +1,99 @@
+import asyncio
+
+import bcrypt
+import pytest
+
+from onboarding import (
+    PasswordHasher, UploadTooLarge, failed_rows, iter_records, parse_rows, read_limited, stream_format
+)
+
+
+def test_csv_rows_are_trimmed_and_keyed_by_header():
+    body = "\ufeffname, email ,password,phone\nAsha,asha@fleet.in,secret1,\n Ravi ,ravi@fleet.in, secret2 ,98450\n".encode()
+    assert parse_rows(body, 'text/csv; charset=utf-8') == [
+        {'name': 'Asha', 'email': 'asha@fleet.in', 'password': 'secret1', 'phone': ''},
+        {'name': 'Ravi', 'email': 'ravi@fleet.in', 'password': ' secret2 ', 'phone': '98450'}
+    ]
+
+
+def test_oversized_uploads_stop_being_read_at_the_limit():
+    read = []
+
+    async def body():
+        for _ in range(100):
+            read.append(1)
+            yield b'x' * 1024
+
+    assert asyncio.run(read_limited(chunked(b'x' * 2048, 512), 4096)) == b'x' * 2048
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(read_limited(body(), 4096))
+    assert len(read) == 5
+
+
+def test_json_accepts_a_list_or_a_drivers_wrapper():
+    rows = [{'name': 'Asha', 'email': 'asha@fleet.in', 'password': 'secret1'}]
+    assert parse_rows(b'[{"name": "Asha", "email": "asha@fleet.in", "password": "secret1"}]', 'application/json') == rows
+    assert parse_rows(b'{"drivers": [{"name": "Asha", "email": "asha@fleet.in", "password": "secret1"}]}', '') == rows
+    with pytest.raises(ValueError):
+        parse_rows(b'{"name": "Asha"}', 'application/json')
+    with pytest.raises(ValueError):
+        parse_rows(b'[1, 2]', 'application/json')
+
+
+def test_write_errors_map_back_to_document_indexes():
+    errors = [
+        {'index': 3, 'code': 11000, 'errmsg': 'E11000 duplicate key error'},
+        {'index': 7, 'code': 121, 'errmsg': 'Document failed validation'}
+    ]
+    assert failed_rows(errors, "Email already registered") == {3: "Email already registered", 7: 'Document failed validation'}
+
+
+def test_passwords_are_hashed_in_worker_processes():
+    hasher = PasswordHasher(processes=2)
+    try:
+        hashes = asyncio.run(hasher.hash_many(['secret1', 'secret2']))
+    finally:
+        hasher.close()
+    assert bcrypt.checkpw(b'secret1', hashes[0].encode())
+    assert bcrypt.checkpw(b'secret2', hashes[1].encode())
+    assert hashes[0] != hashes[1]
+
+
+async def chunked(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+async def collect(data: bytes, fmt: str, size: int = 7):
+    return [record async for record in iter_records(chunked(data, size), fmt)]
+
+
+def test_streamed_csv_is_split_across_arbitrary_chunk_boundaries():
+    data = "\ufeffregistration_number,vehicle_type,capacity\r\nMH12AB1234,truck,12.5\r\n\r\nKA01ZZ0001,\"trailer, 40ft\",\nDL01,van,1,extra\nTN09QQ7777,truck,9".encode()
+    for size in (1, 3, 64):
+        assert asyncio.run(collect(data, 'csv', size)) == [
+            (1, {'registration_number': 'MH12AB1234', 'vehicle_type': 'truck', 'capacity': '12.5'}),
+            (2, {'registration_number': 'KA01ZZ0001', 'vehicle_type': 'trailer, 40ft', 'capacity': ''}),
+            (3, "Expected 3 columns, got 4"),
+            (4, {'registration_number': 'TN09QQ7777', 'vehicle_type': 'truck', 'capacity': '9'})
+        ]
+
+
+def test_streamed_ndjson_reports_bad_lines_and_keeps_going():
+    data = '{"registration_number": "MH12AB1234"}\n{broken\n[1]\n{"registration_number": "KA01ZZ0001"}\n'.encode()
+    records = asyncio.run(collect(data, 'ndjson'))
+    assert [row for row, _ in records] == [1, 2, 3, 4]
+    assert records[0][1] == {'registration_number': 'MH12AB1234'}
+    assert records[1][1].startswith("Invalid JSON")
+    assert records[2][1] == "Expected a JSON object"
+
+
+def test_multibyte_characters_split_between_chunks_decode_correctly():
+    data = 'registration_number,model\nMH12AB1234,Tāta Prīma\n'.encode()
+    assert asyncio.run(collect(data, 'csv', 1))[0][1]['model'] == 'Tāta Prīma'
+
+
+def test_upload_format_comes_from_the_content_type():
+    assert stream_format('text/csv; charset=utf-8') == 'csv'
+    assert stream_format('application/x-ndjson') == 'ndjson'
+    assert stream_format('application/json') is None
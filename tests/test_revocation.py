@@ -0,0 +1,130 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from pymongo.results import UpdateResult
+
+from revocation import BloomFilter, RevocationList
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return self.docs
+
+
+class FakeDenylist:
+    def __init__(self):
+        self.docs = {}
+        self.lookups = 0
+        self.returned = []
+
+    async def update_one(self, query, update, upsert=False):
+        inserted = query['_id'] not in self.docs
+        self.docs.setdefault(query['_id'], {'_id': query['_id'], **update['$setOnInsert']})
+        return UpdateResult({'upserted': query['_id']} if inserted else {}, acknowledged=True)
+
+    async def find_one(self, query, projection=None):
+        self.lookups += 1
+        return self.docs.get(query['_id'])
+
+    def find(self, query, projection=None):
+        now = query['expires_at']['$gt']
+        since = query.get('revoked_at', {}).get('$gt', '')
+        docs = [doc for doc in self.docs.values() if doc['expires_at'] > now and doc['revoked_at'] > since]
+        self.returned.append(len(docs))
+        return FakeCursor(docs)
+
+
+def test_bloom_filter_has_no_false_negatives_and_few_false_positives():
+    bloom = BloomFilter(capacity=10000, error_rate=0.01)
+    members = [str(uuid.uuid4()) for _ in range(10000)]
+    for member in members:
+        bloom.add(member)
+    assert all(member in bloom for member in members)
+    outsiders = sum(str(uuid.uuid4()) in bloom for _ in range(20000))
+    assert outsiders / 20000 < 0.02
+
+
+def test_unrevoked_tokens_are_checked_without_a_lookup():
+    denylist = FakeDenylist()
+    revocations = RevocationList(capacity=1000)
+    expires = datetime.now(timezone.utc) + timedelta(minutes=15)
+
+    async def scenario():
+        await revocations.revoke(denylist, 'jti-revoked', 'u1', expires)
+        assert await revocations.is_revoked(denylist, 'jti-revoked')
+        for _ in range(500):
+            assert not await revocations.is_revoked(denylist, str(uuid.uuid4()))
+
+    asyncio.run(scenario())
+    stats = revocations.stats()
+    assert stats['checks'] == 501
+    assert denylist.lookups == stats['confirmations'] < 10
+
+
+def test_refresh_picks_up_other_workers_and_drops_expired_entries():
+    denylist = FakeDenylist()
+    now = datetime.now(timezone.utc)
+    other_worker, this_worker = RevocationList(capacity=1000), RevocationList(capacity=1000)
+
+    async def scenario():
+        await other_worker.revoke(denylist, 'live', 'u1', now + timedelta(minutes=5))
+        await other_worker.revoke(denylist, 'dead', 'u1', now - timedelta(minutes=5))
+        assert not await this_worker.is_revoked(denylist, 'live')
+        await this_worker.refresh(denylist)
+        assert await this_worker.is_revoked(denylist, 'live')
+
+    asyncio.run(scenario())
+    assert this_worker.stats()['entries'] == 1
+
+
+def test_only_one_of_two_concurrent_revokes_wins():
+    denylist = FakeDenylist()
+    expires = datetime.now(timezone.utc) + timedelta(days=30)
+    first, second = RevocationList(capacity=1000), RevocationList(capacity=1000)
+
+    async def scenario():
+        return await asyncio.gather(
+            first.revoke(denylist, 'refresh-jti', 'u1', expires),
+            second.revoke(denylist, 'refresh-jti', 'u1', expires)
+        )
+
+    assert sorted(asyncio.run(scenario())) == [False, True]
+
+
+def test_refreshes_between_rebuilds_only_read_recent_revocations():
+    denylist = FakeDenylist()
+    expires = datetime.now(timezone.utc) + timedelta(days=30)
+    for index in range(50):
+        denylist.docs[f"old-{index}"] = {'_id': f"old-{index}", 'expires_at': expires, 'revoked_at': '2020-01-01T00:00:00+00:00'}
+    other_worker, this_worker = RevocationList(capacity=1000), RevocationList(capacity=1000, rebuild_interval=3600)
+
+    async def scenario():
+        await this_worker.refresh(denylist)
+        await other_worker.revoke(denylist, 'new', 'u1', expires)
+        await this_worker.refresh(denylist)
+        await this_worker.refresh(denylist)
+        assert await this_worker.is_revoked(denylist, 'new')
+
+    asyncio.run(scenario())
+    # One full load, then only the fresh entry (re-read once by the overlap window, counted once)
+    assert denylist.returned == [50, 1, 1]
+    assert this_worker.stats()['entries'] == 51
+
+
+def test_rebuild_interval_drops_expired_entries():
+    denylist = FakeDenylist()
+    now = datetime.now(timezone.utc)
+    revocations = RevocationList(capacity=1000, rebuild_interval=0)
+
+    async def scenario():
+        await revocations.revoke(denylist, 'short', 'u1', now + timedelta(seconds=1))
+        await revocations.refresh(denylist)
+        denylist.docs['short']['expires_at'] = now - timedelta(seconds=1)
+        await revocations.refresh(denylist)
+
+    asyncio.run(scenario())
+    assert revocations.stats()['entries'] == 0
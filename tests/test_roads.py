@@ -0,0 +1,54 @@
+import itertools
+import json
+from pathlib import Path
+
+from geo import haversine_km
+from roads import RoadGraph
+
+GRAPH_PATH = Path(__file__).resolve().parent.parent / 'backend' / 'data' / 'road_graph.json'
+
+
+def small_graph():
+    cities = {
+        'A': {'lat': 0.0, 'lon': 0.0, 'aliases': ['Alpha']},
+        'B': {'lat': 0.0, 'lon': 1.0},
+        'C': {'lat': 1.0, 'lon': 1.0},
+        'D': {'lat': 5.0, 'lon': 5.0}
+    }
+    roads = [['A', 'B', 120], ['B', 'C', 130], ['A', 'C', 400]]
+    return RoadGraph(cities, roads)
+
+
+def test_route_takes_shortest_path_in_either_direction():
+    graph = small_graph()
+    assert graph.route('A', 'C') == {'origin': 'A', 'destination': 'C', 'distance_km': 250.0, 'path': ['A', 'B', 'C']}
+    assert graph.route('C', 'A')['path'] == ['C', 'B', 'A']
+    assert graph.distance('A', 'A') == 0.0
+    assert graph.route('A', 'D') is None
+
+
+def test_resolve_handles_aliases_suffixes_and_typos():
+    graph = RoadGraph.load(GRAPH_PATH)
+    assert graph.resolve('Bangalore') == 'Bengaluru'
+    assert graph.resolve('pune, Maharashtra') == 'Pune'
+    assert graph.resolve('Mumbai 400001') == 'Mumbai'
+    assert graph.resolve('Hyderbad') == 'Hyderabad'
+    assert graph.resolve('Atlantis') is None
+
+
+def test_bundled_graph_is_connected_and_heuristic_admissible():
+    data = json.loads(GRAPH_PATH.read_text())
+    for a, b, km in data['roads']:
+        start, end = data['cities'][a], data['cities'][b]
+        assert km >= haversine_km(start['lat'], start['lon'], end['lat'], end['lon'])
+
+    graph = RoadGraph.load(GRAPH_PATH)
+    for origin, destination in itertools.combinations(graph.coords, 2):
+        assert graph.distance(origin, destination) > 0
+
+
+def test_repeated_lookups_hit_the_cache():
+    graph = small_graph()
+    graph.distance('A', 'C')
+    graph.distance('C', 'Alpha')
+    assert graph.stats()['route_cache'] == {'hits': 1, 'misses': 1, 'size': 1}
@@ -0,0 +1,131 @@
+import asyncio
+from types import SimpleNamespace
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from slow_queries import (
+    RouteContextMiddleware, SlowQueryLog, command_shape, current_scope, explain_command, shape_id,
+    summarize_explain, worst_offenders_pipeline
+)
+
+
+class FakeCollection:
+    def __init__(self):
+        self.inserted = []
+
+    async def insert_many(self, documents, ordered=True):
+        self.inserted.extend(documents)
+
+
+class FakeDatabase:
+    def __init__(self, reply):
+        self.reply = reply
+        self.explains = []
+        self.log = FakeCollection()
+        self.client = {'transops': self}
+
+    async def command(self, command):
+        self.explains.append(command)
+        return self.reply
+
+    def get_collection(self, name):
+        return self.log
+
+
+def event(command_name, request_id=1, **fields):
+    return SimpleNamespace(command_name=command_name, request_id=request_id, connection_id=('db', 27017),
+                           database_name='transops', **fields)
+
+
+def test_shape_ignores_values_but_keeps_fields_operators_and_sort():
+    first = command_shape('find', {'find': 'trips', 'filter': {'fleet_owner_id': 'a', 'status': {'$in': ['x', 'y']}},
+                                   'sort': {'created_at': -1}})
+    second = command_shape('find', {'find': 'trips', 'filter': {'fleet_owner_id': 'b', 'status': {'$in': ['z']}},
+                                    'sort': {'created_at': -1}})
+    assert first == second == {'filter': {'fleet_owner_id': '?', 'status': {'$in': ['?']}}, 'sort': {'created_at': -1}}
+    assert shape_id('trips', 'find', first) == shape_id('trips', 'find', second)
+    assert shape_id('trips', 'find', first) != shape_id('expenses', 'find', first)
+    assert command_shape('update', {'update': 'trips', 'updates': [{'q': {'id': 't1'}, 'u': {'$set': {'a': 1}}}]}) == {
+        'filter': {'id': '?'}
+    }
+
+
+def test_explain_command_drops_session_fields_and_skips_writes_to_collections():
+    command = {'find': 'trips', 'filter': {'id': 't1'}, 'lsid': {'id': 1}, 'txnNumber': 3, '$db': 'transops'}
+    assert explain_command('find', command) == {'find': 'trips', 'filter': {'id': 't1'}}
+    assert explain_command('aggregate', {'aggregate': 'trips', 'pipeline': [{'$out': 'copy'}]}) is None
+    updates = explain_command('update', {'update': 'trips', 'updates': [{'q': {}}, {'q': {}}], 'ordered': True})
+    assert len(updates['updates']) == 1
+
+
+def test_summary_reads_classic_slot_based_and_aggregate_plans():
+    classic = {
+        'queryPlanner': {'winningPlan': {'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN', 'indexName': 'status_1'}}},
+        'executionStats': {'totalDocsExamined': 40, 'totalKeysExamined': 40, 'nReturned': 10}
+    }
+    summary = summarize_explain(classic)
+    assert summary['stages'] == ['FETCH', 'IXSCAN']
+    assert summary['indexes'] == ['status_1'] and not summary['collscan']
+    assert (summary['docs_examined'], summary['n_returned']) == (40, 10)
+
+    slot_based = {'queryPlanner': {'winningPlan': {'queryPlan': {'stage': 'COLLSCAN'}}},
+                  'executionStats': {'totalDocsExamined': 5000, 'nReturned': 3}}
+    assert summarize_explain(slot_based)['collscan']
+
+    aggregate = {'stages': [{'$cursor': slot_based}, {'$group': {}}]}
+    assert summarize_explain(aggregate)['docs_examined'] == 5000
+
+
+def test_only_slow_commands_are_logged_with_their_route_and_explained_once_per_shape():
+    log = SlowQueryLog(threshold_ms=50)
+    reply = {'queryPlanner': {'winningPlan': {'stage': 'COLLSCAN'}},
+             'executionStats': {'totalDocsExamined': 900, 'nReturned': 2}}
+    database = FakeDatabase(reply)
+    scope = {'type': 'http', 'method': 'GET', 'path': '/api/trips', 'route': SimpleNamespace(path='/api/trips')}
+
+    token = current_scope.set(scope)
+    try:
+        for request_id, (driver, micros) in enumerate([('d1', 80000), ('d2', 120000), ('d3', 3000)]):
+            log.started(event('find', request_id, command={'find': 'trips', 'filter': {'driver_id': driver}}))
+            log.succeeded(event('find', request_id, duration_micros=micros, reply={}))
+    finally:
+        current_scope.reset(token)
+    log.started(event('insert', 9, command={'insert': 'trips'}))
+    log.succeeded(event('insert', 9, duration_micros=900000, reply={}))
+
+    asyncio.run(log.flush(database))
+
+    documents = database.log.inserted
+    assert [document['duration_ms'] for document in documents] == [80.0, 120.0]
+    assert {document['route'] for document in documents} == {'GET /api/trips'}
+    assert documents[0]['shape_id'] == documents[1]['shape_id']
+    assert 'd1' not in documents[0]['shape']
+    assert documents[0]['explain']['collscan']
+    assert len(database.explains) == 1
+    assert database.explains[0]['verbosity'] == 'executionStats'
+    assert log.stats()['recorded'] == 2
+
+
+def test_middleware_exposes_the_matched_route_to_commands():
+    app = FastAPI()
+    app.add_middleware(RouteContextMiddleware)
+    seen = []
+
+    @app.get("/trips/{trip_id}")
+    async def get_trip(trip_id: str):
+        scope = current_scope.get()
+        seen.append(f"{scope['method']} {scope['route'].path}")
+        return {}
+
+    TestClient(app).get('/trips/1')
+    assert seen == ['GET /trips/{trip_id}']
+    assert current_scope.get() is None
+
+
+def test_worst_offenders_pipeline_groups_by_shape():
+    pipeline = worst_offenders_pipeline('count', 5, since='2026-01-01T00:00:00+00:00')
+    assert pipeline[0] == {'$match': {'created_at': {'$gte': '2026-01-01T00:00:00+00:00'}}}
+    group = next(stage['$group'] for stage in pipeline if '$group' in stage)
+    assert group['_id'] == '$shape_id'
+    assert {'$sort': {'count': -1}} in pipeline and {'$limit': 5} in pipeline
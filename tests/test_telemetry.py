@@ -0,0 +1,190 @@
+import asyncio
+import math
+from datetime import datetime, timedelta, timezone
+
+from pymongo.errors import BulkWriteError
+
+from geo import haversine_km
+from telemetry import TelemetryBuffer, distance_update
+
+
+def evaluate(expr, doc, variables=None):
+    """Just enough of the aggregation expression language to run distance_update in-process."""
+    variables = variables or {}
+    if isinstance(expr, str) and expr.startswith('$'):
+        if expr.startswith('$$'):
+            name, *path = expr[2:].split('.')
+            value = variables.get(name)
+        else:
+            value, path = doc, expr[1:].split('.')
+        for part in path:
+            value = value.get(part) if isinstance(value, dict) else None
+        return value
+    if isinstance(expr, list):
+        return [evaluate(item, doc, variables) for item in expr]
+    if not isinstance(expr, dict):
+        return expr
+    if len(expr) != 1 or not next(iter(expr)).startswith('$'):
+        return {key: evaluate(value, doc, variables) for key, value in expr.items()}
+    op, arg = next(iter(expr.items()))
+    if op == '$literal':
+        return arg
+    if op == '$reduce':
+        value = evaluate(arg['initialValue'], doc, variables)
+        for item in evaluate(arg['input'], doc, variables):
+            value = evaluate(arg['in'], doc, {**variables, 'value': value, 'this': item})
+        return value
+    if op == '$cond':
+        condition, then, otherwise = arg
+        return evaluate(then if evaluate(condition, doc, variables) else otherwise, doc, variables)
+    if op == '$ifNull':
+        value = evaluate(arg[0], doc, variables)
+        return evaluate(arg[1], doc, variables) if value is None else value
+    if op == '$or':
+        return any(evaluate(item, doc, variables) for item in arg)
+    args = evaluate(arg, doc, variables)
+    unary = {
+        '$sin': math.sin, '$cos': math.cos, '$asin': math.asin, '$sqrt': math.sqrt,
+        '$degreesToRadians': math.radians
+    }
+    if op in unary:
+        return unary[op](args)
+    return {
+        '$eq': lambda: args[0] == args[1],
+        '$gt': lambda: args[0] > args[1],
+        '$add': lambda: sum(args),
+        '$subtract': lambda: args[0] - args[1],
+        '$multiply': lambda: math.prod(args),
+        '$divide': lambda: args[0] / args[1],
+        '$pow': lambda: args[0] ** args[1],
+        '$min': lambda: min(args),
+        '$round': lambda: round(args[0], args[1])
+    }[op]()
+
+
+def apply_pipeline(doc, pipeline):
+    for stage in pipeline:
+        if '$set' in stage:
+            doc = {**doc, **{key: evaluate(value, doc) for key, value in stage['$set'].items()}}
+        else:
+            doc = {key: value for key, value in doc.items() if key != stage['$unset']}
+    return doc
+
+
+class FakeCollection:
+    """Trips keyed by id; applies UpdateOne pipelines whose filter matches."""
+
+    def __init__(self, docs=(), fail_inserts=0, fail_bulk=0):
+        self.docs = {doc['id']: dict(doc) for doc in docs}
+        self.inserted = []
+        self.fail_inserts = fail_inserts
+        self.fail_bulk = fail_bulk
+
+    async def insert_many(self, docs, ordered=True):
+        if self.fail_inserts:
+            self.fail_inserts -= 1
+            raise BulkWriteError({'writeErrors': [{'index': 0, 'code': 1}], 'nInserted': len(docs) - 1})
+        self.inserted.extend(docs)
+
+    async def bulk_write(self, ops, ordered=True):
+        if self.fail_bulk:
+            self.fail_bulk -= 1
+            raise RuntimeError("not primary")
+        for op in ops:
+            doc = self.docs.get(op._filter['id'])
+            status = op._filter['status']
+            allowed = status['$in'] if isinstance(status, dict) else [status]
+            if doc and doc['status'] in allowed:
+                self.docs[doc['id']] = apply_pipeline(doc, op._doc)
+
+
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def point(lat, minutes):
+    return {'lat': lat, 'lon': 72.8, 'ts': START + timedelta(minutes=minutes)}
+
+
+def test_haversine_mumbai_pune():
+    assert 115 < haversine_km(19.0760, 72.8777, 18.5204, 73.8567) < 125
+
+
+def test_pipeline_distance_matches_haversine_and_ignores_late_points():
+    trip = {'id': 't1', 'status': 'in_progress', 'actual_distance': 10.0}
+    trip = apply_pipeline(trip, distance_update([point(19.0, 0), point(19.1, 5)]))
+    trip = apply_pipeline(trip, distance_update([point(25.0, 1), point(19.2, 9)]))
+
+    assert math.isclose(trip['actual_distance'], 10.0 + haversine_km(19.0, 72.8, 19.2, 72.8), abs_tol=1e-3)
+    assert trip['telemetry_last_point'] == point(19.2, 9)
+    assert '_telemetry' not in trip
+
+
+def test_workers_sharing_a_trip_measure_from_the_persisted_point():
+    trips = FakeCollection([{'id': 't1', 'status': 'in_progress'}])
+    first, second = TelemetryBuffer(), TelemetryBuffer()
+    for buffer in (first, second):
+        buffer.start_track('t1', {'driver_id': 'd1', 'fleet_owner_id': 'o1'})
+
+    async def scenario():
+        # Alternating batches: each worker only ever sees every other point
+        for index, buffer in enumerate([first, second, first, second]):
+            buffer.add('t1', [point(19.0 + index * 0.1, index)])
+            await buffer.flush(FakeCollection(), trips)
+
+    asyncio.run(scenario())
+    assert math.isclose(trips.docs['t1']['actual_distance'], haversine_km(19.0, 72.8, 19.3, 72.8), abs_tol=1e-3)
+
+
+def test_distance_stops_once_the_trip_leaves_in_progress():
+    trips = FakeCollection([{'id': 't1', 'status': 'in_progress'}])
+    buffer = TelemetryBuffer()
+    buffer.start_track('t1', {'driver_id': 'd1'})
+
+    async def scenario():
+        buffer.add('t1', [point(19.0, 0), point(19.1, 5)])
+        await buffer.flush(FakeCollection(), trips)
+        trips.docs['t1']['status'] = 'cancelled'
+        buffer.add('t1', [point(19.5, 10)])
+        await buffer.flush(FakeCollection(), trips)
+
+    asyncio.run(scenario())
+    assert math.isclose(trips.docs['t1']['actual_distance'], haversine_km(19.0, 72.8, 19.1, 72.8), abs_tol=1e-3)
+
+
+def test_finish_applies_the_last_points_to_a_trip_this_worker_completed():
+    trips = FakeCollection([{'id': 't1', 'status': 'in_progress'}])
+    buffer = TelemetryBuffer()
+    buffer.start_track('t1', {'driver_id': 'd1'})
+    buffer.add('t1', [point(19.0, 0), point(19.1, 5)])
+    trips.docs['t1']['status'] = 'completed'
+    telemetry = FakeCollection()
+
+    asyncio.run(buffer.finish('t1', telemetry, trips))
+
+    assert len(telemetry.inserted) == 2
+    assert trips.docs['t1']['actual_distance'] > 0
+    assert buffer.track('t1') is None
+
+
+def test_failed_writes_are_retried_on_the_next_flush():
+    trips = FakeCollection([{'id': 't1', 'status': 'in_progress'}], fail_bulk=1)
+    telemetry = FakeCollection(fail_inserts=1)
+    bumped = []
+
+    async def on_distance(tracks):
+        bumped.extend(track.driver_id for track in tracks)
+
+    buffer = TelemetryBuffer(on_distance=on_distance)
+    buffer.start_track('t1', {'driver_id': 'd1'})
+    buffer.add('t1', [point(19.0, 0), point(19.1, 5)])
+
+    async def scenario():
+        await buffer.flush(telemetry, trips)
+        assert 'actual_distance' not in trips.docs['t1'] and bumped == []
+        await buffer.flush(telemetry, trips)
+
+    asyncio.run(scenario())
+    # Only the point the failed insert reported was re-sent
+    assert len(telemetry.inserted) == 1
+    assert math.isclose(trips.docs['t1']['actual_distance'], haversine_km(19.0, 72.8, 19.1, 72.8), abs_tol=1e-3)
+    assert bumped == ['d1']
@@ -0,0 +1,104 @@
+def etag_of(api, url, user, etag=None):
+    response = api.call('GET', url, user, headers={'If-None-Match': etag} if etag else {})
+    return response.status_code, response.headers['ETag']
+
+
+def test_lists_answer_304_until_a_write_changes_them(api):
+    owner = api.user()
+    driver = api.user('driver', owner['id'], balance=1000, fuel_limit=1000)
+    vehicle = api.vehicle(owner)
+
+    status, trips_tag = etag_of(api, '/trips', owner)
+    assert status == 200
+    assert etag_of(api, '/trips', owner, trips_tag) == (304, trips_tag)
+    _, driver_tag = etag_of(api, '/trips', driver)
+    assert driver_tag != trips_tag
+
+    created = api.call('POST', '/trips', owner, json={
+        'driver_id': driver['id'], 'vehicle_id': vehicle['id'], 'origin': 'Pune', 'destination': 'Nashik'
+    }).json()
+
+    # Both the owner's and the assigned driver's lists changed
+    status, new_trips_tag = etag_of(api, '/trips', owner, trips_tag)
+    assert status == 200 and new_trips_tag != trips_tag
+    assert etag_of(api, '/trips', driver, driver_tag)[0] == 200
+    assert [trip['id'] for trip in api.call('GET', '/trips', owner, headers={'If-None-Match': trips_tag}).json()] == [created['id']]
+
+    _, expenses_tag = etag_of(api, '/expenses', owner)
+    _, trip_expenses_tag = etag_of(api, f"/expenses?trip_id={created['id']}", owner)
+    assert trip_expenses_tag != expenses_tag
+    api.call('POST', '/expenses', driver, json={'trip_id': created['id'], 'driver_id': driver['id'], 'category': 'fuel', 'amount': 200})
+    assert etag_of(api, '/expenses', owner, expenses_tag)[0] == 200
+    assert etag_of(api, f"/expenses?trip_id={created['id']}", owner, trip_expenses_tag)[0] == 200
+    assert etag_of(api, '/trips', owner, new_trips_tag)[0] == 200
+
+    # The vehicle list is also served from the read cache, which the write has to invalidate
+    _, vehicles_tag = etag_of(api, '/vehicles', owner)
+    assert len(api.call('GET', '/vehicles', owner).json()) == 1
+    api.call('POST', '/vehicles', owner, json={'registration_number': 'MH12AB1234', 'vehicle_type': 'truck'})
+    assert etag_of(api, '/vehicles', owner, vehicles_tag)[0] == 200
+    assert len(api.call('GET', '/vehicles', owner).json()) == 2
+
+
+def test_suggested_assignments_can_be_applied(api):
+    owner = api.user()
+    drivers = [api.user('driver', owner['id']) for _ in range(2)]
+    vehicles = [api.vehicle(owner) for _ in range(2)]
+    for _ in range(2):
+        api.trip(owner, status='planned')
+    _, owner_tag = etag_of(api, '/trips', owner)
+
+    plan = api.call('GET', '/dispatch/suggest', owner).json()
+    assert len(plan['assignments']) == 2
+    applied = api.call('POST', '/dispatch/assign', owner, json={'assignments': plan['assignments']}).json()
+
+    assert applied == {
+        'assigned': 2,
+        'rejected': 0,
+        'results': [{'trip_id': a['trip_id'], 'status': 'assigned'} for a in plan['assignments']]
+    }
+    stored = {t['id']: (t['driver_id'], t['vehicle_id']) for t in api.find('trips', {'fleet_owner_id': owner['id']})}
+    assert stored == {a['trip_id']: (a['driver_id'], a['vehicle_id']) for a in plan['assignments']}
+    assert {pair[0] for pair in stored.values()} == {d['id'] for d in drivers}
+    assert {pair[1] for pair in stored.values()} == {v['id'] for v in vehicles}
+    assert etag_of(api, '/trips', owner, owner_tag)[0] == 200
+    for driver in drivers:
+        assert len(api.call('GET', '/trips', driver).json()) == 1
+
+    # Everything is taken now, so applying the same plan again changes nothing
+    again = api.call('POST', '/dispatch/assign', owner, json={'assignments': plan['assignments']}).json()
+    assert (again['assigned'], {r['error'] for r in again['results']}) == (0, {'already_assigned'})
+    assert api.call('GET', '/dispatch/suggest', owner).json()['trips_considered'] == 0
+
+
+def test_assignments_are_checked_for_ownership_and_availability(api):
+    owner, other_owner = api.user(), api.user()
+    idle, busy, outsider = api.user('driver', owner['id']), api.user('driver', owner['id']), api.user('driver', other_owner['id'])
+    free, in_shop, theirs = api.vehicle(owner), api.vehicle(owner, status='maintenance'), api.vehicle(other_owner)
+    api.trip(owner, busy, api.vehicle(owner, status='in_use'))
+    open_trips = [api.trip(owner, status='planned') for _ in range(6)]
+    taken = api.trip(owner, busy, status='planned')
+    foreign = api.trip(other_owner, status='planned')
+
+    rows = [
+        (foreign, idle, free, 'trip_not_found'),
+        (taken, idle, free, 'already_assigned'),
+        (open_trips[0], idle, in_shop, 'vehicle_unavailable'),
+        (open_trips[1], idle, theirs, 'vehicle_unavailable'),
+        (open_trips[2], busy, free, 'driver_unavailable'),
+        (open_trips[3], outsider, free, 'driver_unavailable'),
+        (open_trips[4], idle, free, 'assigned'),
+        (open_trips[4], idle, free, 'duplicate'),
+        # idle and free went to the row above
+        (open_trips[5], idle, free, 'vehicle_unavailable')
+    ]
+    response = api.call('POST', '/dispatch/assign', owner, json={'assignments': [
+        {'trip_id': trip['id'], 'driver_id': driver['id'], 'vehicle_id': vehicle['id']} for trip, driver, vehicle, _ in rows
+    ]}).json()
+
+    assert [r.get('error', r['status']) for r in response['results']] == [outcome for *_, outcome in rows]
+    assert (response['assigned'], response['rejected']) == (1, 8)
+    stored = {t['id']: (t['driver_id'], t['vehicle_id']) for t in api.find('trips', {'status': 'planned'})}
+    assert stored[open_trips[4]['id']] == (idle['id'], free['id'])
+    assert [stored[t['id']] for t in open_trips[:4] + open_trips[5:] + [foreign]] == [(None, None)] * 6
+    assert api.call('POST', '/dispatch/assign', idle, json={'assignments': []}).status_code == 403
@@ -0,0 +1,24 @@
+from trips import vehicle_update
+
+
+def trip(status, vehicle_id='v1'):
+    return {'id': 't1', 'fleet_owner_id': 'o1', 'vehicle_id': vehicle_id, 'status': status}
+
+
+def test_cancelling_a_planned_trip_leaves_a_vehicle_busy_elsewhere_alone():
+    # v1 is in_use on another trip; this planned trip never took it
+    assert vehicle_update(trip('planned'), 'cancelled') is None
+
+
+def test_vehicle_is_only_released_from_the_status_the_trip_put_it_in():
+    for status in ('completed', 'cancelled'):
+        update = vehicle_update(trip('in_progress'), status)
+        assert update._filter == {'id': 'v1', 'fleet_owner_id': 'o1', 'status': 'in_use'}
+        assert update._doc == {'$set': {'status': 'available'}}
+
+
+def test_starting_a_trip_takes_an_available_vehicle():
+    update = vehicle_update(trip('planned'), 'in_progress')
+    assert update._filter['status'] == 'available'
+    assert update._doc == {'$set': {'status': 'in_use'}}
+    assert vehicle_update(trip('planned', vehicle_id=None), 'in_progress') is None
@@ -0,0 +1,151 @@
+from integrations import CheckoutSession, CheckoutStatus, PaymentProvider, WebhookEvent
+
+
+class FakeStripe(PaymentProvider):
+    """Every checkout is paid; the webhook body is just the session id."""
+
+    def __init__(self):
+        self.sessions = 0
+
+    async def create_checkout_session(self, amount, currency, success_url, cancel_url, metadata, webhook_url):
+        self.sessions += 1
+        return CheckoutSession(session_id=f"cs_test_{self.sessions}", url='https://checkout.test')
+
+    async def get_checkout_status(self, session_id):
+        return CheckoutStatus(status='complete', payment_status='paid')
+
+    async def handle_webhook(self, body, signature):
+        return WebhookEvent(event_type='checkout.session.completed', session_id=body.decode(), payment_status='paid')
+
+
+def test_bulk_limits_report_a_status_per_driver(api):
+    owner, other_owner = api.user(), api.user()
+    funded = api.user('driver', owner['id'])
+    walletless = api.user('driver', owner['id'])
+    api.run(api.db.wallets.delete_one({'driver_id': walletless['id']}))
+    outsider = api.user('driver', other_owner['id'])
+
+    response = api.call('PUT', '/wallet/limits/bulk', owner, json={
+        'template': {'fuel_limit': 2500, 'limit_periods': {'fuel': 'trip'}},
+        'driver_ids': [funded['id'], walletless['id'], outsider['id']]
+    })
+
+    assert response.status_code == 200
+    assert response.json() == {
+        'updated': 1,
+        'failed': 2,
+        'results': [
+            {'driver_id': funded['id'], 'status': 'updated'},
+            {'driver_id': walletless['id'], 'status': 'wallet_not_found'},
+            {'driver_id': outsider['id'], 'status': 'driver_not_found'}
+        ]
+    }
+    wallet = api.find_one('wallets', {'driver_id': funded['id']})
+    assert (wallet['fuel_limit'], wallet['limit_periods']) == (2500, {'fuel': 'trip'})
+    assert api.find_one('wallets', {'driver_id': outsider['id']})['fuel_limit'] == 0
+
+
+def test_bulk_limits_without_driver_ids_cover_the_whole_fleet(api):
+    owner = api.user()
+    drivers = [api.user('driver', owner['id']) for _ in range(3)]
+
+    response = api.call('PUT', '/wallet/limits/bulk', owner, json={'template': {'toll_limit': 800}})
+    assert response.json()['updated'] == 3
+    assert {w['toll_limit'] for w in api.find('wallets', {'driver_id': {'$in': [d['id'] for d in drivers]}})} == {800}
+
+    rejected = api.call('PUT', '/wallet/limits/bulk', owner, json={'template': {'limit_periods': {'toll': 'weekly'}}})
+    assert rejected.status_code == 400
+    assert rejected.json()['detail'] == "Invalid toll limit period"
+
+
+def test_a_disbursement_larger_than_the_pool_changes_nothing(api):
+    owner = api.user()
+    drivers = [api.user('driver', owner['id']) for _ in range(2)]
+    api.pool(owner, 10000)
+
+    funded = api.call('POST', '/wallet/disburse', owner, json={'disbursements': [
+        {'driver_id': drivers[0]['id'], 'amount': 2000}, {'driver_id': drivers[1]['id'], 'amount': 1000}
+    ]})
+    assert funded.json()['pool_balance'] == 7000
+
+    short = api.call('POST', '/wallet/disburse', owner, json={'disbursements': [
+        {'driver_id': drivers[0]['id'], 'amount': 5000}, {'driver_id': drivers[1]['id'], 'amount': 3000}
+    ]})
+
+    assert short.status_code == 400
+    assert short.json()['detail'] == "Insufficient funding pool balance"
+    assert api.find_one('funding_pools', {'fleet_owner_id': owner['id']})['balance'] == 7000
+    assert [api.find_one('wallets', {'driver_id': d['id']})['balance'] for d in drivers] == [2000, 1000]
+    assert len(api.find('wallet_ledger', {'driver_id': {'$in': [d['id'] for d in drivers]}})) == 2
+
+
+def test_a_driver_without_a_wallet_gets_their_share_returned_to_the_pool(api):
+    owner = api.user()
+    funded, walletless = api.user('driver', owner['id']), api.user('driver', owner['id'])
+    api.run(api.db.wallets.delete_one({'driver_id': walletless['id']}))
+    api.pool(owner, 5000)
+
+    response = api.call('POST', '/wallet/disburse', owner, json={'disbursements': [
+        {'driver_id': funded['id'], 'amount': 1500}, {'driver_id': walletless['id'], 'amount': 500}
+    ]})
+
+    assert response.json() == {
+        'total': 1500,
+        'pool_balance': 3500,
+        'results': [
+            {'driver_id': funded['id'], 'amount': 1500, 'status': 'credited'},
+            {'driver_id': walletless['id'], 'amount': 500, 'status': 'wallet_not_found'}
+        ]
+    }
+
+
+def test_a_paid_checkout_is_credited_once_whether_the_webhook_or_the_poll_sees_it_first(api, monkeypatch):
+    monkeypatch.setattr(api.server, 'get_payment_provider', lambda stripe=FakeStripe(): stripe)
+    owner = api.user()
+    driver = api.user('driver', owner['id'])
+
+    for user in (owner, driver):
+        session_id = api.call('POST', '/payments/checkout', user, json={'package': 'small'}).json()['session_id']
+        assert api.call('POST', '/webhook/stripe', content=session_id.encode()).json() == {'status': 'success'}
+        for _ in range(2):
+            assert api.call('GET', f"/payments/status/{session_id}", user).json()['credited'] is True
+
+    session_id = api.call('POST', '/payments/checkout', driver, json={'package': 'medium'}).json()['session_id']
+    api.call('GET', f"/payments/status/{session_id}", driver)
+    api.call('POST', '/webhook/stripe', content=session_id.encode())
+
+    assert api.call('GET', '/funding-pool', owner).json()['balance'] == 500
+    assert api.call('GET', '/wallet', driver).json()['balance'] == 1500
+    assert [entry['reason'] for entry in api.find('wallet_ledger', {'driver_id': driver['id']})] == ['checkout', 'checkout']
+
+
+def test_statement_and_reconcile_agree_with_the_wallet(api, monkeypatch):
+    monkeypatch.setattr(api.server, 'LEDGER_SNAPSHOT_INTERVAL', 3)
+    owner = api.user()
+    driver = api.user('driver', owner['id'], fuel_limit=1000, toll_limit=1000)
+    trip = api.trip(owner, driver)
+    api.pool(owner, 10000)
+
+    api.call('POST', '/wallet/topup', owner, json={'driver_id': driver['id'], 'amount': 4000})
+    for category, amount in (('fuel', 500), ('toll', 200)):
+        api.call('POST', '/expenses', driver, json={
+            'trip_id': trip['id'], 'driver_id': driver['id'], 'category': category, 'amount': amount
+        })
+    api.call('POST', '/wallet/disburse', owner, json={'disbursements': [{'driver_id': driver['id'], 'amount': 1000}]})
+
+    statement = api.call('GET', f"/wallet/{driver['id']}/statement", owner).json()
+    assert statement['balance'] == 4300
+    assert [(e['seq'], e['entry_type'], e['balance_after']) for e in statement['entries']] == [
+        (1, 'credit', 4000), (2, 'debit', 3500), (3, 'debit', 3300), (4, 'credit', 4300)
+    ]
+    window = api.call('GET', f"/wallet/{driver['id']}/statement", driver, params={'from_seq': 2, 'to_seq': 3}).json()
+    assert [e['seq'] for e in window['entries']] == [2, 3]
+
+    # Replays from the seq 3 snapshot rather than from the first entry
+    reconciled = api.call('GET', f"/wallet/{driver['id']}/reconcile", owner).json()
+    assert (reconciled['snapshot_seq'], reconciled['entries_replayed'], reconciled['ledger_balance']) == (3, 1, 4300)
+    assert reconciled['consistent'] and not reconciled['missing_seqs']
+
+    api.run(api.db.wallet_ledger.delete_one({'driver_id': driver['id'], 'seq': 4}))
+    broken = api.call('GET', f"/wallet/{driver['id']}/reconcile", owner).json()
+    assert (broken['consistent'], broken['missing_seqs']) == (False, [4])